@@ -1,6 +1,19 @@
 import csv
+import sys
 import glob
 import re
+import os
+import time
+import queue
+import logging
+import sqlite3
+import threading
+
+# Batches slower than this are logged as a warning, Time in ms
+slow_flush_ms = 200
+
+# Queued after the last row to tell the writer thread to finish
+_CLOSE = object()
 
 def get_next_filename(pattern):
     # Create a regex pattern to extract the number
@@ -22,4 +35,353 @@ def get_next_filename(pattern):
 def write_data_to_csv(data, filename):
     with open(filename, 'a', newline='') as csvfile:
         writer = csv.writer(csvfile)
-        writer.writerow(data.values())
\ No newline at end of file
+        writer.writerow(data.values())
+
+def merge_csv_by_time(filenames, output_filename, time_column=0, time_modulo=2**32):
+    """
+    Merges CSV files that share a header into one file sorted by time, e.g. a live
+    log and the rows backfilled into it later. Identical rows are written once.
+    Rows whose time can't be read keep their place at the end.
+
+    Times wrap around at time_modulo (payload timestamps are milliseconds modulo
+    2^32), so rows are sorted by their time relative to the first row, up to half
+    the range either side of it. time_modulo=None sorts on the plain values.
+
+    Returns:
+    int: Number of data rows written.
+    """
+    header = None
+    rows = []
+    for filename in filenames:
+        if not os.path.exists(filename):
+            continue
+        with open(filename, newline='') as csvfile:
+            reader = csv.reader(csvfile)
+            file_header = next(reader, None)
+            if file_header is None:
+                continue
+            if header is None:
+                header = file_header
+            elif file_header != header:
+                raise ValueError(f"{filename} has a different header")
+            rows.extend(reader)
+
+    def row_time(row):
+        try:
+            return float(row[time_column])
+        except (IndexError, ValueError):
+            return None
+
+    base = next((time for time in map(row_time, rows) if time is not None), 0.0)
+
+    def sort_key(row):
+        time = row_time(row)
+        if time is None:
+            return (1, 0.0)
+        if time_modulo is None:
+            return (0, time)
+        return (0, (time - base + time_modulo // 2) % time_modulo - time_modulo // 2)
+
+    written = 0
+    seen = set()
+    with open(output_filename, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        if header is not None:
+            writer.writerow(header)
+        for row in sorted(rows, key=sort_key):
+            if tuple(row) in seen:
+                continue
+            seen.add(tuple(row))
+            writer.writerow(row)
+            written += 1
+    return written
+
+class CsvSink:
+    """
+    Keeps a CSV file open for a BufferedWriter. Rows are dictionaries and are
+    written in their value order, like write_data_to_csv.
+    """
+
+    def __init__(self, filename):
+        self.file = open(filename, 'a', newline='')
+        self.writer = csv.writer(self.file)
+
+    def write_rows(self, rows):
+        self.writer.writerows(row.values() for row in rows)
+
+    def flush(self):
+        self.file.flush()
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+class SqliteSink:
+    """
+    Stores rows in an SQLite table for a BufferedWriter, so the log can be queried
+    by time, sequence or altitude without re-reading it. Each batch is one
+    transaction, and the database runs in WAL mode so readers (the API, offline
+    tools) never block the writer. Missing values ('' or None) are stored as NULL.
+
+    Args:
+    filename (str): Database file, created if it doesn't exist.
+    fields (list): Columns, in order. Rows are dictionaries keyed by these.
+    table (str): Table name.
+    indexes (list): Columns to index.
+    """
+
+    def __init__(self, filename, fields, table='telemetry', indexes=('Timestamp', 'Received', 'Sequence', 'Altitude')):
+        self.fields = list(fields)
+        self.table = table
+        # Created here, then only used from the writer thread
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")  # Commits reach the WAL, sync() makes them durable
+        columns = _quoted(self.fields)
+        self.connection.execute(f'CREATE TABLE IF NOT EXISTS "{table}" (id INTEGER PRIMARY KEY, {columns})')
+        for field in indexes:
+            if field in self.fields:
+                self.connection.execute(f'CREATE INDEX IF NOT EXISTS "{table}_{field}" ON "{table}" ("{field}")')
+        self.connection.commit()
+        placeholders = ', '.join('?' for _ in self.fields)
+        self.insert = f'INSERT INTO "{table}" ({columns}) VALUES ({placeholders})'
+
+    def write_rows(self, rows):
+        with self.connection:
+            self.connection.executemany(self.insert, ([None if row.get(field) == '' else row.get(field) for field in self.fields] for row in rows))
+
+    def flush(self):
+        # Every batch is already committed
+        pass
+
+    def sync(self):
+        # Copy the WAL into the database file and fsync it
+        self.connection.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def close(self):
+        self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.connection.close()
+
+def _quoted(fields):
+    # Column list for an SQL statement, field names may need quoting
+    return ', '.join(f'"{field}"' for field in fields)
+
+def query_database(filename, fields=None, start=None, end=None, since=None, min_altitude=None, max_altitude=None,
+                   altitude_field='Altitude', time_field='Received', limit=None, table='telemetry'):
+    """
+    Reads rows from a database written by SqliteSink, oldest first. Every range
+    is optional and inclusive. The database can be read while it is being written.
+
+    Args:
+    filename (str): Database file.
+    fields (list): Columns to return, all by default.
+    start (float): Only rows with time_field at or after this.
+    end (float): Only rows with time_field at or before this.
+    since (int): Only rows with a larger Sequence.
+    min_altitude (float): Only rows with altitude_field at or above this.
+    max_altitude (float): Only rows with altitude_field at or below this.
+    limit (int): Most rows returned.
+
+    Returns:
+    dict: One list per field, plus Count.
+    """
+    connection = sqlite3.connect(f"file:{filename}?mode=ro", uri=True)
+    try:
+        columns = [row[1] for row in connection.execute(f'PRAGMA table_info("{table}")')][1:]
+        fields = columns if fields is None else list(fields)
+        ranges = [(column, operator, value) for column, operator, value in
+                  ((time_field, '>=', start), (time_field, '<=', end), ('Sequence', '>', since),
+                   (altitude_field, '>=', min_altitude), (altitude_field, '<=', max_altitude)) if value is not None]
+        unknown = [field for field in fields + [column for column, _, _ in ranges] if field not in columns]
+        if unknown:
+            raise KeyError(f"Unknown fields: {', '.join(dict.fromkeys(unknown))}")
+
+        conditions = [f'"{column}" {operator} ?' for column, operator, _ in ranges]
+        parameters = [value for _, _, value in ranges]
+        query = f'SELECT {_quoted(fields) or "id"} FROM "{table}"'
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY id'
+        if limit is not None:
+            query += ' LIMIT ?'
+            parameters.append(int(limit))
+        rows = connection.execute(query, parameters).fetchall()
+    finally:
+        connection.close()
+
+    result = {field: [row[index] for row in rows] for index, field in enumerate(fields)}
+    result['Count'] = len(rows)
+    return result
+
+def export_database_to_csv(filename, csv_filename, header=None, fields=None, table='telemetry'):
+    """
+    Writes a database written by SqliteSink to CSV, in insert order. header gives
+    the column titles (e.g. the live CSV log's), the field names are used otherwise.
+    NULL values are written as empty cells.
+
+    Returns:
+    int: Number of data rows written.
+    """
+    connection = sqlite3.connect(f"file:{filename}?mode=ro", uri=True)
+    try:
+        columns = [row[1] for row in connection.execute(f'PRAGMA table_info("{table}")')][1:]
+        fields = columns if fields is None else list(fields)
+        unknown = [field for field in fields if field not in columns]
+        if unknown:
+            raise KeyError(f"Unknown fields: {', '.join(unknown)}")
+        written = 0
+        with open(csv_filename, 'w', newline='') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(header if header is not None else fields)
+            cursor = connection.execute(f'SELECT {_quoted(fields)} FROM "{table}" ORDER BY id')
+            while True:
+                rows = cursor.fetchmany(1000)
+                if not rows:
+                    break
+                writer.writerows(rows)
+                written += len(rows)
+    finally:
+        connection.close()
+    return written
+
+class BufferedWriter:
+    """
+    Queues rows from any number of producers and writes them in batches from a
+    dedicated writer thread, so a slow SD card never stalls the caller.
+
+    Args:
+    sink: Object with write_rows(rows), flush(), sync() and close(), e.g. CsvSink.
+    sync_policy (str): When to fsync: 'rows' every sync_rows rows, 'interval' every
+        sync_interval_ms milliseconds, or 'shutdown' only when the writer is closed.
+    sync_rows (int): Rows between fsyncs for the 'rows' policy.
+    sync_interval_ms (int): Time between fsyncs for the 'interval' policy.
+    max_queue (int): Rows that can be waiting before new rows are dropped.
+    batch_size (int): Most rows written per batch.
+    """
+
+    def __init__(self, sink, sync_policy='interval', sync_rows=100, sync_interval_ms=1000, max_queue=10000, batch_size=256):
+        if sync_policy not in ('rows', 'interval', 'shutdown'):
+            raise ValueError(f"Unknown sync policy: {sync_policy}")
+        self.sink = sink
+        self.sync_policy = sync_policy
+        self.sync_rows = sync_rows
+        self.sync_interval = sync_interval_ms / 1000
+        self.batch_size = batch_size
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.stats_lock = threading.Lock()
+        self.stats = {
+            'rows_written': 0,
+            'rows_dropped': 0,
+            'batches': 0,
+            'last_flush_ms': 0.0,
+            'max_flush_ms': 0.0,
+            'syncs': 0,
+            'last_sync_ms': 0.0,
+            'max_sync_ms': 0.0,
+        }
+        self.closed = False
+        self.thread = threading.Thread(target=self._writer_loop, name="buffered-writer", daemon=True)
+        self.thread.start()
+
+    def write(self, row):
+        # Queue a row without blocking, rows are dropped (and counted) if the queue is full
+        try:
+            self.queue.put_nowait(row)
+        except queue.Full:
+            with self.stats_lock:
+                self.stats['rows_dropped'] += 1
+            logging.warning("Log writer queue full, row dropped.")
+
+    def close(self):
+        # Write everything still queued, fsync and close the sink
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(_CLOSE)
+        self.thread.join()
+
+    def get_stats(self):
+        with self.stats_lock:
+            stats = dict(self.stats)
+        stats['queue_depth'] = self.queue.qsize()
+        return stats
+
+    def _writer_loop(self):
+        rows_since_sync = 0
+        last_sync = time.monotonic()
+        closing = False
+        while not closing:
+            # Wait for the first row, but wake up in time for an interval sync
+            timeout = None
+            if self.sync_policy == 'interval' and rows_since_sync:
+                timeout = max(0, last_sync + self.sync_interval - time.monotonic())
+            batch = []
+            try:
+                row = self.queue.get(timeout=timeout)
+                if row is _CLOSE:
+                    closing = True
+                else:
+                    batch.append(row)
+                # Drain whatever else is already waiting
+                while not closing and len(batch) < self.batch_size:
+                    row = self.queue.get_nowait()
+                    if row is _CLOSE:
+                        closing = True
+                    else:
+                        batch.append(row)
+            except queue.Empty:
+                pass
+
+            if batch:
+                try:
+                    start = time.perf_counter()
+                    self.sink.write_rows(batch)
+                    self.sink.flush()
+                    flush_ms = (time.perf_counter() - start) * 1000
+                    rows_since_sync += len(batch)
+                    with self.stats_lock:
+                        self.stats['rows_written'] += len(batch)
+                        self.stats['batches'] += 1
+                        self.stats['last_flush_ms'] = flush_ms
+                        self.stats['max_flush_ms'] = max(self.stats['max_flush_ms'], flush_ms)
+                    if flush_ms > slow_flush_ms:
+                        logging.warning(f"Slow log flush: {round(flush_ms, 1)} ms for {len(batch)} rows")
+                except Exception as e:
+                    logging.error(f"Error writing log rows: {e}")
+
+            due = (self.sync_policy == 'rows' and rows_since_sync >= self.sync_rows) or \
+                  (self.sync_policy == 'interval' and rows_since_sync and time.monotonic() - last_sync >= self.sync_interval) or \
+                  (closing and rows_since_sync)
+            if due:
+                self._sync()
+                rows_since_sync = 0
+                last_sync = time.monotonic()
+
+        try:
+            self.sink.close()
+        except Exception as e:
+            logging.error(f"Error closing log: {e}")
+
+    def _sync(self):
+        try:
+            start = time.perf_counter()
+            self.sink.sync()
+            sync_ms = (time.perf_counter() - start) * 1000
+            with self.stats_lock:
+                self.stats['syncs'] += 1
+                self.stats['last_sync_ms'] = sync_ms
+                self.stats['max_sync_ms'] = max(self.stats['max_sync_ms'], sync_ms)
+        except Exception as e:
+            logging.error(f"Error syncing log: {e}")
+
+if __name__ == "__main__":
+    # Merge a log with its backfill by hand, e.g. after a crash: python <this file> data_1.csv [data_1_backfill.csv ...]
+    # The backfill file defaults to data_1_backfill.csv, the result goes to data_1_merged.csv
+    log_filename = sys.argv[1]
+    backfill_filenames = sys.argv[2:] or [log_filename.replace('.csv', '_backfill.csv')]
+    output_filename = log_filename.replace('.csv', '_merged.csv')
+    rows = merge_csv_by_time([log_filename] + backfill_filenames, output_filename)
+    print(f"Wrote {rows} rows to {output_filename}")
@@ -0,0 +1,96 @@
+import numpy as np
+
+# Downsampling for plots and the history API. Every function returns the sorted indices
+# of the points to keep, so any number of columns can be sliced the same way.
+
+def stride_indices(count, max_points):
+    # Evenly spaced points, first and last always included
+    if count <= max_points:
+        return np.arange(count)
+    return np.unique(np.linspace(0, count - 1, max_points).round().astype(np.int64))
+
+def minmax_indices(columns, max_points):
+    """
+    Min/max bucketing: the points are split into equal buckets and the smallest and
+    largest value of every column is kept from each bucket, so spikes survive
+    downsampling. At most max_points indices are returned.
+
+    Args:
+    columns (list): 1-D arrays of equal length, NaN for missing values.
+    max_points (int): Largest number of points to return.
+    """
+    count = len(columns[0]) if columns else 0
+    if count <= max_points:
+        return np.arange(count)
+    bucket_count = max(max_points // (2 * len(columns)), 1)
+    bucket_size = -(-count // bucket_count)
+    bucket_count = -(-count // bucket_size)
+    starts = np.arange(bucket_count) * bucket_size
+    keep = [np.array([0, count - 1])]
+    for column in columns:
+        # Pad to whole buckets so every bucket is one row, NaN never wins
+        column = np.asarray(column, dtype=np.float64)
+        padded = np.full(bucket_count * bucket_size, np.nan)
+        padded[:count] = column
+        padded = padded.reshape(bucket_count, bucket_size)
+        missing = np.isnan(padded)
+        has_values = ~missing.all(axis=1)
+        lowest = np.where(missing, np.inf, padded).argmin(axis=1)
+        highest = np.where(missing, -np.inf, padded).argmax(axis=1)
+        keep.append((starts + lowest)[has_values])
+        keep.append((starts + highest)[has_values])
+    indices = np.unique(np.concatenate(keep))
+    if len(indices) > max_points:
+        indices = indices[stride_indices(len(indices), max_points)]
+    return indices
+
+def lttb_indices(x, y, max_points):
+    """
+    Largest-Triangle-Three-Buckets: keeps the first and last point and, from every
+    bucket in between, the point forming the largest triangle with the point kept
+    from the previous bucket and the average of the next bucket. Keeps the visual
+    shape of a line with a fixed number of points.
+
+    Args:
+    x (array): X values, increasing.
+    y (array): Y values, NaN points are never chosen.
+    max_points (int): Number of points to return, at least 3.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    count = len(x)
+    if count <= max_points or max_points < 3:
+        return np.arange(count)
+
+    # Buckets for everything between the first and the last point
+    edges = np.linspace(1, count - 1, max_points - 1).astype(np.int64)
+
+    # Average of every bucket, plus the last point as the bucket after the final one
+    valid = ~np.isnan(y)
+    sums_x = np.add.reduceat(x[1:count - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(np.where(valid, y, 0)[1:count - 1], edges[:-1] - 1)
+    sizes = np.diff(edges)
+    valid_counts = np.add.reduceat(valid[1:count - 1].astype(np.int64), edges[:-1] - 1)
+    average_x = np.append(sums_x / sizes, x[-1])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        average_y = np.append(sums_y / valid_counts, y[-1])
+
+    indices = np.empty(max_points, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = count - 1
+    previous_x, previous_y = x[0], y[0]
+    for bucket in range(max_points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_x, next_y = average_x[bucket + 1], average_y[bucket + 1]
+        if np.isnan(next_y):
+            next_y = previous_y
+
+        # Twice the triangle area, the constant factor doesn't change which point wins
+        areas = np.abs((previous_x - next_x) * (y[start:end] - previous_y) -
+                       (previous_x - x[start:end]) * (next_y - previous_y))
+        chosen = start
+        if valid_counts[bucket]:
+            chosen = start + int(np.nanargmax(areas)) if not np.isnan(previous_y) else start + int(np.argmax(valid[start:end]))
+        indices[bucket + 1] = chosen
+        previous_x, previous_y = x[chosen], y[chosen]
+    return indices
@@ -0,0 +1,212 @@
+import math
+import threading
+import time
+import numpy as np
+
+# Wind profile
+altitude_bin_size = 250  # Altitude band sharing one wind estimate, Distance in meters
+max_wind_altitude = 40000  # Highest altitude with a wind band, Distance in meters
+min_wind_sd = 2.0  # Smallest wind uncertainty of a measured band, m/s
+unmeasured_wind_sd = 5.0  # Wind uncertainty of bands the balloon hasn't flown through, m/s
+wind_bias_sd = 1.5  # Error shared by every band of one scenario, m/s
+
+# Flight model
+sea_level_descent_rate = 5.0  # Descent rate under the parachute at sea level, m/s
+descent_rate_sd = 0.1  # Relative error of the descent rate
+scale_height = 7238.3  # Air density scale height, Distance in meters, descent rate grows with altitude as 1/sqrt(density)
+burst_altitude = 30000  # Expected burst (or mission timer cutdown) altitude, Distance in meters
+burst_altitude_sd = 1500  # Distance in meters
+ascent_rate_sd = 0.1  # Relative error of the ascent rate
+vertical_rate_smoothing = 0.1  # Weight of each new sample in the vertical rate average
+ascending_rate = 1.0  # Vertical rates above this mean the balloon is still going up, m/s
+
+# Landing ellipse
+ellipse_scale = math.sqrt(5.991)  # Chi-square 95% for two dimensions, the ellipse holds 95% of the landings
+ellipse_points = 36
+
+meters_per_degree = 111320.0
+
+# Payload timestamps are milliseconds that wrap around at 2^32
+timestamp_modulo = 2**32
+
+class LandingPredictor:
+    """
+    Predicts where the payload lands with a Monte Carlo over wind and descent rate.
+
+    The balloon drifts with the wind, so its GPS velocity during the flight is
+    recorded as the wind of the altitude band it was measured in. A prediction
+    follows thousands of perturbed scenarios from the latest fix: up to burst at
+    the current ascent rate if the balloon is still rising (or straight down for a
+    cutdown now), then down under the parachute. Every scenario crosses the
+    same altitude bands, so the drift of all of them is one matrix product of
+    time spent per band and wind per band, with no time stepping.
+
+    Args:
+    scenarios (int): Scenarios per prediction.
+    ground_altitude (float): Landing altitude, Distance in meters. The first fix's altitude (the launch site) if None.
+    seed (int): Random seed, for repeatable predictions.
+    """
+
+    def __init__(self, scenarios=2000, ground_altitude=None, seed=None):
+        self.scenarios = scenarios
+        self.ground_altitude = ground_altitude
+        self.random = np.random.default_rng(seed)
+        band_count = int(math.ceil(max_wind_altitude / altitude_bin_size))
+        self.band_bottoms = np.arange(band_count) * altitude_bin_size
+        self.band_tops = self.band_bottoms + altitude_bin_size
+
+        # Running sums of the wind measured in each band
+        self.counts = np.zeros(band_count)
+        self.sums = np.zeros((band_count, 2))  # East, north
+        self.squares = np.zeros((band_count, 2))
+
+        self.latest = None  # (timestamp in ms, latitude, longitude, altitude) of the newest fix
+        self.vertical_rate = 0.0
+        self.lock = threading.Lock()
+        self.updated = threading.Event()  # Set when a new fix arrives
+
+    def update(self, sample):
+        # Add a received sample, cheap enough for the receive thread
+        try:
+            timestamp = int(sample['Timestamp'])
+            latitude, longitude = float(sample['Latitude']), float(sample['Longitude'])
+            altitude, speed, heading = float(sample['Altitude']), float(sample['Speed']), float(sample['Heading'])
+        except (KeyError, TypeError, ValueError):
+            return
+        if (latitude, longitude) == (0, 0):
+            return  # No GPS fix
+
+        with self.lock:
+            if self.ground_altitude is None:
+                self.ground_altitude = altitude
+            if self.latest is not None:
+                elapsed_ms = (timestamp - self.latest[0]) % timestamp_modulo
+                if elapsed_ms == 0 or elapsed_ms >= timestamp_modulo // 2:
+                    return  # Old or repeated sample
+                rate = (altitude - self.latest[3]) / (elapsed_ms / 1000)
+                self.vertical_rate += vertical_rate_smoothing * (rate - self.vertical_rate)
+            self.latest = (timestamp, latitude, longitude, altitude)
+
+            band = min(max(int(altitude // altitude_bin_size), 0), len(self.counts) - 1)
+            wind = np.array([speed * math.sin(math.radians(heading)), speed * math.cos(math.radians(heading))])
+            self.counts[band] += 1
+            self.sums[band] += wind
+            self.squares[band] += wind * wind
+        self.updated.set()
+
+    def wind_profile(self):
+        """
+        Returns (mean, sd), arrays of the east and north wind of every band. Bands
+        that haven't been measured take the wind of the nearest measured band,
+        with a larger uncertainty.
+        """
+        with self.lock:
+            counts, sums, squares = self.counts.copy(), self.sums.copy(), self.squares.copy()
+        measured = counts > 0
+        mean = np.zeros_like(sums)
+        sd = np.full_like(sums, unmeasured_wind_sd)
+        if measured.any():
+            centers = (self.band_bottoms + self.band_tops) / 2
+            band_mean = sums[measured] / counts[measured][:, None]
+            band_variance = np.maximum(squares[measured] / counts[measured][:, None] - band_mean ** 2, 0)
+            for axis in range(2):
+                mean[:, axis] = np.interp(centers, centers[measured], band_mean[:, axis])
+            sd[measured] = np.maximum(np.sqrt(band_variance), min_wind_sd)
+        return mean, sd
+
+    def _drift(self, bands, start, end, rate, wind):
+        # Meters moved by every scenario between altitudes start and end (arrays), rate(altitude) gives m/s
+        bottom = np.maximum(self.band_bottoms[bands], np.minimum(start, end)[:, None])
+        top = np.minimum(self.band_tops[bands], np.maximum(start, end)[:, None])
+        thickness = np.clip(top - bottom, 0, None)
+        seconds = thickness / rate((top + bottom) / 2)
+        # Time spent in each band times the wind in it, summed over the bands
+        return np.matmul(seconds[:, None, :], wind)[:, 0, :], seconds.sum(axis=1)
+
+    def predict(self, cutdown_now=False):
+        """
+        Runs the Monte Carlo from the latest fix.
+
+        Args:
+        cutdown_now (bool): Start the descent at the current altitude instead of at burst.
+
+        Returns:
+        dict: Mean landing position, the 95% landing ellipse (axes, bearing of the
+        major axis and a polygon of (latitude, longitude) points), the time to
+        landing and how long the prediction took. None before the first fix.
+        """
+        started = time.perf_counter()
+        with self.lock:
+            if self.latest is None:
+                return None
+            fix_time, latitude, longitude, altitude = self.latest
+            vertical_rate = self.vertical_rate
+            ground = self.ground_altitude
+        count = self.scenarios
+        random = self.random
+        ascending = vertical_rate > ascending_rate and not cutdown_now
+        current = np.full(count, altitude)
+        if ascending:
+            burst = np.maximum(random.normal(burst_altitude, burst_altitude_sd, count), altitude)
+
+        # Only the bands between the ground and the highest altitude any scenario reaches
+        highest = burst.max() if ascending else altitude
+        low, high = (min(max(int(value // altitude_bin_size), 0), len(self.counts) - 1) for value in (min(ground, altitude), highest))
+        bands = slice(low, high + 1)
+
+        # Perturbed wind of every band in every scenario, a shared bias plus band noise
+        mean, sd = self.wind_profile()
+        mean, sd = mean[bands], sd[bands]
+        bias = random.normal(0, wind_bias_sd, (count, 1, 2))
+        wind = mean[None, :, :] + bias + random.standard_normal((count, len(mean), 2)) * sd[None, :, :]
+
+        position = np.zeros((count, 2))
+        seconds = np.zeros(count)
+        if ascending:
+            # Rise to the perturbed burst altitude at the measured ascent rate
+            ascent_rate = vertical_rate * np.clip(random.normal(1, ascent_rate_sd, count), 0.5, 1.5)
+            drift, rise_seconds = self._drift(bands, current, burst, lambda middle: ascent_rate[:, None], wind)
+            position += drift
+            seconds += rise_seconds
+            current = burst
+
+        # Fall under the parachute, faster in thin air
+        descent_factor = np.clip(random.normal(1, descent_rate_sd, count), 0.5, 1.5)
+        descent_rate = lambda middle: sea_level_descent_rate * descent_factor[:, None] * np.exp(middle / (2 * scale_height))
+        drift, fall_seconds = self._drift(bands, current, np.full(count, ground), descent_rate, wind)
+        position += drift
+        seconds += fall_seconds
+
+        # Landing ellipse from the covariance of the east/north offsets
+        center = position.mean(axis=0)
+        covariance = np.cov(position, rowvar=False)
+        eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+        semi_minor, semi_major = ellipse_scale * np.sqrt(np.maximum(eigenvalues, 0))
+        major_east, major_north = eigenvectors[:, 1]
+        bearing = math.degrees(math.atan2(major_east, major_north)) % 180
+
+        angles = np.linspace(0, 2 * math.pi, ellipse_points, endpoint=False)
+        offsets = center + (np.outer(np.cos(angles) * semi_major, eigenvectors[:, 1]) +
+                            np.outer(np.sin(angles) * semi_minor, eigenvectors[:, 0]))
+        polygon = [self._to_degrees(latitude, longitude, east, north) for east, north in offsets]
+        landing_latitude, landing_longitude = self._to_degrees(latitude, longitude, *center)
+
+        return {
+            'Latitude': landing_latitude,
+            'Longitude': landing_longitude,
+            'Semi_Major_m': round(float(semi_major), 1),
+            'Semi_Minor_m': round(float(semi_minor), 1),
+            'Bearing': round(bearing, 1),
+            'Ellipse': polygon,
+            'Time_To_Landing_s': round(float(np.median(seconds)), 1),
+            'Phase': 'ASCENT' if ascending else 'DESCENT',
+            'Cutdown_Now': cutdown_now,
+            'Fix_Time': fix_time,
+            'Scenarios': count,
+            'Compute_ms': round((time.perf_counter() - started) * 1000, 1),
+        }
+
+    def _to_degrees(self, latitude, longitude, east, north):
+        # Position east/north meters away from (latitude, longitude)
+        return (round(float(latitude + north / meters_per_degree), 6),
+                round(float(longitude + east / (meters_per_degree * max(math.cos(math.radians(latitude)), 0.01))), 6))
@@ -0,0 +1,163 @@
+import threading
+import time
+from collections import deque, OrderedDict
+
+SEQUENCE_MODULO = 2**16  # Frame sequence numbers are u16 and wrap around
+
+# Results of record_frame()
+FRAME_NEW = 'new'  # Next in sequence or after a gap
+FRAME_LATE = 'late'  # Fills a gap, e.g. a retransmission
+FRAME_DUPLICATE = 'duplicate'  # Already received
+
+class LinkStatistics:
+    """
+    Rolling link quality statistics for the telemetry downlink.
+
+    Frames are recorded with their sequence number as they arrive. Gaps in the
+    sequence count as lost frames until (unless) the missing frame turns up late,
+    in which case it is counted as out of order instead. Jitter is the RFC 3550
+    running estimate, computed from the payload timestamp of each frame.
+
+    The payload numbers its frames from 0 again when it reboots. A frame further
+    behind than restart_window (the payload's retransmit buffer, nothing older can
+    be resent) starts a new stream instead of being dropped as a duplicate, and
+    restart() does the same as soon as the payload reports a new boot.
+    """
+
+    def __init__(self, window=30, max_missing=4096, restart_window=2048):
+        self.window = window  # Seconds covered by the rate statistics
+        self.max_missing = max_missing  # Missing sequence numbers remembered for late arrivals
+        self.restart_window = restart_window  # Frames behind the newest one that can still be duplicates or late
+        self.lock = threading.Lock()
+        self.arrivals = deque()  # (arrival time, samples in frame)
+        self.missing = OrderedDict()  # Sequence numbers skipped over, oldest first
+        self.expected_sequence = None
+        self.frames_received = 0
+        self.samples_received = 0
+        self.frames_lost = 0
+        self.out_of_order = 0
+        self.duplicates = 0
+        self.restarts = 0
+        self.partial_frames = 0
+        self.jitter_ms = 0.0
+        self.last_transit_ms = None
+        self.last_arrival = None
+
+    def record_frame(self, sequence, samples=1, sent_ms=None, now=None):
+        """
+        Records one received frame.
+
+        Args:
+        sequence (int): Frame sequence number, or None for frames without one.
+        samples (int): Number of samples carried by the frame.
+        sent_ms (int): Payload timestamp of the frame in ms, used for jitter.
+        now (float): Arrival time, defaults to time.time().
+
+        Returns:
+        str: FRAME_NEW, FRAME_LATE or FRAME_DUPLICATE. Frames without a sequence number are always new.
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            status = FRAME_NEW
+            if sequence is not None:
+                status = self._record_sequence(sequence, now)
+            if status == FRAME_DUPLICATE:
+                return status
+
+            self.frames_received += 1
+            self.samples_received += samples
+            self.arrivals.append((now, samples))
+            self.last_arrival = now
+            self._expire(now)
+
+            # Late frames were held up on purpose and would only distort the jitter estimate
+            if sent_ms is not None and status == FRAME_NEW:
+                transit_ms = (now * 1000 - sent_ms) % 2**32
+                if self.last_transit_ms is not None:
+                    difference = abs(transit_ms - self.last_transit_ms)
+                    self.jitter_ms += (difference - self.jitter_ms) / 16
+                self.last_transit_ms = transit_ms
+            return status
+
+    def _record_sequence(self, sequence, now):
+        if self.expected_sequence is None:
+            self.expected_sequence = (sequence + 1) % SEQUENCE_MODULO
+            return FRAME_NEW
+        gap = (sequence - self.expected_sequence) % SEQUENCE_MODULO
+        if gap == 0:
+            self.expected_sequence = (sequence + 1) % SEQUENCE_MODULO
+        elif gap < SEQUENCE_MODULO // 2:
+            # Jumped ahead, everything in between is lost for now
+            for skipped in range(self.expected_sequence, self.expected_sequence + gap):
+                self.missing[skipped % SEQUENCE_MODULO] = now
+            while len(self.missing) > self.max_missing:
+                self.missing.popitem(last=False)
+            self.frames_lost += gap
+            self.expected_sequence = (sequence + 1) % SEQUENCE_MODULO
+        elif sequence in self.missing:
+            # A frame we had given up on arrived late
+            del self.missing[sequence]
+            self.frames_lost -= 1
+            self.out_of_order += 1
+            return FRAME_LATE
+        elif (self.expected_sequence - 1 - sequence) % SEQUENCE_MODULO >= self.restart_window:
+            # Too old to be a retransmission, the payload has started counting again
+            self._restart()
+            self.expected_sequence = (sequence + 1) % SEQUENCE_MODULO
+        else:
+            self.duplicates += 1
+            return FRAME_DUPLICATE
+        return FRAME_NEW
+
+    def restart(self):
+        # The payload rebooted, its next frame starts a new sequence
+        with self.lock:
+            self._restart()
+
+    def _restart(self):
+        # Frames still missing from the old stream can't be resent any more, they stay counted as lost
+        self.expected_sequence = None
+        self.missing.clear()
+        self.restarts += 1
+
+    def record_partial(self):
+        # A frame that never completed reassembly and was discarded
+        with self.lock:
+            self.partial_frames += 1
+
+    def _expire(self, now):
+        while self.arrivals and now - self.arrivals[0][0] > self.window:
+            self.arrivals.popleft()
+
+    def get_missing(self, min_age=0):
+        # Sequence numbers still missing, oldest first, that have been missing for at least min_age seconds
+        cutoff = time.time() - min_age
+        with self.lock:
+            return [sequence for sequence, missed in self.missing.items() if missed <= cutoff]
+
+    def discard_missing(self, sequences):
+        # Stop waiting for frames that are never going to arrive, they stay counted as lost
+        with self.lock:
+            for sequence in sequences:
+                self.missing.pop(sequence, None)
+
+    def get_stats(self):
+        now = time.time()
+        with self.lock:
+            self._expire(now)
+            window_samples = sum(samples for _, samples in self.arrivals)
+            expected = self.frames_received + self.frames_lost
+            return {
+                'Frames_Per_Second': round(len(self.arrivals) / self.window, 3),
+                'Samples_Per_Second': round(window_samples / self.window, 3),
+                'Frames_Received': self.frames_received,
+                'Samples_Received': self.samples_received,
+                'Frames_Lost': self.frames_lost,
+                'Loss_Percent': round(100 * self.frames_lost / expected, 2) if expected else 0.0,
+                'Out_Of_Order': self.out_of_order,
+                'Duplicates': self.duplicates,
+                'Stream_Restarts': self.restarts,
+                'Partial_Frames': self.partial_frames,
+                'Jitter_ms': round(self.jitter_ms, 1),
+                'Seconds_Since_Last_Frame': round(now - self.last_arrival, 1) if self.last_arrival else None,
+            }
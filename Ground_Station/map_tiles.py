@@ -0,0 +1,381 @@
+import io
+import math
+import queue
+import sqlite3
+import sys
+import threading
+import time
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from PIL import Image, ImageTk
+from tkintermapview import TkinterMapView
+
+# Configure the tile source
+default_tile_server = "https://a.tile.openstreetmap.org/{z}/{x}/{y}.png"
+user_agent = "TkinterMapView"  # Sent with every tile request, tile servers block anonymous clients
+request_timeout = 10  # Time in seconds
+
+# Web Mercator can't show the poles, latitudes are clamped to this
+max_latitude = 85.0511287798
+
+def tile_xy(latitude, longitude, zoom):
+    # Slippy map tile column and row containing a position
+    latitude = max(min(latitude, max_latitude), -max_latitude)
+    n = 2 ** zoom
+    x = int((longitude + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(latitude))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+def tiles_in_box(top_left, bottom_right, min_zoom, max_zoom):
+    # Every (zoom, x, y) covering the box between two (latitude, longitude) corners
+    for zoom in range(min_zoom, max_zoom + 1):
+        left, top = tile_xy(top_left[0], top_left[1], zoom)
+        right, bottom = tile_xy(bottom_right[0], bottom_right[1], zoom)
+        for x in range(min(left, right), max(left, right) + 1):
+            for y in range(min(top, bottom), max(top, bottom) + 1):
+                yield zoom, x, y
+
+def project(latitude, longitude, heading, distance):
+    # Position distance meters away along heading (degrees from north), flat earth is plenty for tile lookahead
+    north = distance * math.cos(math.radians(heading))
+    east = distance * math.sin(math.radians(heading))
+    latitude_new = latitude + north / 111320.0
+    longitude_new = longitude + east / (111320.0 * max(math.cos(math.radians(latitude)), 0.01))
+    return latitude_new, longitude_new
+
+def download_tile(session, tile_server, zoom, x, y):
+    # Fetch one tile, returns the image bytes or None if the server has no tile there
+    url = tile_server.replace("{x}", str(x)).replace("{y}", str(y)).replace("{z}", str(zoom))
+    response = session.get(url, headers={"User-Agent": user_agent}, timeout=request_timeout)
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    return response.content
+
+class TileCache:
+    """
+    Map tiles stored on disk in an MBTiles file (SQLite), so the map works with no
+    internet at the launch site. An MBTiles file holds one tile source, its URL is
+    kept in the metadata table. Each thread gets its own connection, and the
+    database runs in WAL mode so the GUI's tile loaders can read while tiles are
+    being written.
+
+    Args:
+    filename (str): MBTiles file, created if it doesn't exist.
+    tile_server (str): URL template of the tile source, with {z}, {x} and {y}.
+    """
+
+    def __init__(self, filename, tile_server=default_tile_server):
+        self.filename = filename
+        self.tile_server = tile_server
+        self.local = threading.local()
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("CREATE TABLE IF NOT EXISTS metadata (name TEXT, value TEXT)")
+        connection.execute("CREATE UNIQUE INDEX IF NOT EXISTS name ON metadata (name)")
+        connection.execute("CREATE TABLE IF NOT EXISTS tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB)")
+        connection.execute("CREATE UNIQUE INDEX IF NOT EXISTS tile_index ON tiles (zoom_level, tile_column, tile_row)")
+        stored_server = connection.execute("SELECT value FROM metadata WHERE name = 'tile_server'").fetchone()
+        if stored_server is not None and stored_server[0] != tile_server:
+            raise ValueError(f"{filename} holds tiles from {stored_server[0]}, not {tile_server}")
+        connection.executemany("INSERT OR IGNORE INTO metadata (name, value) VALUES (?, ?)",
+                               [('name', 'Ground station map'), ('format', 'png'), ('type', 'baselayer'),
+                                ('version', '1'), ('tile_server', tile_server)])
+        connection.commit()
+
+    def _connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.filename, timeout=10)
+            self.local.connection = connection
+        return connection
+
+    def _row(self, zoom, y):
+        # MBTiles numbers rows from the south (TMS), slippy map tiles from the north
+        return (2 ** zoom - 1) - y
+
+    def get(self, zoom, x, y):
+        # Image bytes of a tile, or None if it isn't cached
+        result = self._connection().execute("SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+                                            (zoom, x, self._row(zoom, y))).fetchone()
+        return None if result is None else result[0]
+
+    def contains(self, zoom, x, y):
+        return self._connection().execute("SELECT 1 FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+                                          (zoom, x, self._row(zoom, y))).fetchone() is not None
+
+    def put_many(self, tiles):
+        # Store (zoom, x, y, data) tuples in one transaction
+        connection = self._connection()
+        with connection:
+            connection.executemany("INSERT OR REPLACE INTO tiles (zoom_level, tile_column, tile_row, tile_data) VALUES (?, ?, ?, ?)",
+                                   [(zoom, x, self._row(zoom, y), sqlite3.Binary(data)) for zoom, x, y, data in tiles])
+
+    def put(self, zoom, x, y, data):
+        self.put_many([(zoom, x, y, data)])
+
+    def count(self):
+        return self._connection().execute("SELECT COUNT(*) FROM tiles").fetchone()[0]
+
+def seed(cache, top_left, bottom_right, min_zoom, max_zoom, workers=8, batch_size=100):
+    """
+    Downloads every tile of a box and zoom range that isn't cached yet. Run this
+    before the flight while there is still internet.
+
+    Args:
+    cache (TileCache): Where the tiles are stored.
+    top_left (tuple): (latitude, longitude) of one corner of the box.
+    bottom_right (tuple): (latitude, longitude) of the opposite corner.
+    min_zoom (int): Lowest zoom level to store.
+    max_zoom (int): Highest zoom level to store, each level has four times the tiles of the one before.
+    workers (int): Downloads running at once.
+    batch_size (int): Tiles written per transaction.
+
+    Returns:
+    dict: Tiles in the box, already cached, downloaded, missing on the server and failed.
+    """
+    tiles = list(tiles_in_box(top_left, bottom_right, min_zoom, max_zoom))
+    missing = [tile for tile in tiles if not cache.contains(*tile)]
+    stats = {'Tiles': len(tiles), 'Cached': len(tiles) - len(missing), 'Downloaded': 0, 'Not_Found': 0, 'Failed': 0}
+    logging.info(f"Seeding {len(missing)} tiles ({stats['Cached']} already cached)")
+
+    session = requests.Session()
+    def fetch(tile):
+        try:
+            return tile, download_tile(session, cache.tile_server, *tile), None
+        except requests.exceptions.RequestException as e:
+            return tile, None, e
+
+    batch = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for (zoom, x, y), data, error in executor.map(fetch, missing):
+            if error is not None:
+                stats['Failed'] += 1
+                logging.warning(f"Could not download tile {zoom}/{x}/{y}: {error}")
+                continue
+            if data is None:
+                stats['Not_Found'] += 1
+                continue
+            batch.append((zoom, x, y, data))
+            stats['Downloaded'] += 1
+            if len(batch) >= batch_size:
+                cache.put_many(batch)
+                batch = []
+                logging.info(f"{stats['Downloaded']} of {len(missing)} tiles downloaded")
+    if batch:
+        cache.put_many(batch)
+    return stats
+
+class TileImageCache(OrderedDict):
+    """
+    Decoded tile images kept in memory, least recently used first. The most
+    recently used max_tiles are kept, older ones are decoded again from disk
+    when needed.
+    """
+
+    def __init__(self, max_tiles):
+        super().__init__()
+        self.max_tiles = max_tiles
+        self.lock = threading.Lock()
+
+    def __getitem__(self, key):
+        with self.lock:
+            self.move_to_end(key)
+            return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        # One locked lookup, another thread can evict the key between a separate 'in' and [] lookup
+        with self.lock:
+            if not OrderedDict.__contains__(self, key):
+                return default
+            self.move_to_end(key)
+            return OrderedDict.__getitem__(self, key)
+
+    def __setitem__(self, key, value):
+        with self.lock:
+            super().__setitem__(key, value)
+            self.move_to_end(key)
+            while len(self) > self.max_tiles:
+                self.popitem(last=False)
+
+class CachedMapView(TkinterMapView):
+    """
+    TkinterMapView that loads tiles from a TileCache and never waits on the network.
+
+    Tiles are decoded from the cache by the map's own loader threads. A tile that
+    isn't cached is shown blank and queued for download, and it is drawn once the
+    download lands in the cache. Downloads are paused for a while after a network
+    error, so a launch site without internet just runs from the cache.
+    prefetch_track() loads the tiles around the balloon and along its heading
+    ahead of time.
+
+    Args:
+    master: Parent widget.
+    tile_cache (TileCache): Tiles on disk, also decides the tile source.
+    offline (bool): Only use cached tiles, never download.
+    memory_tiles (int): Decoded tiles kept in memory (about 256 KB each).
+    download_threads (int): Downloads running at once.
+    """
+
+    def __init__(self, master, tile_cache, offline=False, memory_tiles=512, download_threads=4, **kwargs):
+        # The base class starts its loader threads, which call request_image, so this has to be set up first
+        self.tile_cache = tile_cache
+        self.offline = offline
+        self.memory_tiles = memory_tiles
+        self.download_queue = queue.LifoQueue()  # Newest requests first, those are the tiles on screen
+        self.pending_downloads = set()
+        self.max_pending_downloads = 2000
+        self.downloaded_tiles = queue.Queue()  # Tiles to redraw now that they are cached
+        self.network_retry_delay = 30  # Time in seconds downloads are paused after a network error
+        self.network_down_until = 0
+        self.download_lock = threading.Lock()
+        self.downloads_enabled = False
+        self.tile_stats = {'Memory_Hits': 0, 'Disk_Hits': 0, 'Misses': 0, 'Downloaded': 0, 'Download_Errors': 0}
+
+        # Track prefetching
+        self.prefetch_radius = 2  # Tiles around every prefetched position
+        self.prefetch_lookahead = (0, 300, 900)  # Time in seconds ahead of the balloon at its current speed
+        self.prefetch_request = None
+        self.prefetch_event = threading.Event()
+
+        super().__init__(master, **kwargs)
+        self.set_tile_server(tile_cache.tile_server)
+
+        # Only now, so the base class's start-up position doesn't queue downloads
+        self.downloads_enabled = True
+        for _ in range(download_threads):
+            threading.Thread(target=self.download_tiles, daemon=True).start()
+        threading.Thread(target=self.prefetch_tiles, daemon=True).start()
+        self.after(100, self.redraw_downloaded_tiles)
+
+    def set_tile_server(self, tile_server, tile_size=256, max_zoom=19):
+        super().set_tile_server(tile_server, tile_size, max_zoom)
+        self.tile_image_cache = TileImageCache(self.memory_tiles)
+
+    def get_tile_image_from_cache(self, zoom, x, y):
+        # Replaces the base class's check-then-read, a KeyError there would kill the loader thread
+        image = self.tile_image_cache.get(f"{zoom}{x}{y}", False)
+        if image is not False:
+            self.tile_stats['Memory_Hits'] += 1
+        return image
+
+    def request_image(self, zoom, x, y, db_cursor=None):
+        # Called from the map's loader threads: decode the tile from disk, or queue it for download
+        try:
+            data = self.tile_cache.get(zoom, x, y)
+        except sqlite3.Error as e:
+            logging.error(f"Error reading map tile {zoom}/{x}/{y}: {e}")
+            return self.empty_tile_image
+        if data is None:
+            self.tile_stats['Misses'] += 1
+            self.queue_download(zoom, x, y)
+            # Not kept in memory, so the tile is looked up again once it has been downloaded
+            return self.empty_tile_image
+        try:
+            image = ImageTk.PhotoImage(Image.open(io.BytesIO(data)))
+        except Exception:
+            return self.empty_tile_image
+        self.tile_stats['Disk_Hits'] += 1
+        self.tile_image_cache[f"{zoom}{x}{y}"] = image
+        return image
+
+    def queue_download(self, zoom, x, y):
+        if self.offline or not self.downloads_enabled:
+            return
+        with self.download_lock:
+            if (zoom, x, y) in self.pending_downloads or len(self.pending_downloads) >= self.max_pending_downloads:
+                return
+            self.pending_downloads.add((zoom, x, y))
+        self.download_queue.put((zoom, x, y))
+
+    def download_tiles(self):
+        # Download thread, stores tiles in the cache and tells the GUI thread to redraw them
+        session = requests.Session()
+        while self.running:
+            try:
+                tile = self.download_queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            try:
+                if time.time() < self.network_down_until or self.tile_cache.contains(*tile):
+                    continue
+                data = download_tile(session, self.tile_server, *tile)
+                if data is not None:
+                    self.tile_cache.put(*tile, data)
+                    self.tile_stats['Downloaded'] += 1
+                    self.downloaded_tiles.put(tile)
+            except requests.exceptions.RequestException as e:
+                self.tile_stats['Download_Errors'] += 1
+                self.network_down_until = time.time() + self.network_retry_delay
+                logging.warning(f"Map tile download failed, using cached tiles for {self.network_retry_delay} s: {e}")
+            except Exception as e:
+                logging.error(f"Error storing map tile: {e}")
+            finally:
+                with self.download_lock:
+                    self.pending_downloads.discard(tile)
+
+    def redraw_downloaded_tiles(self):
+        # GUI thread: hand tiles that are now cached back to the loader threads if they are still on screen
+        downloaded = set()
+        while not self.downloaded_tiles.empty():
+            downloaded.add(self.downloaded_tiles.get_nowait())
+        zoom = round(self.zoom)
+        if downloaded:
+            for column in self.canvas_tile_array:
+                for canvas_tile in column:
+                    position = (zoom, *canvas_tile.tile_name_position)
+                    if position in downloaded:
+                        self.image_load_queue_tasks.append((position, canvas_tile))
+        if self.running:
+            self.after(100, self.redraw_downloaded_tiles)
+
+    def prefetch_track(self, latitude, longitude, heading=0, speed=0):
+        # Load the tiles around a position and ahead of it along heading (degrees) at speed (m/s), in the background
+        self.prefetch_request = (latitude, longitude, heading, speed, round(self.zoom))
+        self.prefetch_event.set()
+
+    def prefetch_tiles(self):
+        # Prefetch thread: tiles at the current zoom are decoded into memory, one zoom level either side only downloaded
+        while self.running:
+            if not self.prefetch_event.wait(timeout=1):
+                continue
+            self.prefetch_event.clear()
+            latitude, longitude, heading, speed, zoom = self.prefetch_request
+            for seconds in self.prefetch_lookahead:
+                position = project(latitude, longitude, heading, speed * seconds)
+                for tile_zoom in (zoom, zoom + 1, zoom - 1):
+                    if tile_zoom < 0 or tile_zoom > self.max_zoom:
+                        continue
+                    center_x, center_y = tile_xy(position[0], position[1], tile_zoom)
+                    for x in range(center_x - self.prefetch_radius, center_x + self.prefetch_radius + 1):
+                        for y in range(center_y - self.prefetch_radius, center_y + self.prefetch_radius + 1):
+                            if not 0 <= x < 2 ** tile_zoom or not 0 <= y < 2 ** tile_zoom:
+                                continue
+                            try:
+                                if tile_zoom == zoom:
+                                    if self.get_tile_image_from_cache(tile_zoom, x, y) is False:
+                                        self.request_image(tile_zoom, x, y)
+                                elif not self.tile_cache.contains(tile_zoom, x, y):
+                                    self.queue_download(tile_zoom, x, y)
+                            except sqlite3.Error as e:
+                                logging.error(f"Error prefetching map tiles: {e}")
+
+    def get_tile_stats(self):
+        stats = dict(self.tile_stats)
+        stats['Memory_Tiles'] = len(self.tile_image_cache)
+        stats['Pending_Downloads'] = len(self.pending_downloads)
+        return stats
+
+if __name__ == "__main__":
+    # Pre-seed the cache before the flight: python map_tiles.py tiles.mbtiles lat1 lon1 lat2 lon2 min_zoom max_zoom
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+    if len(sys.argv) != 8:
+        print("Usage: python map_tiles.py tiles.mbtiles lat1 lon1 lat2 lon2 min_zoom max_zoom")
+        sys.exit(1)
+    cache = TileCache(sys.argv[1])
+    corner_a = (float(sys.argv[2]), float(sys.argv[3]))
+    corner_b = (float(sys.argv[4]), float(sys.argv[5]))
+    print(seed(cache, corner_a, corner_b, int(sys.argv[6]), int(sys.argv[7])))
+    print(f"{cache.count()} tiles in {sys.argv[1]}")
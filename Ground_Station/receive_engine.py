@@ -0,0 +1,134 @@
+import logging
+import select
+import threading
+import time
+
+class ReceiveEngine:
+    """
+    Event-driven MAVLink receive loop.
+
+    The engine sleeps on the serial port until bytes arrive (select() on the file
+    descriptor where the platform has one, otherwise a blocking read with a timeout,
+    as on Windows COM ports), parses everything that arrived in one go and
+    dispatches each message to the handlers registered for its type. Periodic
+    work such as heartbeat timeout checks runs on timers between reads instead
+    of on every pass of the loop.
+
+    Args:
+    connection: A pymavlink mavutil connection.
+    timer_resolution (float): Longest time spent waiting for data before timers are checked, Time in seconds.
+    read_size (int): Most bytes taken from the port per read.
+    """
+
+    def __init__(self, connection, timer_resolution=0.25, read_size=4096):
+        self.connection = connection
+        self.timer_resolution = timer_resolution
+        self.read_size = read_size
+        self.handlers = {}  # Message type to list of callbacks
+        self.default_handlers = []  # Called for message types without a handler
+        self.timers = []  # [interval, next due (monotonic), callback]
+        self.stop_event = threading.Event()
+        self.messages_received = 0
+        self.bad_data = 0
+        self.wakeups = 0
+
+        # Without a file descriptor (Windows) the read itself has to block
+        self.fd = getattr(connection, 'fd', None)
+        if self.fd is None:
+            connection.port.timeout = timer_resolution
+
+    def add_handler(self, msg_type, callback):
+        # Call callback(msg) for every message of the given type, None for all unhandled types
+        if msg_type is None:
+            self.default_handlers.append(callback)
+        else:
+            self.handlers.setdefault(msg_type, []).append(callback)
+
+    def add_timer(self, interval, callback):
+        # Call callback() every interval seconds from the receive thread
+        self.timers.append([interval, time.monotonic() + interval, callback])
+
+    def _read(self, timeout):
+        if self.fd is not None:
+            readable, _, _ = select.select([self.fd], [], [], timeout)
+            if not readable:
+                return b''
+            return self.connection.recv(self.read_size)
+        port = self.connection.port
+        # Blocks for up to the port timeout waiting for the first byte, then takes whatever is buffered
+        return port.read(min(max(port.in_waiting, 1), self.read_size))
+
+    def _dispatch(self, msg):
+        msg_type = msg.get_type()
+        if msg_type == 'BAD_DATA':
+            self.bad_data += 1
+            logging.debug(f"Discarding bad data: {msg}")
+            return
+        self.messages_received += 1
+        for callback in self.handlers.get(msg_type, self.default_handlers):
+            try:
+                callback(msg)
+            except Exception as e:
+                logging.error(f"Error handling {msg_type} message: {e}")
+
+    def _run_timers(self):
+        now = time.monotonic()
+        for timer in self.timers:
+            interval, due, callback = timer
+            if now < due:
+                continue
+            # Skip missed intervals instead of running the callback repeatedly to catch up
+            timer[1] = max(due + interval, now)
+            try:
+                callback()
+            except Exception as e:
+                logging.error(f"Error in receive timer: {e}")
+
+    def _next_timeout(self):
+        if not self.timers:
+            return self.timer_resolution
+        until_due = min(due for _, due, _ in self.timers) - time.monotonic()
+        return min(max(until_due, 0), self.timer_resolution)
+
+    def poll(self):
+        """
+        Waits for data for at most one timer period, handles every complete message
+        that arrived and runs any timers that are due.
+
+        Returns:
+        int: Number of messages dispatched.
+        """
+        connection = self.connection
+        data = self._read(self._next_timeout())
+        count = 0
+        if data:
+            self.wakeups += 1
+            connection.pre_message()
+            if connection.first_byte:
+                connection.auto_mavlink_version(data)
+            for msg in connection.mav.parse_buffer(data) or []:
+                # Keep the connection's own bookkeeping (last messages, target system) up to date
+                connection.post_message(msg)
+                self._dispatch(msg)
+                count += 1
+        self._run_timers()
+        return count
+
+    def run(self):
+        # Receive until stop() is called, errors are logged and the loop keeps going
+        while not self.stop_event.is_set():
+            try:
+                self.poll()
+            except (OSError, ValueError) as e:
+                logging.error(f"Error receiving from radio: {e}")
+                self.stop_event.wait(1)
+
+    def stop(self):
+        self.stop_event.set()
+
+    def get_stats(self):
+        return {
+            'Messages_Received': self.messages_received,
+            'Bad_Data': self.bad_data,
+            'Wakeups': self.wakeups,
+        }
@@ -1,9 +1,21 @@
 import time
+import random
 import logging
+import os
+# Use MAVLink 2 to match the payload, MAVLink 1 messages are still understood
+os.environ.setdefault('MAVLINK20', '1')
 from pymavlink import mavutil
-from data_writer_ground import get_next_filename, write_data_to_csv
-from flask import Flask, jsonify, request
-from threading import Thread
+import telemetry_frame_ground as telemetry_frame
+from data_writer_ground import get_next_filename, merge_csv_by_time, BufferedWriter, CsvSink, SqliteSink, query_database
+from link_statistics import LinkStatistics, FRAME_DUPLICATE, FRAME_LATE
+from receive_engine import ReceiveEngine
+from telemetry_stream import StreamBroadcaster
+from telemetry_history import TelemetryHistory
+from landing_predictor import LandingPredictor
+from state_estimator import StateEstimator, estimate_fields, estimate_header
+from collections import OrderedDict
+from flask import Flask, Response, jsonify, request
+from threading import Thread, Event, Lock
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
@@ -20,182 +32,528 @@ mav = mavutil.mavlink_connection(serial_port, baud=baud_rate)
 # Get the next file name
 filename = get_next_filename("data_{}.csv")
 
+# Keep the CSV open and write rows in batches from a background thread
+csv_writer = BufferedWriter(CsvSink(filename), sync_policy='interval', sync_interval_ms=1000)
+
 # Write the header to the CSV file
-header = ['Timestamp', 'Accelerometer X (m/s^2)', 'Accelerometer Y (m/s^2)', 'Accelerometer Z (m/s^2)', 'Gyroscope X (rad/s)', 'Gyroscope Y (rad/s)', 'Gyroscope Z (rad/s)', 'Humidity (%)', 'Pressure (mbar)', 'Temperature from Humidity (C)', 'Temperature from Pressure (C)', 'Thermocouple Temperature (C)', 'Latitude', 'Longitude', 'Altitude (m)', 'Speed (m/s)', 'Heading']
-write_data_to_csv(dict(zip(header, header)), filename)
+header = ['Timestamp', 'Accelerometer X (m/s^2)', 'Accelerometer Y (m/s^2)', 'Accelerometer Z (m/s^2)', 'Gyroscope X (rad/s)', 'Gyroscope Y (rad/s)', 'Gyroscope Z (rad/s)', 'Humidity (%)', 'Pressure (mbar)', 'Temperature from Humidity (C)', 'Temperature from Pressure (C)', 'Thermocouple Temperature (C)', 'Latitude', 'Longitude', 'Altitude (m)', 'Speed (m/s)', 'Heading', 'RSSI (dBm)', 'Remote RSSI (dBm)', 'Noise (dBm)'] + estimate_header
+csv_writer.write(dict(zip(header, header)))
+
+# Samples recovered after a link outage go to their own file and are merged in time order on exit
+backfill_filename = filename.replace('.csv', '_backfill.csv')
+merged_filename = filename.replace('.csv', '_merged.csv')
+backfill_writer = BufferedWriter(CsvSink(backfill_filename), sync_policy='interval', sync_interval_ms=1000)
+backfill_writer.write(dict(zip(header, header)))
+
+# Fields of each CSV row, in header order
+radio_status_fields = ['RSSI', 'Remote_RSSI', 'Noise']
+csv_fields = telemetry_frame.schema_fields() + radio_status_fields + estimate_fields
+
+# Every sample (live and backfilled) also goes to an indexed SQLite database for range queries
+# The CSV files are still written as before, export_database_to_csv rebuilds one from the database
+database_filename = filename.replace('.csv', '.db')
+database_fields = ['Sequence', 'Received', 'Backfilled'] + csv_fields
+database_writer = BufferedWriter(SqliteSink(database_filename, database_fields), sync_policy='interval', sync_interval_ms=1000)
+
+# Legacy debug vector layout, three fields per vector
+legacy_vectors = {
+    "Vector_0": ('Timestamp', 'Accelerometer_X', 'Accelerometer_Y'),
+    "Vector_1": ('Accelerometer_Z', 'Gyroscope_X', 'Gyroscope_Y'),
+    "Vector_2": ('Gyroscope_Z', 'Humidity', 'Pressure'),
+    "Vector_3": ('Temperature_Humidity', 'Temperature_Pressure', 'Temperature_Thermocouple'),
+    "Vector_4": ('Latitude', 'Longitude', 'Altitude'),
+    "Vector_5": ('Speed', 'Heading', 'RSSI'),
+}
 
-# Initialize variables to store the received data
-data = {}
-received_vectors = 0
+# Partially received legacy samples keyed by the time_usec shared by their vectors
+partial_frames = OrderedDict()
+max_partial_frames = 8  # Oldest partial sample is discarded beyond this
+partial_frame_timeout = 5  # Partial samples older than this are discarded, Time in seconds
+
+# Rolling link quality statistics
+link_stats = LinkStatistics()
+
+# Backfill of frames lost on the downlink
+backfill_interval = 10  # Time between resend requests, Time in seconds
+backfill_delay = 5  # Frames missing for less than this may still be in flight, Time in seconds
+backfill_max_frames = 64  # Frames asked for per request
+backfill_max_attempts = 3  # Requests per frame before it is given up on
+backfill_attempts = {}  # Sequence number to (accepted requests so far, time of the last one)
+backfill_stats = {'Backfill_Requests': 0, 'Backfilled_Frames': 0, 'Backfill_Abandoned': 0}
+
+# Latest RADIO_STATUS report from the ground radio, signal levels in dBm
+radio_status = {}
+radio_status_timeout = 10  # Older reports are not copied into received samples, Time in seconds
 
 # Global variables to store the most recent data and heartbeat status
 most_recent_data = {}
 most_recent_heartbeat_status = "OK"
+payload_boot_id = None  # Custom mode of the payload heartbeats, changes when the payload reboots
 
-# Callback function to handle received messages
-def handle_message(msg):
-    global most_recent_data, data, received_vectors
-
-    if msg.get_type() == 'HEARTBEAT':
-        logging.debug("Heartbeat received!")
-        logging.debug("Message contents: %s", msg.to_dict())
-    elif msg.get_type() == 'DEBUG_VECT':
-        logging.debug(f"Debug vector received! {msg.name}")
-        logging.debug("Message contents: %s", msg.to_dict())
-
-        # Extract the relevant data from the message
-        # Vectors can only contain 3 values, so we need to keep track of which vector we are receiving
-        if msg.name == "Vector_0":
-            data['Timestamp'] = msg.x
-            data['Accelerometer_X'] = msg.y
-            data['Accelerometer_Y'] = msg.z
-            received_vectors = 1
-        elif msg.name == "Vector_1":
-            data['Accelerometer_Z'] = msg.x
-            data['Gyroscope_X'] = msg.y
-            data['Gyroscope_Y'] = msg.z
-            received_vectors = 2
-        elif msg.name == "Vector_2":
-            data['Gyroscope_Z'] = msg.x
-            data['Humidity'] = msg.y
-            data['Pressure'] = msg.z
-            received_vectors = 3
-        elif msg.name == "Vector_3":
-            data['Temperature_Humidity'] = msg.x
-            data['Temperature_Pressure'] = msg.y
-            data['Temperature_Thermocouple'] = msg.z
-            received_vectors = 4
-        elif msg.name == "Vector_4":
-            data['Latitude'] = msg.x
-            data['Longitude'] = msg.y
-            data['Altitude'] = msg.z
-            received_vectors = 5
-        elif msg.name == "Vector_5":
-            data['Speed'] = msg.x
-            data['Heading'] = msg.y
-            data['RSSI'] = msg.z
-            received_vectors = 6
-
-        # Check if all four vectors have been received
-        if received_vectors == 6:
-            # Record the assembled data to CSV file
-            logging.info(f"Data Received!")
-            logging.debug(f"Received Data contents: {data}")
-            write_data_to_csv(data, filename)
-            received_vectors = 0
-            
-            # Update the most recent data
-            most_recent_data = data
-
-            # Reset the data dictionary for the next set of vectors
-            data = {}
+# Pushes each new sample to every /api/stream client
+broadcaster = StreamBroadcaster()
 
-    else:
-        logging.warning("Unknown message type received: %s", msg.get_type())
+# Recent samples for /api/history, numbered with the same ids as the stream events
+history = TelemetryHistory(csv_fields)
+
+# Filtered altitude, vertical rate and velocity from GPS and barometer, added to every live sample
+estimator = StateEstimator()
+
+# Landing prediction from the wind measured on the way up, recomputed by prediction_loop
+predictor = LandingPredictor(scenarios=2000)
+latest_prediction = None  # 'Nominal' and, while ascending, 'Cutdown_Now' predictions
+
+# Heartbeat monitoring
+heartbeat_timeout = 5  # Heartbeat timeout in seconds
+heartbeat_warning_timeout = 10  # Heartbeat warning timeout in seconds
+heartbeat_check_interval = 1  # How often the heartbeat timeout is checked, Time in seconds
+last_heartbeat_time = time.time()
+last_heartbeat_warning_time = time.time()
+
+# Uplink commands waiting for an ACK, keyed by command ID
+command_timeout = 1.5  # Time to wait for an ACK before resending, Time in seconds
+command_retries = 5  # Transmissions per command before giving up
+next_command_id = random.getrandbits(16)  # The payload remembers recent IDs, a restarted ground station mustn't reuse them
+pending_commands = {}
+command_lock = Lock()  # Guards next_command_id and pending_commands
+send_lock = Lock()  # Serializes writes to the radio between threads
+
+# SiK firmware (RFD900x) reports signal levels in raw units
+def radio_dbm(value):
+    return round(value / 1.9 - 127, 1)
+
+# Record a fully received sample
+def commit_sample(sample, backfilled=False):
+    global most_recent_data
+
+    if backfilled:
+        # Old sample recovered after an outage, it doesn't change the live view
+        logging.debug(f"Backfilled Data contents: {sample}")
+        backfill_writer.write({field: sample.get(field, '') for field in csv_fields})
+        database_writer.write(dict(sample, Sequence=None, Received=time.time(), Backfilled=1))
+        return
+
+    # Signal levels come from the ground radio itself, as of when the sample arrived
+    if radio_status and time.time() - radio_status['Received'] <= radio_status_timeout:
+        sample.update({field: radio_status[field] for field in radio_status_fields})
+
+    # Filtered values go alongside the raw ones, backfilled rows get them from the post-flight batch run
+    try:
+        sample.update(estimator.update(sample))
+    except Exception as e:
+        logging.error(f"Error estimating state: {e}")
+
+    # Record the assembled data to CSV file, missing fields are left empty
+    logging.info(f"Data Received!")
+    logging.debug(f"Received Data contents: {sample}")
+    csv_writer.write({field: sample.get(field, '') for field in csv_fields})
+
+    # Update the most recent data and push it to stream clients
+    most_recent_data = sample
+    sequence = broadcaster.publish(api_record(sample))
+    received = time.time()
+    history.append(sequence, sample, received)
+    database_writer.write(dict(sample, Sequence=sequence, Received=received, Backfilled=0))
+    predictor.update(sample)
+
+# Discard legacy samples whose remaining vectors never arrived
+def expire_partial_frames():
+    now = time.time()
+    while partial_frames:
+        time_usec, frame = next(iter(partial_frames.items()))
+        if now - frame['first_seen'] <= partial_frame_timeout:
+            break
+        del partial_frames[time_usec]
+        link_stats.record_partial()
+        logging.warning(f"Discarded partial sample {time_usec}, received {sorted(frame['vectors'])}")
+
+# Handlers for received messages, called from the receive engine
+def handle_heartbeat(msg):
+    global last_heartbeat_time, most_recent_heartbeat_status, payload_boot_id
+    last_heartbeat_time = time.time()
+    # A rebooted payload numbers its frames from 0 again, the old missing frames are gone with it
+    if payload_boot_id is not None and msg.custom_mode != payload_boot_id:
+        logging.warning("Payload rebooted, starting a new telemetry sequence")
+        link_stats.restart()
+        backfill_attempts.clear()
+    payload_boot_id = msg.custom_mode
+    if most_recent_heartbeat_status != "OK":
+        broadcaster.publish({'Heartbeat_Status': "OK"}, event='status')
+    most_recent_heartbeat_status = "OK"
+    logging.debug("Heartbeat received!")
+    logging.debug("Message contents: %s", msg.to_dict())
+
+def handle_telemetry_frame(msg):
+    # Packed telemetry frame, one message carries one or more whole samples
+    try:
+        frame = telemetry_frame.decode_frame(bytes(msg.data))
+    except (ValueError, KeyError) as e:
+        logging.warning(f"Discarding malformed telemetry frame {msg.seqnr}: {e}")
+        return
+    if frame['type'] == telemetry_frame.FRAME_ACK:
+        handle_ack(frame)
+        return
+    if frame['type'] == telemetry_frame.FRAME_COMMAND:
+        logging.warning(f"Ignoring command frame {frame['sequence']} from the payload")
+        return
+    logging.debug(f"Telemetry frame {frame['sequence']} received")
+    status = link_stats.record_frame(frame['sequence'], len(frame['samples']), sent_ms=frame['samples'][0].get('Timestamp'))
+    if status == FRAME_DUPLICATE:
+        logging.debug(f"Duplicate telemetry frame {frame['sequence']} ignored")
+        return
+    if status == FRAME_LATE:
+        backfill_stats['Backfilled_Frames'] += 1
+        backfill_attempts.pop(frame['sequence'], None)
+    for sample in frame['samples']:
+        commit_sample(sample, backfilled=status == FRAME_LATE)
+
+def handle_debug_vect(msg):
+    # Legacy payloads split each sample into six debug vectors
+    logging.debug(f"Debug vector received! {msg.name}")
+    logging.debug("Message contents: %s", msg.to_dict())
+
+    # Vectors can only contain 3 values, the vectors of one sample share its time_usec
+    fields = legacy_vectors.get(msg.name)
+    if fields is None:
+        return
+    expire_partial_frames()
+    if msg.time_usec not in partial_frames:
+        if len(partial_frames) >= max_partial_frames:
+            partial_frames.popitem(last=False)
+            link_stats.record_partial()
+        partial_frames[msg.time_usec] = {'data': {}, 'vectors': set(), 'first_seen': time.time()}
+    frame = partial_frames[msg.time_usec]
+    frame['data'].update(zip(fields, (msg.x, msg.y, msg.z)))
+    frame['vectors'].add(msg.name)
+
+    # Check if all six vectors have been received
+    if len(frame['vectors']) == len(legacy_vectors):
+        del partial_frames[msg.time_usec]
+        link_stats.record_frame(None, 1, sent_ms=msg.time_usec)
+        commit_sample(frame['data'])
+
+def handle_radio_status(msg):
+    # The local radio reports its own (RSSI, Noise) and the payload radio's (Remote_) levels
+    radio_status.update({
+        'RSSI': radio_dbm(msg.rssi),
+        'Remote_RSSI': radio_dbm(msg.remrssi),
+        'Noise': radio_dbm(msg.noise),
+        'Remote_Noise': radio_dbm(msg.remnoise),
+        'TX_Buffer_Free': msg.txbuf,
+        'RX_Errors': msg.rxerrors,
+        'Corrected_Packets': msg.fixed,
+        'Received': time.time(),
+    })
+    logging.debug(f"Radio status: {radio_status}")
+
+def handle_unknown(msg):
+    logging.warning("Unknown message type received: %s", msg.get_type())
+
+# Timer callback, flags the link when the payload's heartbeat stops
+def check_heartbeat():
+    global most_recent_heartbeat_status, last_heartbeat_warning_time
+    current_time = time.time()
+    if current_time - last_heartbeat_time > heartbeat_timeout:
+        # Handle the heartbeat timeout condition here
+        # For example, you can reconnect, send a request for heartbeat, or perform any other necessary actions
+        if most_recent_heartbeat_status != "TIMEOUT":
+            broadcaster.publish({'Heartbeat_Status': "TIMEOUT"}, event='status')
+        most_recent_heartbeat_status = "TIMEOUT"
+        if current_time - last_heartbeat_warning_time > heartbeat_warning_timeout:
+            logging.info(f"Heartbeat timeout! No heartbeat received for {round(current_time-last_heartbeat_time, 0)} seconds.")
+            last_heartbeat_warning_time = current_time
+
+def handle_ack(frame):
+    # Wake up the sender waiting on this command
+    with command_lock:
+        pending = pending_commands.get(frame['sequence'])
+    if pending is None or pending['command'] != frame['command']:
+        logging.debug(f"ACK for unknown or finished command {frame['sequence']}")
+        return
+    pending['result'] = frame['result']
+    pending['acked'] = time.monotonic()
+    pending['event'].set()
+
+# Function to send an uplink command and wait for the payload to acknowledge it
+def send_command(command, arguments=b''):
+    """
+    Sends a command frame and resends it every command_timeout seconds until the
+    payload answers with an ACK, up to command_retries transmissions. The payload
+    only executes a command ID once, so resending is safe.
+
+    Returns:
+    dict: Command_ID, Result (None if no ACK arrived), Attempts, Round_Trip_ms from the
+    last transmission to the ACK and Elapsed_ms from the first transmission.
+    """
+    global next_command_id
+    with command_lock:
+        command_id = next_command_id
+        next_command_id = (next_command_id + 1) % 2**16
+        pending = {'command': command, 'event': Event(), 'result': None, 'acked': None}
+        pending_commands[command_id] = pending
+
+    frame = telemetry_frame.pad_frame(telemetry_frame.encode_command(command, command_id, arguments))
+    first_sent = None
+    attempts = 0
+    try:
+        while attempts < command_retries and not pending['event'].is_set():
+            last_sent = time.monotonic()
+            first_sent = first_sent or last_sent
+            with send_lock:
+                mav.mav.encapsulated_data_send(command_id, frame)
+            attempts += 1
+            pending['event'].wait(command_timeout)
+    finally:
+        with command_lock:
+            del pending_commands[command_id]
+
+    status = {'Command_ID': command_id, 'Result': pending['result'], 'Attempts': attempts,
+              'Round_Trip_ms': None, 'Elapsed_ms': None}
+    if pending['acked'] is not None:
+        status['Round_Trip_ms'] = round((pending['acked'] - last_sent) * 1000, 1)
+        status['Elapsed_ms'] = round((pending['acked'] - first_sent) * 1000, 1)
+    return status
+
+# Background loop asking the payload to resend frames that never arrived
+def backfill_loop():
+    while True:
+        time.sleep(backfill_interval)
+        if most_recent_heartbeat_status != "OK":
+            continue
+
+        # A resend may still be on its way for backfill_delay after a request, after that the frame
+        # is asked for again, or given up on once it has had all its attempts
+        now = time.monotonic()
+        requests = []
+        abandoned = []
+        for sequence in link_stats.get_missing(min_age=backfill_delay):
+            attempts, requested = backfill_attempts.get(sequence, (0, 0))
+            if attempts and now - requested < backfill_delay:
+                continue
+            if attempts >= backfill_max_attempts:
+                abandoned.append(sequence)
+                backfill_attempts.pop(sequence, None)
+            else:
+                requests.append(sequence)
+        if abandoned:
+            link_stats.discard_missing(abandoned)
+            backfill_stats['Backfill_Abandoned'] += len(abandoned)
+
+        requests = requests[:backfill_max_frames]
+        if not requests:
+            continue
+        try:
+            status = send_command(telemetry_frame.COMMAND_RESEND, telemetry_frame.encode_ranges(requests))
+        except Exception as e:
+            logging.error(f"Error requesting backfill: {e}")
+            continue
+        backfill_stats['Backfill_Requests'] += 1
+        logging.info(f"Requested {len(requests)} missing frames, result {status['Result']}")
+
+        # A request that got no ACK doesn't count as an attempt, it is simply made again
+        if status['Result'] is None:
+            continue
+        requested = time.monotonic()
+        for sequence in requests:
+            if status['Result'] in (telemetry_frame.RESULT_REJECTED, telemetry_frame.RESULT_UNSUPPORTED):
+                attempts = backfill_max_attempts  # The payload no longer has them, or can't resend at all
+            else:
+                attempts = backfill_attempts.get(sequence, (0, 0))[0] + 1
+            backfill_attempts[sequence] = (attempts, requested)
+
+def prediction_loop():
+    # Recompute the landing prediction after every new fix, fixes that arrive during a prediction are folded into the next one
+    global latest_prediction
+    while True:
+        predictor.updated.wait()
+        predictor.updated.clear()
+        try:
+            result = {'Nominal': predictor.predict()}
+            if result['Nominal'] is None:
+                continue
+            # While the balloon is still rising, also show where a cutdown right now would land
+            if result['Nominal']['Phase'] == 'ASCENT':
+                result['Cutdown_Now'] = predictor.predict(cutdown_now=True)
+        except Exception as e:
+            logging.error(f"Error predicting landing: {e}")
+            continue
+        latest_prediction = result
+        broadcaster.publish(result, event='prediction')
 
 # Function to send cutdown signal to the payload
 def send_cutdown():
-    timestamp = int(time.time() * 1000) % (2**32)
-    cutdown = True
-
-    mav.mav.debug_vect_send(
-        name=f"Cutdown".encode(),
-        time_usec=timestamp,
-        x=cutdown,
-        y=0,
-        z=0
-    )
+    status = send_command(telemetry_frame.COMMAND_CUTDOWN)
+    if status['Result'] is None:
+        logging.error(f"Cutdown not acknowledged after {status['Attempts']} attempts.")
+    else:
+        logging.info(f"Cutdown acknowledged with result {status['Result']} in {status['Round_Trip_ms']} ms.")
+    return status
 
-    logging.info("Cutdown sent.")
+# Build the record served by the API for one sample
+def api_record(sample):
+    return {
+        'Timestamp': sample.get('Timestamp', 0),
+        'Accelerometer_X': sample.get('Accelerometer_X', 0),
+        'Accelerometer_Y': sample.get('Accelerometer_Y', 0),
+        'Accelerometer_Z': sample.get('Accelerometer_Z', 0),
+        'Gyroscope_X': sample.get('Gyroscope_X', 0),
+        'Gyroscope_Y': sample.get('Gyroscope_Y', 0),
+        'Gyroscope_Z': sample.get('Gyroscope_Z', 0),
+        'Humidity': sample.get('Humidity', 0),
+        'Pressure': sample.get('Pressure', 0),
+        'Temperature_Humidity': sample.get('Temperature_Humidity', 0),
+        'Temperature_Pressure': sample.get('Temperature_Pressure', 0),
+        'Temperature_Thermocouple': sample.get('Temperature_Thermocouple', 0),
+        'Latitude': sample.get('Latitude', 0),
+        'Longitude': sample.get('Longitude', 0),
+        'Altitude': sample.get('Altitude', 0),
+        'Speed': sample.get('Speed', 0),
+        'Heading': sample.get('Heading', 0),
+        'Heartbeat_Status': most_recent_heartbeat_status,
+        'RSSI' : sample.get('RSSI', 0),
+        'Filtered_Altitude': sample.get('Filtered_Altitude'),
+        'Vertical_Rate': sample.get('Vertical_Rate'),
+        'Velocity_North': sample.get('Velocity_North'),
+        'Velocity_East': sample.get('Velocity_East'),
+        'Baro_Altitude': sample.get('Baro_Altitude'),
+    }
 
 # API route to get the most recent data
 @app.route('/api/data', methods=['GET'])
 def get_most_recent_data():
-    global most_recent_data, most_recent_heartbeat_status
-    response_data = {
-        'Timestamp': most_recent_data.get('Timestamp', 0),
-        'Accelerometer_X': most_recent_data.get('Accelerometer_X', 0),
-        'Accelerometer_Y': most_recent_data.get('Accelerometer_Y', 0),
-        'Accelerometer_Z': most_recent_data.get('Accelerometer_Z', 0),
-        'Gyroscope_X': most_recent_data.get('Gyroscope_X', 0),
-        'Gyroscope_Y': most_recent_data.get('Gyroscope_Y', 0),
-        'Gyroscope_Z': most_recent_data.get('Gyroscope_Z', 0),
-        'Humidity': most_recent_data.get('Humidity', 0),
-        'Pressure': most_recent_data.get('Pressure', 0),
-        'Temperature_Humidity': most_recent_data.get('Temperature_Humidity', 0),
-        'Temperature_Pressure': most_recent_data.get('Temperature_Pressure', 0),
-        'Temperature_Thermocouple': most_recent_data.get('Temperature_Thermocouple', 0),
-        'Latitude': most_recent_data.get('Latitude', 0),
-        'Longitude': most_recent_data.get('Longitude', 0),
-        'Altitude': most_recent_data.get('Altitude', 0),
-        'Speed': most_recent_data.get('Speed', 0),
-        'Heading': most_recent_data.get('Heading', 0),
-        'Heartbeat_Status': most_recent_heartbeat_status,
-        'RSSI' : most_recent_data.get('RSSI', 0)
-    }
+    response_data = api_record(most_recent_data)
     logging.info(f"Data Sent!")
     logging.debug(f"Sent Data Contents: {response_data}")
     return response_data
 
+# API route streaming every new sample as it arrives (Server-Sent Events)
+@app.route('/api/stream', methods=['GET'])
+def stream_data():
+    # Clients resume after a reconnect by sending the id of the last event they saw
+    last_event_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id'))
+    try:
+        last_event_id = int(last_event_id) if last_event_id is not None else None
+    except ValueError:
+        last_event_id = None
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return Response(broadcaster.stream(last_event_id), mimetype='text/event-stream', headers=headers)
+
+# API route to get a range of past samples, e.g. /api/history?since=120&fields=Altitude,Pressure&max_points=500
+# Add method=lttb to downsample a single field by shape instead of by bucket extremes
+@app.route('/api/history', methods=['GET'])
+def get_history():
+    try:
+        since = request.args.get('since', type=int)
+        start = request.args.get('start', type=float)
+        end = request.args.get('end', type=float)
+        max_points = request.args.get('max_points', type=int)
+        fields = request.args.get('fields')
+        fields = [field for field in fields.split(',') if field] if fields else None
+        if max_points is not None and max_points < 2:
+            raise ValueError("max_points must be at least 2")
+        method = request.args.get('method', 'minmax')
+        return jsonify(history.query(since=since, start=start, end=end, fields=fields, max_points=max_points, method=method))
+    except (KeyError, ValueError) as e:
+        return jsonify({'error': e.args[0]}), 400
+
+# API route to query the whole flight from the database, e.g. /api/query?min_altitude=10000&fields=Received,Altitude,Pressure
+# Time ranges (start, end) are ground receive times in seconds, since is a stream sequence number
+@app.route('/api/query', methods=['GET'])
+def query_flight():
+    try:
+        fields = request.args.get('fields')
+        fields = [field for field in fields.split(',') if field] if fields else None
+        return jsonify(query_database(database_filename, fields=fields,
+                                      start=request.args.get('start', type=float),
+                                      end=request.args.get('end', type=float),
+                                      since=request.args.get('since', type=int),
+                                      min_altitude=request.args.get('min_altitude', type=float),
+                                      max_altitude=request.args.get('max_altitude', type=float),
+                                      altitude_field=request.args.get('altitude_field', 'Altitude'),
+                                      limit=request.args.get('limit', type=int)))
+    except (KeyError, ValueError) as e:
+        return jsonify({'error': e.args[0]}), 400
+
+# API route to get the link quality statistics
+@app.route('/api/link', methods=['GET'])
+def get_link_statistics():
+    stats = link_stats.get_stats()
+    stats['Partial_Frames_In_Flight'] = len(partial_frames)
+    stats.update(backfill_stats)
+    stats.update(broadcaster.get_stats())
+    stats['Radio_Status'] = {field: value for field, value in radio_status.items() if field != 'Received'}
+    return jsonify(stats)
+
+# API route to get the latest landing prediction
+@app.route('/api/prediction', methods=['GET'])
+def get_landing_prediction():
+    if latest_prediction is None:
+        return jsonify({'error': 'No GPS fix yet'}), 503
+    return jsonify(latest_prediction)
+
 # API route to send cutdown signal
 @app.route('/api/cutdown', methods=['POST'])
 def send_cutdown_signal():
     try:
-        # Send the cutdown signal
+        # Send the cutdown signal and wait for the payload to acknowledge it
         logging.info("Sending cutdown signal...")
-        send_cutdown()
-        logging.info("Cutdown signal sent successfully.")
-        return jsonify({'message': 'Cutdown signal sent successfully'}), 200
+        status = send_cutdown()
     except Exception as e:
         logging.error(f"Error sending cutdown signal: {e}")
         return jsonify({'error': 'Failed to send cutdown signal'}), 500
 
+    if status['Result'] is None:
+        return jsonify(dict(status, error='Cutdown not acknowledged by the payload')), 504
+    if status['Result'] != telemetry_frame.RESULT_ACCEPTED:
+        return jsonify(dict(status, error='Cutdown rejected by the payload')), 502
+    logging.info("Cutdown signal acknowledged.")
+    return jsonify(dict(status, message='Cutdown signal acknowledged by the payload')), 200
+
 def run_flask_app():
-    app.run()
+    # Each stream client holds a request thread open
+    app.run(threaded=True)
 
 # Main loop
 def main():
-    global most_recent_data, most_recent_heartbeat_status
+    # Block on the radio and dispatch messages as they arrive, timers handle the periodic checks
+    engine = ReceiveEngine(mav)
+    engine.add_handler('HEARTBEAT', handle_heartbeat)
+    engine.add_handler('ENCAPSULATED_DATA', handle_telemetry_frame)
+    engine.add_handler('DEBUG_VECT', handle_debug_vect)
+    engine.add_handler('RADIO_STATUS', handle_radio_status)
+    engine.add_handler(None, handle_unknown)
+    engine.add_timer(heartbeat_check_interval, check_heartbeat)
+    engine.add_timer(partial_frame_timeout, expire_partial_frames)
 
-    heartbeat_timeout = 5  # Heartbeat timeout in seconds
-    last_heartbeat_time = time.time()
-    heartbeat_warning_timeout = 10  # Heartbeat warning timeout in seconds
-    last_heartbeat_warning_time = time.time()
+    # Resend requests wait for their ACK, so they can't run on the receive thread
+    Thread(target=backfill_loop, daemon=True).start()
 
-    while True:
-        try:
-            # Check if a message has been received
-            msg = mav.recv_match(blocking=False)
-            if msg:
-                if msg.get_type() == 'HEARTBEAT':
-                    last_heartbeat_time = time.time()
-                    most_recent_heartbeat_status = "OK"
-                handle_message(msg)
-            else:
-                logging.debug("No response received.")
-
-            # Check for heartbeat timeout
-            current_time = time.time()
-            if current_time - last_heartbeat_time > heartbeat_timeout:
-                # Handle the heartbeat timeout condition here
-                # For example, you can reconnect, send a request for heartbeat, or perform any other necessary actions
-                most_recent_heartbeat_status = "TIMEOUT"
-                if current_time - last_heartbeat_warning_time > heartbeat_warning_timeout:
-                    logging.info(f"Heartbeat timeout! No heartbeat received for {round(current_time-last_heartbeat_time, 0)} seconds.")
-                    last_heartbeat_warning_time = current_time
-
-        except KeyboardInterrupt:
-            logging.info("Keyboard interrupt received. Exiting...")
-            break
+    # Landing predictions take tens of milliseconds, keep them off the receive thread
+    Thread(target=prediction_loop, daemon=True).start()
 
-        except Exception as e:
-            logging.error(f"Error: {e}")
+    try:
+        engine.run()
+    except KeyboardInterrupt:
+        logging.info("Keyboard interrupt received. Exiting...")
+    finally:
+        shutdown()
 
-        # Wait for a short interval before the next iteration
-        time.sleep(0.001)
+# Close the radio and the logs, also when the receive loop dies
+# After a crash that skipped this, run: python data_writer_ground.py data_N.csv
+def shutdown():
+    # Close the MAVLink connection and flush the CSV when done
+    try:
+        mav.close()
+    except Exception as e:
+        logging.error(f"Error closing the radio: {e}")
+    csv_writer.close()
+    backfill_writer.close()
+    database_writer.close()
 
-    # Close the MAVLink connection when done
-    mav.close()
+    # Slot the backfilled rows into a copy of the live log
+    if backfill_stats['Backfilled_Frames']:
+        rows = merge_csv_by_time([filename, backfill_filename], merged_filename)
+        logging.info(f"Wrote {rows} rows including backfill to {merged_filename}")
 
 if __name__ == "__main__":
     # Start the Flask app in a separate thread
@@ -0,0 +1,105 @@
+import threading
+import numpy as np
+
+class SampleStore:
+    """
+    Fixed-size NumPy store of every received channel for the GUI.
+
+    Recent samples are kept at full rate in a ring buffer covering the retention
+    window. When the ring is full, its oldest spill_factor samples are reduced to
+    the minimum and maximum of every channel (each with its own time) and moved to
+    a second, downsampled ring, so older parts of the flight stay plottable,
+    spikes included, at a fraction of the memory. Both rings are preallocated and
+    memory never grows after start-up.
+
+    Args:
+    fields (list): Channel names stored from every sample, missing values are NaN.
+    retention (float): Time kept at full rate, Time in seconds.
+    rate_hz (float): Expected sample rate, used to size the full-rate ring.
+    spill_factor (int): Full-rate samples per downsampled bucket.
+    spill_buckets (int): Downsampled buckets kept, the oldest are dropped beyond this.
+    """
+
+    def __init__(self, fields, retention=3600, rate_hz=10, spill_factor=10, spill_buckets=20000):
+        self.fields = list(fields)
+        self.spill_factor = spill_factor
+        # A whole number of buckets, so the oldest block is always contiguous when the ring is full
+        self.capacity = max(int(retention * rate_hz) // spill_factor, 1) * spill_factor
+        self.times = np.zeros(self.capacity)
+        self.columns = {field: np.full(self.capacity, np.nan) for field in self.fields}
+        self.count = 0
+        self.next_index = 0
+
+        # Downsampled tier, two points (minimum and maximum) per bucket and channel
+        self.spill_buckets = spill_buckets
+        self.spill_times = {field: np.zeros(2 * spill_buckets) for field in self.fields}
+        self.spill_values = {field: np.full(2 * spill_buckets, np.nan) for field in self.fields}
+        self.spill_count = 0
+        self.spill_next = 0
+
+        self.total_samples = 0  # Samples ever appended, a cheap "has anything changed" check
+        self.lock = threading.Lock()
+
+    def append(self, sample, timestamp):
+        # Add one sample (dictionary of channel values) received at timestamp
+        with self.lock:
+            if self.count == self.capacity:
+                self._spill(self.next_index)
+            index = self.next_index
+            self.times[index] = timestamp
+            for field, column in self.columns.items():
+                try:
+                    column[index] = float(sample.get(field, np.nan))
+                except (TypeError, ValueError):
+                    column[index] = np.nan
+            self.next_index = (index + 1) % self.capacity
+            self.count += 1
+            self.total_samples += 1
+
+    def _spill(self, start):
+        # Reduce the oldest block of the full-rate ring to one downsampled bucket and free it
+        end = start + self.spill_factor
+        times = self.times[start:end]
+        position = 2 * self.spill_next
+        for field, column in self.columns.items():
+            block = column[start:end]
+            missing = np.isnan(block)
+            if missing.all():
+                lowest = highest = 0
+            else:
+                lowest = int(np.where(missing, np.inf, block).argmin())
+                highest = int(np.where(missing, -np.inf, block).argmax())
+            # Keep the two points in time order so the line is drawn the way it went
+            first, second = sorted((lowest, highest))
+            self.spill_times[field][position:position + 2] = times[first], times[second]
+            self.spill_values[field][position:position + 2] = block[first], block[second]
+        self.spill_next = (self.spill_next + 1) % self.spill_buckets
+        self.spill_count = min(self.spill_count + 1, self.spill_buckets)
+        self.count -= self.spill_factor
+
+    def _ordered(self, array, count, next_index, size, width=1):
+        # Oldest-first copy of the last count entries of a ring of size entries
+        positions = (next_index - count + np.arange(count)) % size
+        if width == 1:
+            return array[positions]
+        return array.reshape(size, width)[positions].reshape(-1)
+
+    def series(self, field, include_spilled=True):
+        """
+        Returns (times, values) for one channel, oldest first: the downsampled
+        history followed by the full-rate samples. The arrays are copies.
+        """
+        with self.lock:
+            times = self._ordered(self.times, self.count, self.next_index, self.capacity)
+            values = self._ordered(self.columns[field], self.count, self.next_index, self.capacity)
+            if not include_spilled or not self.spill_count:
+                return times, values
+            spill_times = self._ordered(self.spill_times[field], self.spill_count, self.spill_next, self.spill_buckets, 2)
+            spill_values = self._ordered(self.spill_values[field], self.spill_count, self.spill_next, self.spill_buckets, 2)
+        return np.concatenate((spill_times, times)), np.concatenate((spill_values, values))
+
+    def latest(self, field, default=np.nan):
+        with self.lock:
+            if not self.count:
+                return default
+            return self.columns[field][(self.next_index - 1) % self.capacity]
@@ -0,0 +1,360 @@
+import csv
+import math
+import sys
+import numpy as np
+
+# Fields added to every live sample, in CSV column order
+estimate_fields = ['Filtered_Altitude', 'Vertical_Rate', 'Velocity_North', 'Velocity_East', 'Baro_Altitude']
+estimate_header = ['Filtered Altitude (m)', 'Vertical Rate (m/s)', 'Velocity North (m/s)', 'Velocity East (m/s)', 'Baro Altitude (m)']
+
+# Measurement noise
+gps_altitude_sd = 15.0  # Distance in meters
+baro_altitude_sd = 5.0  # Distance in meters
+gps_velocity_sd = 0.5  # m/s
+
+# Process noise
+vertical_acceleration_sd = 1.0  # Unmodelled vertical acceleration, m/s^2
+horizontal_acceleration_sd = 0.5  # m/s^2
+baro_bias_drift_sd = 0.05  # Drift of the barometric altitude offset (weather, sensor temperature), m/s
+baro_bias_prior_sd = 100.0  # Barometric offset before the GPS has been heard from, Distance in meters
+
+# Measurements further than this many standard deviations from the prediction are
+# rejected as outliers, unless max_rejections in a row have been (then the filter follows)
+innovation_gate = 5.0
+max_rejections = 10
+
+# The Sense HAT barometer (LPS25H) only measures 260 to 1260 mbar, readings outside are ignored
+min_valid_pressure = 260.0
+max_valid_pressure = 1260.0
+
+# The accelerometer magnitude minus gravity can drive the vertical rate, but a swinging
+# payload adds centripetal acceleration and one reading per sample aliases badly
+use_accelerometer = False
+gravity = 9.80665
+
+# Payload timestamps are milliseconds that wrap around at 2^32
+timestamp_modulo = 2**32
+
+# State vector layout
+ALTITUDE, VERTICAL_RATE, VELOCITY_NORTH, VELOCITY_EAST, BARO_BIAS = range(5)
+
+def pressure_altitude(pressure):
+    # International Standard Atmosphere altitude in meters for pressures in mbar, works on arrays
+    pressure = np.asarray(pressure, dtype=np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        troposphere = 44330.77 * (1 - (pressure / 1013.25) ** 0.190263)
+        stratosphere = 11000 + 6341.62 * np.log(226.32 / pressure)  # Isothermal above 11 km
+    return np.where(pressure > 226.32, troposphere, stratosphere)
+
+def _number(sample, field):
+    # Float value of a field, NaN if it is missing or empty
+    try:
+        return float(sample.get(field, ''))
+    except (TypeError, ValueError):
+        return math.nan
+
+class StateEstimator:
+    """
+    Kalman filter over altitude, vertical rate, north and east velocity and the
+    offset between barometric and GPS altitude.
+
+    GPS altitude and barometric altitude (from Pressure) both measure altitude;
+    the barometer's offset from GPS is part of the state, so the barometer carries
+    the altitude through GPS dropouts and the GPS keeps the barometer honest.
+    GPS Speed and Heading measure the horizontal velocity. Measurements are
+    applied one at a time, so there is no matrix inversion, and all matrices are
+    allocated once.
+
+    Feed live samples to update(). run_batch() runs the same filter over a whole
+    log and can smooth it afterwards for post-flight analysis.
+    """
+
+    def __init__(self):
+        self.x = np.zeros(5)
+        self.P = np.zeros((5, 5))
+        self.F = np.eye(5)
+        self.Q = np.zeros((5, 5))
+
+        # Scratch space, so a step allocates nothing
+        self.Fx = np.zeros(5)
+        self.FP = np.zeros((5, 5))
+        self.PHt = np.zeros(5)
+        self.KPHt = np.zeros((5, 5))
+
+        # Measurement rows
+        self.H_gps_altitude = np.array([1.0, 0, 0, 0, 0])
+        self.H_baro_altitude = np.array([1.0, 0, 0, 0, 1.0])
+        self.H_velocity_north = np.array([0, 0, 1.0, 0, 0])
+        self.H_velocity_east = np.array([0, 0, 0, 1.0, 0])
+
+        self.initialized = False
+        self.last_timestamp = None
+        self.rejections = {}  # Outliers in a row, per measurement
+        self.stats = {'Samples': 0, 'Rejected': 0}
+
+    def reset(self):
+        self.initialized = False
+        self.last_timestamp = None
+        self.rejections = {}
+
+    def _initialize(self):
+        # Unknown altitude and velocity, the barometer offset assumed small until the GPS says otherwise
+        self.x[:] = 0
+        self.P[:] = 0
+        self.P[ALTITUDE, ALTITUDE] = 1e8
+        self.P[VERTICAL_RATE, VERTICAL_RATE] = 100
+        self.P[VELOCITY_NORTH, VELOCITY_NORTH] = 100
+        self.P[VELOCITY_EAST, VELOCITY_EAST] = 100
+        self.P[BARO_BIAS, BARO_BIAS] = baro_bias_prior_sd ** 2
+        self.initialized = True
+
+    def _predict(self, dt, vertical_acceleration=math.nan):
+        # Move the state dt seconds forward, x = F x (+ acceleration), P = F P F^T + Q
+        self.F[ALTITUDE, VERTICAL_RATE] = dt
+        np.matmul(self.F, self.x, out=self.Fx)
+        self.x[:] = self.Fx
+        if not math.isnan(vertical_acceleration):
+            self.x[ALTITUDE] += 0.5 * vertical_acceleration * dt * dt
+            self.x[VERTICAL_RATE] += vertical_acceleration * dt
+
+        # White acceleration noise for altitude and vertical rate, random walk for the rest
+        q = vertical_acceleration_sd ** 2
+        self.Q[ALTITUDE, ALTITUDE] = q * dt ** 4 / 4
+        self.Q[ALTITUDE, VERTICAL_RATE] = self.Q[VERTICAL_RATE, ALTITUDE] = q * dt ** 3 / 2
+        self.Q[VERTICAL_RATE, VERTICAL_RATE] = q * dt ** 2
+        self.Q[VELOCITY_NORTH, VELOCITY_NORTH] = self.Q[VELOCITY_EAST, VELOCITY_EAST] = horizontal_acceleration_sd ** 2 * dt ** 2
+        self.Q[BARO_BIAS, BARO_BIAS] = baro_bias_drift_sd ** 2 * dt
+
+        np.matmul(self.F, self.P, out=self.FP)
+        np.matmul(self.FP, self.F.T, out=self.P)
+        self.P += self.Q
+
+    def _measure(self, name, H, z, variance):
+        # Scalar measurement update, returns False if z was rejected as an outlier
+        if math.isnan(z):
+            return False
+        np.matmul(self.P, H, out=self.PHt)
+        innovation_variance = float(H @ self.PHt) + variance
+        innovation = z - float(H @ self.x)
+        if innovation * innovation > innovation_gate ** 2 * innovation_variance:
+            self.rejections[name] = self.rejections.get(name, 0) + 1
+            if self.rejections[name] <= max_rejections:
+                self.stats['Rejected'] += 1
+                return False
+        self.rejections[name] = 0
+        gain = self.PHt / innovation_variance
+        self.x += gain * innovation
+        np.multiply.outer(gain, self.PHt, out=self.KPHt)
+        self.P -= self.KPHt
+        return True
+
+    def step(self, dt, gps_altitude, baro_altitude, velocity_north, velocity_east, vertical_acceleration=math.nan):
+        """
+        One filter step with measurements that are NaN when missing.
+
+        Args:
+        dt (float): Time since the previous step, Time in seconds.
+        gps_altitude (float): GPS altitude, Distance in meters.
+        baro_altitude (float): Pressure altitude, Distance in meters.
+        velocity_north (float): GPS velocity, m/s.
+        velocity_east (float): GPS velocity, m/s.
+        vertical_acceleration (float): Vertical acceleration from the IMU, m/s^2.
+
+        Returns:
+        bool: True once the filter has an estimate.
+        """
+        if not self.initialized:
+            if math.isnan(gps_altitude) and math.isnan(baro_altitude):
+                return False
+            self._initialize()
+        elif dt > 0:
+            self._predict(dt, vertical_acceleration)
+        self._measure('gps_altitude', self.H_gps_altitude, gps_altitude, gps_altitude_sd ** 2)
+        self._measure('baro_altitude', self.H_baro_altitude, baro_altitude, baro_altitude_sd ** 2)
+        self._measure('velocity_north', self.H_velocity_north, velocity_north, gps_velocity_sd ** 2)
+        self._measure('velocity_east', self.H_velocity_east, velocity_east, gps_velocity_sd ** 2)
+        return True
+
+    def update(self, sample):
+        """
+        Runs the filter on one received sample.
+
+        Returns:
+        dict: estimate_fields with the filtered values, None until the first altitude.
+        """
+        self.stats['Samples'] += 1
+        try:
+            timestamp = int(sample['Timestamp'])
+        except (KeyError, TypeError, ValueError):
+            return self.estimate()
+        if self.last_timestamp is None:
+            dt = 0.0
+        else:
+            elapsed_ms = (timestamp - self.last_timestamp) % timestamp_modulo
+            if elapsed_ms >= timestamp_modulo // 2:
+                return self.estimate()  # Older than the last sample
+            dt = elapsed_ms / 1000
+        self.last_timestamp = timestamp
+
+        measurements = sample_measurements(
+            _number(sample, 'Latitude'), _number(sample, 'Longitude'), _number(sample, 'Altitude'),
+            _number(sample, 'Pressure'), _number(sample, 'Speed'), _number(sample, 'Heading'),
+            _number(sample, 'Accelerometer_X'), _number(sample, 'Accelerometer_Y'), _number(sample, 'Accelerometer_Z'))
+        self.step(dt, *(float(value) for value in measurements))
+        return self.estimate(float(measurements[1]))
+
+    def estimate(self, baro_altitude=math.nan):
+        if not self.initialized:
+            return {field: None for field in estimate_fields}
+        return {
+            'Filtered_Altitude': round(float(self.x[ALTITUDE]), 2),
+            'Vertical_Rate': round(float(self.x[VERTICAL_RATE]), 2),
+            'Velocity_North': round(float(self.x[VELOCITY_NORTH]), 2),
+            'Velocity_East': round(float(self.x[VELOCITY_EAST]), 2),
+            'Baro_Altitude': None if math.isnan(baro_altitude) else round(baro_altitude, 2),
+        }
+
+    def run_batch(self, timestamps, latitude, longitude, altitude, pressure, speed, heading,
+                  accelerometer_x=None, accelerometer_y=None, accelerometer_z=None, smooth=True):
+        """
+        Runs the filter over a whole log. The measurements of every sample are
+        worked out at once with NumPy, then the filter steps through them. With
+        smooth, a Rauch-Tung-Striebel pass runs backwards over the filtered
+        states, so every estimate also uses the samples after it.
+
+        Args:
+        timestamps (array): Payload timestamps in ms, wrapping at 2^32.
+        latitude, longitude, altitude, pressure, speed, heading (array): Log columns, NaN when missing.
+        accelerometer_x, accelerometer_y, accelerometer_z (array): Optional IMU columns.
+        smooth (bool): Smooth the estimates with the samples after them too.
+
+        Returns:
+        dict: One array per estimate field, NaN before the first altitude.
+        """
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        count = len(timestamps)
+        if accelerometer_x is None:
+            accelerometer_x = accelerometer_y = accelerometer_z = np.full(count, np.nan)
+        measurements = sample_measurements(latitude, longitude, altitude, pressure, speed, heading,
+                                           accelerometer_x, accelerometer_y, accelerometer_z)
+        gps_altitude, baro_altitude, velocity_north, velocity_east, vertical_acceleration = (np.asarray(column, dtype=np.float64) for column in measurements)
+        dt = np.zeros(count)
+        dt[1:] = np.mod(np.diff(timestamps), timestamp_modulo) / 1000
+        dt[dt >= timestamp_modulo / 2000] = 0  # Out of order samples aren't predicted across
+
+        self.reset()
+        filtered = np.full((count, 5), np.nan)
+        filtered_covariance = np.zeros((count, 5, 5))
+        predicted = np.full((count, 5), np.nan)
+        predicted_covariance = np.zeros((count, 5, 5))
+        transitions = np.tile(np.eye(5), (count, 1, 1))
+        for index in range(count):
+            # Predict here rather than in step(), so the prediction can be kept for the smoother
+            if self.initialized and dt[index] > 0:
+                self._predict(dt[index], vertical_acceleration[index])
+                transitions[index] = self.F
+            predicted[index] = self.x
+            predicted_covariance[index] = self.P
+            if self.step(0, gps_altitude[index], baro_altitude[index], velocity_north[index], velocity_east[index]):
+                filtered[index] = self.x
+                filtered_covariance[index] = self.P
+
+        states = filtered
+        valid = ~np.isnan(filtered[:, 0])
+        if smooth and valid.sum() > 1:
+            states = filtered.copy()
+            first = int(np.argmax(valid))
+            # Smoother gains of all steps at once, C[k] = P[k] F[k+1]^T Ppredicted[k+1]^-1, solved transposed
+            gains = np.linalg.solve(predicted_covariance[first + 1:],
+                                    transitions[first + 1:] @ filtered_covariance[first:-1]).transpose(0, 2, 1)
+            for index in range(count - 2, first - 1, -1):
+                states[index] = filtered[index] + gains[index - first] @ (states[index + 1] - predicted[index + 1])
+
+        return {
+            'Filtered_Altitude': states[:, ALTITUDE],
+            'Vertical_Rate': states[:, VERTICAL_RATE],
+            'Velocity_North': states[:, VELOCITY_NORTH],
+            'Velocity_East': states[:, VELOCITY_EAST],
+            'Baro_Altitude': baro_altitude,
+        }
+
+def sample_measurements(latitude, longitude, altitude, pressure, speed, heading, accelerometer_x, accelerometer_y, accelerometer_z):
+    """
+    Turns raw telemetry into filter measurements, NaN where a measurement is
+    missing or invalid. Works on single values and on whole log columns.
+
+    Returns:
+    tuple: GPS altitude, barometric altitude, north velocity, east velocity and vertical acceleration.
+    """
+    latitude, longitude, altitude, pressure, speed, heading = (np.asarray(value, dtype=np.float64) for value in
+                                                               (latitude, longitude, altitude, pressure, speed, heading))
+    # The GPS reports (0, 0) until it has a fix, its altitude and velocity mean nothing then
+    no_fix = (latitude == 0) & (longitude == 0)
+    gps_altitude = np.where(no_fix, np.nan, altitude)
+    valid_pressure = (pressure >= min_valid_pressure) & (pressure <= max_valid_pressure)
+    baro_altitude = np.where(valid_pressure, pressure_altitude(np.where(valid_pressure, pressure, 1013.25)), np.nan)
+    velocity_north = np.where(no_fix, np.nan, speed * np.cos(np.radians(heading)))
+    velocity_east = np.where(no_fix, np.nan, speed * np.sin(np.radians(heading)))
+    if use_accelerometer:
+        magnitude = np.sqrt(np.square(accelerometer_x) + np.square(accelerometer_y) + np.square(accelerometer_z))
+        vertical_acceleration = magnitude - gravity
+    else:
+        vertical_acceleration = np.full(np.shape(altitude), np.nan)
+    return gps_altitude, baro_altitude, velocity_north, velocity_east, vertical_acceleration
+
+# Log columns the batch mode reads, the payload and ground station logs share these headers
+log_columns = {
+    'Timestamp': 'Timestamp',
+    'Latitude': 'Latitude',
+    'Longitude': 'Longitude',
+    'Altitude': 'Altitude (m)',
+    'Pressure': 'Pressure (mbar)',
+    'Speed': 'Speed (m/s)',
+    'Heading': 'Heading',
+    'Accelerometer_X': 'Accelerometer X (m/s^2)',
+    'Accelerometer_Y': 'Accelerometer Y (m/s^2)',
+    'Accelerometer_Z': 'Accelerometer Z (m/s^2)',
+}
+
+def estimate_log(filename, output_filename, smooth=True):
+    """
+    Runs the estimator over a CSV log and writes the log again with the estimate
+    columns added (replacing any recorded live).
+
+    Returns:
+    int: Number of rows written.
+    """
+    with open(filename, newline='') as csvfile:
+        rows = list(csv.reader(csvfile))
+    header, rows = rows[0], rows[1:]
+    keep = [index for index, name in enumerate(header) if name not in estimate_header]
+
+    def column(name):
+        index = header.index(log_columns[name])
+        values = np.full(len(rows), np.nan)
+        for row_index, row in enumerate(rows):
+            try:
+                values[row_index] = float(row[index])
+            except (IndexError, ValueError):
+                pass
+        return values
+
+    columns = {name: column(name) for name in log_columns}
+    result = StateEstimator().run_batch(columns['Timestamp'], columns['Latitude'], columns['Longitude'], columns['Altitude'],
+                                        columns['Pressure'], columns['Speed'], columns['Heading'],
+                                        columns['Accelerometer_X'], columns['Accelerometer_Y'], columns['Accelerometer_Z'], smooth=smooth)
+
+    with open(output_filename, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow([header[index] for index in keep] + estimate_header)
+        for row_index, row in enumerate(rows):
+            estimates = ['' if np.isnan(result[field][row_index]) else round(float(result[field][row_index]), 2) for field in estimate_fields]
+            writer.writerow([row[index] if index < len(row) else '' for index in keep] + estimates)
+    return len(rows)
+
+if __name__ == "__main__":
+    # Post-flight: python state_estimator.py data_1.csv [output.csv]
+    log_filename = sys.argv[1]
+    output_filename = sys.argv[2] if len(sys.argv) > 2 else log_filename.rsplit('.', 1)[0] + '_estimated.csv'
+    rows = estimate_log(log_filename, output_filename)
+    print(f"Wrote {rows} rows to {output_filename}")
@@ -8,30 +8,70 @@ from PIL import ImageDraw
 import time
 import datetime
 import messagebox
-from tkintermapview import TkinterMapView
+from map_tiles import TileCache, CachedMapView
 import requests
 from queue import Queue
 from threading import Thread
 import math
+import json
+import numpy as np
+import decimation
+from sample_store import SampleStore
+from track_layer import TrackLayer
 
 _URL = "http://localhost:5000/api/data"
+_STREAM_URL = "http://localhost:5000/api/stream"
 data_queue = Queue()
 
+# Map tiles are kept on disk so the map works without internet, seed this file before the flight with map_tiles.py
+map_tiles_filename = "map_tiles.mbtiles"
+map_offline = False  # Set to True to never download tiles
+
+# Numeric channels of every sample kept in the GUI's sample store
+channel_fields = ['Timestamp', 'Accelerometer_X', 'Accelerometer_Y', 'Accelerometer_Z', 'Gyroscope_X', 'Gyroscope_Y', 'Gyroscope_Z',
+                  'Humidity', 'Pressure', 'Temperature_Humidity', 'Temperature_Pressure', 'Temperature_Thermocouple',
+                  'Latitude', 'Longitude', 'Altitude', 'Speed', 'Heading', 'RSSI',
+                  'Filtered_Altitude', 'Vertical_Rate', 'Velocity_North', 'Velocity_East', 'Baro_Altitude']
+
 def api_call_thread():
-    # Thread function to make API calls and retrieve data.
+    # Thread function that follows the ground station's event stream and queues every sample.
+    session = requests.Session()  # Reuses the connection between reconnects
+    last_event_id = None
     while True:
+        headers = {'Accept': 'text/event-stream'}
+        if last_event_id is not None:
+            # Resume where we left off, the server replays anything we missed
+            headers['Last-Event-ID'] = str(last_event_id)
         try:
-            response = requests.get(_URL)
-            if response.status_code == 200:
-                data = response.json()
-                print(f"Data retrieved: {data}")
-                data_queue.put(data)
-            else:
-                print(f"Error retrieving data from API. Status code: {response.status_code}")
-        except requests.exceptions.RequestException as e:
+            # The server sends a keepalive every 15 seconds, so a 30 second read timeout means the link is gone
+            with session.get(_STREAM_URL, headers=headers, stream=True, timeout=(5, 30)) as response:
+                if response.status_code != 200:
+                    print(f"Error retrieving data from API. Status code: {response.status_code}")
+                    time.sleep(1)
+                    continue
+                event = {}
+                for line in response.iter_lines(decode_unicode=True):
+                    if line:
+                        # Accumulate the fields of one event, lines starting with ':' are keepalives
+                        if not line.startswith(':'):
+                            field, _, value = line.partition(':')
+                            value = value[1:] if value.startswith(' ') else value
+                            event[field] = event[field] + '\n' + value if field in event else value
+                        continue
+                    # A blank line ends the event
+                    if 'data' in event:
+                        if 'id' in event:
+                            last_event_id = int(event['id'])
+                        data = json.loads(event['data'])
+                        if event.get('event') == 'prediction':
+                            data_queue.put({'Prediction': data})
+                        else:
+                            print(f"Data retrieved: {data}")
+                            data_queue.put(data)
+                    event = {}
+        except (requests.exceptions.RequestException, ValueError) as e:
             print(f"Error retrieving data from API: {str(e)}")
-        
-        time.sleep(1)  # Adjust the delay between API calls as needed
+            time.sleep(1)
 
 class TelemetryUI:
     def __init__(self, master):
@@ -43,8 +83,8 @@ class TelemetryUI:
 
         # Initialize data variables
         self.mission_duration = 0 # initial mission duration
-        self.data_time = []  # Initialize list to store time data for plotting
-        self.data_time.append(self.mission_duration)
+        # Every channel of every sample, plots read their data from here
+        self.samples = SampleStore(channel_fields, retention=3600, rate_hz=10)
         self.acceleration = (0,0,0)
         self.gyroscope = (0,0,0)
         self.humidity = 0
@@ -54,15 +94,23 @@ class TelemetryUI:
         self.temperature_thermocouple = 0
         self.coordinates = self.ground_station  # Initial coordinates
         self.altitude = 0  # Initial altitude
-        self.altitude_data = []  # Initialize list to store altitude data for plotting
-        self.altitude_data.append(self.altitude)
         self.speed = 0
         self.heading = 0
+        self.vertical_rate = None  # Filtered by the ground station, None until it has an altitude
         self.heartbeat = "TIMEOUT"
         self.rssi = 0
+        self.new_fixes = []  # Positions received since the track was last drawn
+        self.new_prediction = None  # Landing prediction not drawn yet
+        self.landing_ellipses = {}  # Map polygon of each landing prediction, by name
+        self.landing_marker = None
 
         # Initialize variables
-        self.polling_rate = 1000  # Polling rate in ms
+        self.polling_rate = 1000  # Polling rate in ms, displays refresh at least this often
+        self.stream_check_interval = 50  # How often the stream queue is checked, in ms
+        self.last_refresh = 0
+        self.frame_budget = 30  # Time in ms spent redrawing per tick, widgets that don't fit are drawn on the next tick
+        self.dirty = {'heartbeat', 'compass', 'raw', 'map', 'altitude'}  # Widgets whose inputs changed since they were last drawn
+        self.shown_raw_text = None  # Contents of the raw data display
         self.blink_event = None
         self.is_blinking = False
 
@@ -77,13 +125,21 @@ class TelemetryUI:
         self.polling_rate_value = ttk.Label(master, text=str(self.polling_rate/1000))
         self.update_button = ttk.Button(master, text="Update", command=self.update_polling_rate)
         self.raw_data_label = ttk.Label(master, text="Raw Data:")
-        self.raw_data_text = tk.Text(master, height=14, width=50)
+        self.raw_data_text = tk.Text(master, height=15, width=50)
         self.map_label = ttk.Label(master, text="Map:")
-        self.map_frame = TkinterMapView(master, width=800, height=600, corner_radius=0)
+        self.map_frame = CachedMapView(master, TileCache(map_tiles_filename), offline=map_offline, width=800, height=600, corner_radius=0)
         self.altitude_label = ttk.Label(master, text="Altitude Log:")
         self.altitude_figure = plt.Figure(figsize=(5, 4), dpi=100)
         self.altitude_plot = self.altitude_figure.add_subplot(111)
         self.altitude_canvas = FigureCanvasTkAgg(self.altitude_figure, master)
+        self.altitude_plot.set_xlabel('Mission Time (m)')
+        self.altitude_plot.set_ylabel('Altitude (ft)')
+        self.altitude_plot.set_title('Altitude Log')
+        self.altitude_line, = self.altitude_plot.plot([], [], animated=True)  # Drawn by blitting, see update_altitude_log_display
+        self.altitude_background = None  # Axes without the line, captured after every full redraw
+        self.altitude_canvas.mpl_connect('draw_event', self.on_altitude_draw)
+        self.max_plot_points = 1000  # Longer altitude histories are decimated to this many points
+        self.plotted_samples = 0  # Altitude samples shown by the last plot update
         self.heartbeat_label = ttk.Label(master, text="Heartbeat Status:")
         self.heartbeat_status = ttk.Label(master, text="", font=("Arial", 14))
         self.heartbeat_indicator = ttk.Label(master, text="●", font=("Arial", 24, "bold"))
@@ -121,22 +177,46 @@ class TelemetryUI:
         master.grid_columnconfigure(4, weight=1)
 
         # Create the map
+        self.track = None  # Flight track on the map, created with the map
         self.create_map()
 
         # Start the background thread for API calls
         api_thread = Thread(target=api_call_thread, daemon=True)
         api_thread.start()
 
+        # Widgets in drawing order, cheapest first
+        self.renderers = [('heartbeat', self.update_heartbeat_display),
+                          ('compass', self.update_compass_display),
+                          ('raw', self.update_raw_display),
+                          ('map', self.update_map_display),
+                          ('altitude', self.update_altitude_log_display)]
+
         # Start periodic updates
         self.poll_data()
 
     def pull_data(self):
-        # Pull data from the data queue and update data variables.
-        while not data_queue.empty():
-            data = data_queue.get()
-
-            self.mission_duration = (time.time() - self.time_initial) / 60
-            self.data_time.append(self.mission_duration)
+        # Pull everything queued so far into one update and mark the widgets whose inputs changed. Returns the samples pulled.
+        previous_heartbeat, previous_coordinates, previous_heading, previous_speed = self.heartbeat, self.coordinates, self.heading, self.speed
+        new_samples = 0
+        # Only what is already queued, so a fast stream can't keep the GUI thread in here
+        for _ in range(data_queue.qsize()):
+            data = data_queue.get_nowait()
+
+            # Landing predictions are drawn on the map
+            if 'Prediction' in data:
+                self.new_prediction = data['Prediction']
+                self.dirty.add('map')
+                continue
+
+            # Status events only carry the heartbeat
+            if 'Timestamp' not in data:
+                self.heartbeat = data["Heartbeat_Status"]
+                continue
+
+            received = time.time()
+            self.samples.append(data, received)
+            new_samples += 1
+            self.mission_duration = (received - self.time_initial) / 60
             self.acceleration = (round(data["Accelerometer_X"],2), round(data["Accelerometer_Y"],2), round(data["Accelerometer_Z"],2))
             self.gyroscope = (round(data["Gyroscope_X"],2), round(data["Gyroscope_Y"],2), round(data["Gyroscope_Z"],2))
             self.humidity = round(data["Humidity"],0)
@@ -145,18 +225,29 @@ class TelemetryUI:
             self.temperature_pressure = round(data["Temperature_Pressure"],0)
             self.temperature_thermocouple = round(data["Temperature_Thermocouple"],0)
             self.coordinates = (round(data["Latitude"],6), round(data["Longitude"],6))
+            if self.coordinates != (0, 0):  # (0, 0) means the GPS has no fix yet
+                self.new_fixes.append(self.coordinates)
             self.altitude = round(data["Altitude"] * 3.28084,0)
-            self.altitude_data.append(self.altitude)
             self.speed = round(data["Speed"],2)
             self.heading = round(data["Heading"],2)
+            self.vertical_rate = data.get("Vertical_Rate")
             self.heartbeat = data["Heartbeat_Status"]
             self.rssi = data["RSSI"]
 
+        if new_samples:
+            self.dirty.update(('raw', 'altitude'))
+        if self.heartbeat != previous_heartbeat:
+            self.dirty.add('heartbeat')
+        if self.coordinates != previous_coordinates or self.new_fixes:
+            self.dirty.add('map')
+        if (self.heading, self.speed) != (previous_heading, previous_speed):
+            self.dirty.add('compass')
+        return new_samples
+
         # Implement the logic to pull data from the rfd900x_ground.py
         # Generate random data for demonstration purposes
         '''
         self.mission_duration = (time.time() - self.time_initial) / 60
-        self.data_time.append(self.mission_duration)
         self.acceleration = (round(random.uniform(-10.0, 10.0),2), round(random.uniform(-10.0, 10.0),2), round(random.uniform(-10.0, 10.0),2))
         self.gyroscope = (round(random.uniform(-5.0, 5.0),2), round(random.uniform(-5.0, 5.0),2), round(random.uniform(-5.0, 5.0),2))
         self.humidity = random.randint(0, 100)
@@ -166,53 +257,118 @@ class TelemetryUI:
         self.temperature_thermocouple = random.uniform(-50.0, 30.0)
         self.coordinates = (random.uniform(28.0, 34.0), random.uniform(-104.0, -96.0))
         self.altitude = random.randint(0, 1000)
-        self.altitude_data.append(self.altitude)
+        self.samples.append({'Altitude': self.altitude / 3.28084}, time.time())
 
         self.heartbeat = "TIMEOUT"
         '''
 
     def update_raw_display(self):
-        # Update the raw data display with the latest data.
+        # Update the raw data display with the latest data, the text box is only rewritten if its contents changed.
+        text = (f"Mission Duration (mins): {round(self.mission_duration,1)}\n"
+                f"Time: {datetime.datetime.fromtimestamp(time.time()).strftime('%Y-%m-%d %H:%M:%S')}\n"
+                f"RSSI: {self.rssi} dBm\n"
+                f"Acceleration: {self.acceleration}\n"
+                f"Gyroscope: {self.gyroscope}\n"
+                f"Humidity (Internal): {self.humidity}%\n"
+                f"Pressure (Internal): {self.pressure} mbar\n"
+                f"Temperature (Internal): {round(self.temperature_humidity,2)} C\n"
+                f"Temperature (External): {round(self.temperature_thermocouple,2)} C\n"
+                f"Coordinates: {round(self.coordinates[0],6)}, {round(self.coordinates[1],6)}\n"
+                f"Altitude: {round(self.altitude,0)} ft\n"
+                f"Vertical Rate: {'--' if self.vertical_rate is None else round(self.vertical_rate,1)} m/s\n"
+                f"Speed: {round(self.speed,2)} m/s\n"
+                f"Heading: {round(self.heading,2)}°\n")
+        if text == self.shown_raw_text:
+            return
+        self.shown_raw_text = text
         self.raw_data_text.delete(1.0, tk.END)
-        self.raw_data_text.insert(tk.END, f"Mission Duration (mins): {round(self.mission_duration,1)}\n")
-        self.raw_data_text.insert(tk.END, f"Time: {datetime.datetime.fromtimestamp(time.time()).strftime('%Y-%m-%d %H:%M:%S')}\n")
-        self.raw_data_text.insert(tk.END, f"RSSI: {self.rssi} dBi\n")
-        self.raw_data_text.insert(tk.END, f"Acceleration: {self.acceleration}\n")
-        self.raw_data_text.insert(tk.END, f"Gyroscope: {self.gyroscope}\n")
-        self.raw_data_text.insert(tk.END, f"Humidity (Internal): {self.humidity}%\n")
-        self.raw_data_text.insert(tk.END, f"Pressure (Internal): {self.pressure} mbar\n")
-        self.raw_data_text.insert(tk.END, f"Temperature (Internal): {round(self.temperature_humidity,2)} C\n")
-        self.raw_data_text.insert(tk.END, f"Temperature (External): {round(self.temperature_thermocouple,2)} C\n")
-        self.raw_data_text.insert(tk.END, f"Coordinates: {round(self.coordinates[0],6)}, {round(self.coordinates[1],6)}\n")
-        self.raw_data_text.insert(tk.END, f"Altitude: {round(self.altitude,0)} ft\n")
-        self.raw_data_text.insert(tk.END, f"Speed: {round(self.speed,2)} m/s\n")
-        self.raw_data_text.insert(tk.END, f"Heading: {round(self.heading,2)}°\n")
+        self.raw_data_text.insert(tk.END, text)
     
     def update_map_display(self):
-        # Update the map display with the latest marker positions.
+        # Move the balloon marker to its latest position, the ground station marker never moves.
+        fixes, self.new_fixes = self.new_fixes, []
         try:
-            # Update the marker positions
-            if self.ground_station_marker is not None:
-                self.ground_station_marker.set_position(self.ground_station[0], self.ground_station[1])
             if self.balloon_marker is not None:
                 self.balloon_marker.set_position(self.coordinates[0], self.coordinates[1])
+            # Extend the flight track with every fix, not just the latest
+            if self.track is not None:
+                for latitude, longitude in fixes:
+                    self.track.append(latitude, longitude)
+            if self.new_prediction is not None:
+                self.draw_landing_prediction(self.new_prediction)
+                self.new_prediction = None
+            # Get the tiles the balloon is heading into ready before the map needs them
+            self.map_frame.prefetch_track(self.coordinates[0], self.coordinates[1], self.heading, self.speed)
             print("Map markers updated")
         except Exception as e:
             print(f"Error updating map display: {str(e)}")
 
-    def update_altitude_log_display(self):
-        # Update the altitude log display with the latest altitude data.
-        # Clear the previous plot
-        self.altitude_plot.clear()
-
-        # Plot the altitude data
-        self.altitude_plot.plot(self.data_time, self.altitude_data)
-        self.altitude_plot.set_xlabel('Mission Time (m)')
-        self.altitude_plot.set_ylabel('Altitude (ft)')
-        self.altitude_plot.set_title('Altitude Log')
+    def draw_landing_prediction(self, prediction):
+        # Move the landing marker and ellipses to the latest prediction, a cutdown-now ellipse is only shown while ascending
+        nominal = prediction['Nominal']
+        text = f"Landing ({round(nominal['Time_To_Landing_s'] / 60)} min)"
+        if self.landing_marker is None:
+            self.landing_marker = self.map_frame.set_marker(nominal['Latitude'], nominal['Longitude'], text=text, marker_color_circle='orange')
+        else:
+            self.landing_marker.set_position(nominal['Latitude'], nominal['Longitude'])
+            self.landing_marker.set_text(text)
+
+        colors = {'Nominal': 'orange', 'Cutdown_Now': 'purple'}
+        for name, color in colors.items():
+            ellipse = self.landing_ellipses.get(name)
+            if name not in prediction:
+                if ellipse is not None:
+                    ellipse.delete()
+                    del self.landing_ellipses[name]
+                continue
+            positions = [tuple(position) for position in prediction[name]['Ellipse']]
+            if ellipse is None:
+                self.landing_ellipses[name] = self.map_frame.set_polygon(positions, outline_color=color, fill_color=None, border_width=2)
+            else:
+                ellipse.position_list = positions
+                ellipse.draw()
 
-        # Refresh the altitude canvas
-        self.altitude_canvas.draw()
+    def update_altitude_log_display(self):
+        # Update the altitude line in place when new data has arrived.
+        if self.samples.total_samples == self.plotted_samples and self.altitude_background is not None:
+            return
+        self.plotted_samples = self.samples.total_samples
+
+        # Decimate to a fixed number of points so the drawing cost doesn't grow with the flight
+        received, altitude = self.samples.series('Altitude')
+        x = (received - self.time_initial) / 60
+        y = altitude * 3.28084
+        indices = decimation.minmax_indices([y], self.max_plot_points)
+        self.altitude_line.set_data(x[indices], y[indices])
+
+        if self.altitude_background is None or self.rescale_altitude_axes(x, y):
+            # Full redraw, on_altitude_draw captures the new background and draws the line
+            self.altitude_canvas.draw()
+        else:
+            # Only the line changed, paste the saved axes back and draw the line over them
+            self.altitude_canvas.restore_region(self.altitude_background)
+            self.altitude_plot.draw_artist(self.altitude_line)
+            self.altitude_canvas.blit(self.altitude_plot.bbox)
+
+    def rescale_altitude_axes(self, x, y):
+        # Grow the axes with 25% headroom once the data leaves them, so full redraws stay rare. Returns True if the limits changed.
+        changed = False
+        for values, get_limits, set_limits in ((x, self.altitude_plot.get_xlim, self.altitude_plot.set_xlim),
+                                              (y, self.altitude_plot.get_ylim, self.altitude_plot.set_ylim)):
+            if np.isnan(values).all():
+                continue
+            low, high = np.nanmin(values), np.nanmax(values)
+            current_low, current_high = get_limits()
+            if low < current_low or high > current_high or self.altitude_background is None:
+                span = max(high - low, 1)
+                set_limits(low - span * 0.05, high + span * 0.25)
+                changed = True
+        return changed
+
+    def on_altitude_draw(self, event):
+        # After a full redraw, keep the empty axes for blitting and put the line back on top.
+        self.altitude_background = self.altitude_canvas.copy_from_bbox(self.altitude_plot.bbox)
+        self.altitude_plot.draw_artist(self.altitude_line)
 
     def update_polling_rate(self):
         # Update the polling rate based on the user input.
@@ -237,27 +393,43 @@ class TelemetryUI:
             # Add markers for ground_station and coordinates
             self.ground_station_marker = self.map_frame.set_marker(self.ground_station[0], self.ground_station[1], text='Ground Station', marker_color_circle='red')
             self.balloon_marker = self.map_frame.set_marker(self.coordinates[0], self.coordinates[1], text='Balloon', marker_color_circle='blue')
+            self.track = TrackLayer(self.map_frame, color='blue', width=3)
             print("Markers added to the map")
         except Exception as e:
             print(f"Error creating map: {str(e)}")
 
-    def poll_data(self):
-        # Poll data and update displays periodically.
-
-        # Update data
-        self.pull_data()
-
-        # Update displays
-        self.update_raw_display()
-        self.update_map_display()
-        self.update_altitude_log_display()
-        self.update_heartbeat_display(self.heartbeat)
+    def update_compass_display(self):
         self.compass_widget.update_compass(self.heading, self.speed)
         self.heading_label.config(text=f"Heading: {self.heading}°")
         self.velocity_label.config(text=f"Velocity: {self.speed} m/s")
 
-        # Schedule the next update based on the polling rate
-        self.master.after(self.polling_rate, self.poll_data)
+    def poll_data(self):
+        # Coalesce everything that streamed in since the last tick, then redraw only the widgets whose inputs changed.
+        self.pull_data()
+
+        # The clock and mission time in the raw display move even without new data
+        if (time.time() - self.last_refresh) * 1000 >= self.polling_rate:
+            self.last_refresh = time.time()
+            self.dirty.add('raw')
+
+        if self.dirty:
+            self.render()
+
+        # Check the stream again shortly
+        self.master.after(self.stream_check_interval, self.poll_data)
+
+    def render(self):
+        # Draw the dirty widgets until the frame budget is spent, the rest stay dirty for the next tick.
+        start = time.perf_counter()
+        for position, (widget, draw) in enumerate(self.renderers):
+            if widget not in self.dirty:
+                continue
+            if (time.perf_counter() - start) * 1000 >= self.frame_budget:
+                # Widgets that didn't fit go first next time, so a slow widget can't starve the ones after it
+                self.renderers = self.renderers[position:] + self.renderers[:position]
+                break
+            self.dirty.discard(widget)
+            draw()
 
     def confirm_cutdown(self):
         # Confirm cutdown action with a dialog box.
@@ -267,17 +439,28 @@ class TelemetryUI:
 
     def initiate_cutdown(self):
         # Implement the logic to initiate the cutdown
-        response = requests.post('http://localhost:5000/api/cutdown')
+        # The ground station retries until the payload acknowledges the command
+        try:
+            response = requests.post('http://localhost:5000/api/cutdown', timeout=15)
+        except requests.exceptions.RequestException as e:
+            messagebox.showerror("Cutdown Failed", f"Could not reach the ground station: {e}")
+            return
         print(response.text)
-        # Add your cutdown implementation here
-        self.mission_status_label.config(text="MISSION TERMINATED", foreground="red")
-
-    def update_heartbeat_display(self, status):
+        status = response.json()
+        if response.status_code != 200:
+            messagebox.showerror("Cutdown Failed", f"{status.get('error')} after {status.get('Attempts')} attempts.")
+            return
+        self.mission_status_label.config(text=f"MISSION TERMINATED (ACK in {status['Round_Trip_ms']} ms)", foreground="red")
+
+    def update_heartbeat_display(self):
+        status = self.heartbeat
         if status == "OK":
             self.heartbeat_status.config(text=status, foreground="green")
-            self.heartbeat_indicator.config(foreground="green")
-            self.heartbeat_indicator.after_cancel(self.blink_event)
             self.is_blinking = False
+            if self.blink_event is not None:
+                self.heartbeat_indicator.after_cancel(self.blink_event)
+                self.blink_event = None
+            self.heartbeat_indicator.config(foreground="green")
         else:
             self.heartbeat_status.config(text=status, foreground="red")
             if not self.is_blinking:
@@ -300,17 +483,22 @@ class CompassWidget(tk.Canvas):
         self.max_speed = max_speed
         self.heading = 0
         self.speed = 0
+        self.arrow = None
+        self.draw_compass()
 
     def update_compass(self, heading, speed):
+        # Only the arrow moves, it is repositioned in place rather than redrawing the compass
+        if (heading, speed) == (self.heading, self.speed):
+            return
         self.heading = heading
         self.speed = speed
-        self.draw_compass()
+        self.coords(self.arrow, *self.arrow_coordinates())
 
     def draw_compass(self):
+        # Draw the compass face once, the arrow is the only item that changes afterwards
         self.delete("all")
         center_x = self.size // 2
         center_y = self.size // 2
-        radius = self.size // 2 - 10
 
         # Draw compass circle
         self.create_oval(10, 10, self.size - 10, self.size - 10, outline="black", width=2)
@@ -322,6 +510,15 @@ class CompassWidget(tk.Canvas):
         self.create_text(20, center_y, text="W", font=("Arial", 12, "bold"))
         self.create_text(self.size - 20, center_y, text="E", font=("Arial", 12, "bold"))
 
+        # Draw velocity arrow
+        self.arrow = self.create_line(*self.arrow_coordinates(), fill="red", arrow="last", width=4)
+
+    def arrow_coordinates(self):
+        # Start and end point of the velocity arrow for the current heading and speed
+        center_x = self.size // 2
+        center_y = self.size // 2
+        radius = self.size // 2 - 10
+
         # Set minimum arrow length
         min_arrow_length = 20
 
@@ -332,8 +529,7 @@ class CompassWidget(tk.Canvas):
         arrow_end_x = center_x + arrow_length * math.sin(math.radians(self.heading))
         arrow_end_y = center_y - arrow_length * math.cos(math.radians(self.heading))
 
-        # Draw velocity arrow
-        self.create_line(center_x, center_y, arrow_end_x, arrow_end_y, fill="red", arrow="last", width=4)
+        return center_x, center_y, arrow_end_x, arrow_end_y
 
 root = tk.Tk()
 ui = TelemetryUI(root)
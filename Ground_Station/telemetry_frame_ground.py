@@ -0,0 +1,271 @@
+import struct
+
+# Packed telemetry frame shared by the payload and the ground station.
+# Payload/telemetry_frame.py and Ground_Station/telemetry_frame_ground.py must stay identical.
+#
+# Frame layout (little endian):
+#   header: version (u8) | frame type (u8) | sequence (u16) | body length (u8)
+#   body for FRAME_SAMPLE: validity bitmask (u32) | one fixed-point value per schema field
+#   body for FRAME_BATCH: sample count (u8) | first sample as in FRAME_SAMPLE | for every
+#       further sample: varint (mask XOR previous mask) | varint changed-field mask |
+#       zigzag varint delta from the previous sample for each changed field
+#   body for FRAME_COMMAND: command (u8) | command arguments
+#   body for FRAME_ACK: command (u8) | result (u8)
+# Each frame is carried in the data field of a single MAVLink ENCAPSULATED_DATA message.
+# Command and ACK frames go in both directions and use the sequence field for the command ID.
+
+FRAME_VERSION = 1
+FRAME_HEADER = struct.Struct('<BBHB')
+MAX_FRAME_SIZE = 253  # Size of the ENCAPSULATED_DATA data field
+
+# Frame types
+FRAME_SAMPLE = 0x01
+FRAME_BATCH = 0x02
+FRAME_COMMAND = 0x10
+FRAME_ACK = 0x11
+
+# Uplink commands
+COMMAND_CUTDOWN = 0x01
+COMMAND_RESEND = 0x02  # Arguments: ranges of telemetry frame sequence numbers, see encode_ranges()
+
+# Command results carried by FRAME_ACK, anything but RESULT_ACCEPTED is a NACK
+RESULT_ACCEPTED = 0
+RESULT_REJECTED = 1
+RESULT_UNSUPPORTED = 2
+RESULT_FAILED = 3
+COMMAND_HEADER = struct.Struct('<B')
+ACK_BODY = struct.Struct('<BB')
+RESEND_RANGE = struct.Struct('<HB')  # First sequence number, number of frames
+
+# Telemetry schema per frame version: (field, struct code, scale)
+# Values are sent as round(value * scale) and divided by scale on decode
+SCHEMAS = {
+    1: [
+        ('Timestamp', 'I', 1),                   # ms, exact
+        ('Accelerometer_X', 'h', 100),           # 0.01 m/s^2, +-327 m/s^2
+        ('Accelerometer_Y', 'h', 100),
+        ('Accelerometer_Z', 'h', 100),
+        ('Gyroscope_X', 'h', 1000),              # 0.001 rad/s, +-32 rad/s
+        ('Gyroscope_Y', 'h', 1000),
+        ('Gyroscope_Z', 'h', 1000),
+        ('Humidity', 'H', 100),                  # 0.01 %
+        ('Pressure', 'I', 1000),                 # 0.001 mbar
+        ('Temperature_Humidity', 'h', 100),      # 0.01 C
+        ('Temperature_Pressure', 'h', 100),
+        ('Temperature_Thermocouple', 'i', 100),
+        ('Latitude', 'i', 10**7),                # 1e-7 deg, same as the GPS receiver
+        ('Longitude', 'i', 10**7),
+        ('Altitude', 'i', 1000),                 # mm
+        ('Speed', 'H', 100),                     # cm/s
+        ('Heading', 'H', 100),                   # 0.01 deg
+    ],
+}
+
+# Integer range of each struct code, out of range values are clamped
+_limits = {
+    'h': (-2**15, 2**15 - 1),
+    'H': (0, 2**16 - 1),
+    'i': (-2**31, 2**31 - 1),
+    'I': (0, 2**32 - 1),
+}
+
+def _body_struct(version):
+    return struct.Struct('<I' + ''.join(code for _, code, _ in SCHEMAS[version]))
+
+_body_structs = {version: _body_struct(version) for version in SCHEMAS}
+
+def schema_fields(version=FRAME_VERSION):
+    return [field for field, _, _ in SCHEMAS[version]]
+
+def quantize(data, version=FRAME_VERSION):
+    # Returns (validity mask, list of fixed-point integers) for one sample
+    mask = 0
+    values = []
+    for index, (field, code, scale) in enumerate(SCHEMAS[version]):
+        value = data.get(field, "")
+        try:
+            low, high = _limits[code]
+            values.append(min(max(int(round(float(value) * scale)), low), high))
+            mask |= 1 << index
+        except (TypeError, ValueError, OverflowError):
+            # Missing, not a number or infinite, sent as invalid
+            values.append(0)
+    return mask, values
+
+def dequantize(mask, values, version=FRAME_VERSION):
+    # Inverse of quantize(), fields whose valid bit is clear are left out of the result
+    sample = {}
+    for index, ((field, _, scale), value) in enumerate(zip(SCHEMAS[version], values)):
+        if mask & (1 << index):
+            sample[field] = value if scale == 1 else value / scale
+    return sample
+
+def encode_sample(data, sequence, version=FRAME_VERSION):
+    # Pack one sample into a frame
+    mask, values = quantize(data, version)
+    body = _body_structs[version].pack(mask, *values)
+    return FRAME_HEADER.pack(version, FRAME_SAMPLE, sequence & 0xFFFF, len(body)) + body
+
+def _write_varint(buffer, value):
+    # Unsigned LEB128
+    while value > 0x7F:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+def _read_varint(body, position):
+    value = 0
+    shift = 0
+    while True:
+        if position >= len(body):
+            raise ValueError("Truncated varint")
+        byte = body[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, position
+        shift += 7
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+def _unzigzag(value):
+    return (value >> 1) ^ -(value & 1)
+
+def encode_batch(samples, sequence, version=FRAME_VERSION):
+    """
+    Packs several samples into one frame. The first sample is stored in full and
+    every other sample as varint deltas of its fixed-point values against the
+    sample before it. Fields that didn't change cost nothing beyond a mask bit,
+    so the slow environmental channels are almost free.
+    """
+    if not 0 < len(samples) < 256:
+        raise ValueError("A batch holds between 1 and 255 samples")
+    previous_mask, previous_values = quantize(samples[0], version)
+    body = bytearray([len(samples)])
+    body += _body_structs[version].pack(previous_mask, *previous_values)
+    for sample in samples[1:]:
+        mask, values = quantize(sample, version)
+        deltas = [value - previous_value for value, previous_value in zip(values, previous_values)]
+        changed = 0
+        for index, delta in enumerate(deltas):
+            if mask & (1 << index) and delta:
+                changed |= 1 << index
+        _write_varint(body, mask ^ previous_mask)
+        _write_varint(body, changed)
+        for index, delta in enumerate(deltas):
+            if changed & (1 << index):
+                _write_varint(body, _zigzag(delta))
+        # Invalid fields are carried forward so the next delta has a reference
+        previous_values = [value if mask & (1 << index) else previous_value
+                           for index, (value, previous_value) in enumerate(zip(values, previous_values))]
+        previous_mask = mask
+    if len(body) > 0xFF:
+        raise ValueError(f"Batch body of {len(body)} bytes is too long")
+    return FRAME_HEADER.pack(version, FRAME_BATCH, sequence & 0xFFFF, len(body)) + bytes(body)
+
+def batch_fits(samples, version=FRAME_VERSION):
+    # True if the samples can be sent together in one frame
+    try:
+        return len(encode_batch(samples, 0, version)) <= MAX_FRAME_SIZE
+    except ValueError:
+        return False
+
+def _decode_batch(body, version):
+    count = body[0]
+    body_struct = _body_structs[version]
+    unpacked = body_struct.unpack_from(body, 1)
+    mask, values = unpacked[0], list(unpacked[1:])
+    samples = [dequantize(mask, values, version)]
+    position = 1 + body_struct.size
+    for _ in range(count - 1):
+        mask_delta, position = _read_varint(body, position)
+        changed, position = _read_varint(body, position)
+        mask ^= mask_delta
+        for index in range(len(values)):
+            if changed & (1 << index):
+                delta, position = _read_varint(body, position)
+                values[index] += _unzigzag(delta)
+        samples.append(dequantize(mask, values, version))
+    return samples
+
+def encode_command(command, command_id, arguments=b'', version=FRAME_VERSION):
+    # Pack one uplink command, command_id is echoed back in the ACK
+    body = COMMAND_HEADER.pack(command) + bytes(arguments)
+    if len(body) > 0xFF:
+        raise ValueError(f"Command body of {len(body)} bytes is too long")
+    return FRAME_HEADER.pack(version, FRAME_COMMAND, command_id & 0xFFFF, len(body)) + body
+
+def encode_ack(command, command_id, result, version=FRAME_VERSION):
+    body = ACK_BODY.pack(command, result)
+    return FRAME_HEADER.pack(version, FRAME_ACK, command_id & 0xFFFF, len(body)) + body
+
+def encode_ranges(sequences):
+    # Compress sequence numbers into (first, count) ranges, wrapping at 2**16
+    arguments = bytearray()
+    first = None
+    count = 0
+    for sequence in sequences:
+        if first is not None and sequence == (first + count) % 2**16 and count < 0xFF:
+            count += 1
+            continue
+        if first is not None:
+            arguments += RESEND_RANGE.pack(first, count)
+        first = sequence
+        count = 1
+    if first is not None:
+        arguments += RESEND_RANGE.pack(first, count)
+    return bytes(arguments)
+
+def decode_ranges(arguments):
+    # Inverse of encode_ranges(), returns the list of sequence numbers
+    sequences = []
+    for first, count in RESEND_RANGE.iter_unpack(arguments[:len(arguments) - len(arguments) % RESEND_RANGE.size]):
+        sequences.extend((first + offset) % 2**16 for offset in range(count))
+    return sequences
+
+def decode_frame(frame):
+    """
+    Decodes a frame produced by this module.
+
+    Returns:
+    dict: {'version', 'type', 'sequence', 'samples'} where samples is a list of
+    field dictionaries. Command frames add 'command' and 'arguments', ACK frames
+    add 'command' and 'result', both with an empty samples list. Raises
+    ValueError for unknown or malformed frames.
+    """
+    if len(frame) < FRAME_HEADER.size:
+        raise ValueError("Frame too short")
+    version, frame_type, sequence, length = FRAME_HEADER.unpack_from(frame)
+    if version not in SCHEMAS:
+        raise ValueError(f"Unknown frame version {version}")
+    body = bytes(frame[FRAME_HEADER.size:FRAME_HEADER.size + length])
+    if len(body) != length:
+        raise ValueError("Truncated frame")
+
+    try:
+        if frame_type == FRAME_SAMPLE:
+            unpacked = _body_structs[version].unpack(body)
+            samples = [dequantize(unpacked[0], unpacked[1:], version)]
+        elif frame_type == FRAME_BATCH:
+            samples = _decode_batch(body, version)
+        elif frame_type == FRAME_COMMAND:
+            command, = COMMAND_HEADER.unpack_from(body)
+            return {'version': version, 'type': frame_type, 'sequence': sequence, 'samples': [],
+                    'command': command, 'arguments': body[COMMAND_HEADER.size:]}
+        elif frame_type == FRAME_ACK:
+            command, result = ACK_BODY.unpack(body)
+            return {'version': version, 'type': frame_type, 'sequence': sequence, 'samples': [],
+                    'command': command, 'result': result}
+        else:
+            raise ValueError(f"Unknown frame type {frame_type}")
+    except (struct.error, IndexError) as e:
+        raise ValueError(f"Malformed frame: {e}")
+
+    return {'version': version, 'type': frame_type, 'sequence': sequence, 'samples': samples}
+
+def pad_frame(frame):
+    # ENCAPSULATED_DATA always carries 253 bytes, MAVLink 2 strips the trailing zeros on the wire
+    if len(frame) > MAX_FRAME_SIZE:
+        raise ValueError(f"Frame of {len(frame)} bytes does not fit in one message")
+    return list(frame) + [0] * (MAX_FRAME_SIZE - len(frame))
@@ -0,0 +1,116 @@
+import math
+import threading
+import numpy as np
+import decimation
+
+class TelemetryHistory:
+    """
+    Bounded in-memory history of received samples, one NumPy ring buffer per field.
+
+    Samples are appended with an increasing sequence number (the stream event id),
+    so both the Sequence and the ground receive time columns stay sorted and range
+    queries are a binary search followed by a slice. Missing values are NaN. Once
+    capacity samples are held, the oldest are overwritten.
+
+    Args:
+    fields (list): Field names stored for every sample.
+    capacity (int): Samples kept.
+    """
+
+    def __init__(self, fields, capacity=100000):
+        self.fields = list(fields)
+        self.capacity = capacity
+        self.sequence = np.zeros(capacity, dtype=np.int64)
+        self.received = np.zeros(capacity, dtype=np.float64)
+        self.columns = {field: np.full(capacity, np.nan) for field in self.fields}
+        self.count = 0  # Samples held
+        self.next_index = 0  # Ring position of the next sample
+        self.lock = threading.Lock()
+
+    def append(self, sequence, sample, received):
+        with self.lock:
+            index = self.next_index
+            self.sequence[index] = sequence
+            self.received[index] = received
+            for field, column in self.columns.items():
+                value = sample.get(field, "")
+                try:
+                    column[index] = float(value)
+                except (TypeError, ValueError):
+                    column[index] = np.nan
+            self.next_index = (index + 1) % self.capacity
+            self.count = min(self.count + 1, self.capacity)
+
+    def _ordered(self, column):
+        # View of the held samples oldest first, copies only once the buffer has wrapped
+        if self.count < self.capacity:
+            return column[:self.count]
+        return np.concatenate((column[self.next_index:], column[:self.next_index]))
+
+    def _positions(self, low, high):
+        # Ring buffer positions of the samples low to high, counted from the oldest
+        oldest = 0 if self.count < self.capacity else self.next_index
+        return (oldest + np.arange(low, high)) % self.capacity
+
+    def query(self, since=None, start=None, end=None, fields=None, max_points=None, method='minmax'):
+        """
+        Returns the samples after sequence number since and received between
+        start and end (ground time, seconds since the epoch), as columns.
+
+        Args:
+        since (int): Only samples with a larger sequence number.
+        start (float): Only samples received at or after this time.
+        end (float): Only samples received at or before this time.
+        fields (list): Columns to return, all fields by default.
+        max_points (int): Downsample to at most this many points.
+        method (str): 'minmax' keeps the extremes of every bucket for all fields, 'lttb'
+            keeps the visual shape of a single field against receive time.
+
+        Returns:
+        dict: Sequence, Received and one list per field, plus Count (samples in the
+        range before downsampling) and Last_Sequence. Missing values are None.
+        """
+        fields = self.fields if fields is None else fields
+        unknown = [field for field in fields if field not in self.columns]
+        if unknown:
+            raise KeyError(f"Unknown fields: {', '.join(unknown)}")
+
+        with self.lock:
+            sequence = self._ordered(self.sequence)
+            received = self._ordered(self.received)
+            low = 0 if since is None else np.searchsorted(sequence, since, side='right')
+            if start is not None:
+                low = max(low, np.searchsorted(received, start, side='left'))
+            high = len(sequence) if end is None else np.searchsorted(received, end, side='right')
+            high = max(low, high)
+            positions = self._positions(low, high)
+            result_sequence = sequence[low:high].copy()
+            result_received = received[low:high].copy()
+            columns = {field: self.columns[field][positions] for field in fields}
+            last_sequence = int(sequence[-1]) if len(sequence) else None
+
+        if method not in ('minmax', 'lttb'):
+            raise ValueError(f"Unknown downsampling method: {method}")
+        if method == 'lttb' and len(fields) != 1:
+            raise ValueError("lttb downsampling needs exactly one field")
+
+        count = len(result_sequence)
+        if max_points is not None and count > max_points:
+            if method == 'lttb':
+                indices = decimation.lttb_indices(result_received, columns[fields[0]], max_points)
+            else:
+                indices = decimation.minmax_indices([columns[field] for field in fields] or [result_received], max_points)
+            result_sequence = result_sequence[indices]
+            result_received = result_received[indices]
+            columns = {field: column[indices] for field, column in columns.items()}
+
+        result = {
+            'Sequence': result_sequence.tolist(),
+            'Received': result_received.tolist(),
+            'Count': count,
+            'Last_Sequence': last_sequence,
+            'Downsampled': len(result_sequence) < count,
+        }
+        for field, column in columns.items():
+            result[field] = [None if math.isnan(value) else value for value in column.tolist()]
+        return result
@@ -0,0 +1,96 @@
+import json
+import logging
+import queue
+import threading
+from collections import deque
+
+class StreamBroadcaster:
+    """
+    Fans Server-Sent Events out to any number of subscribers.
+
+    Each event is serialized once in publish() and the same bytes are handed to
+    every subscriber's queue. Events are numbered, and the most recent ones are
+    kept so a client that reconnects with Last-Event-ID gets exactly the events
+    it missed. A subscriber whose queue fills up (a stalled client) is dropped
+    rather than slowing down the publisher; it can reconnect and catch up from
+    the replay buffer.
+
+    Args:
+    replay_size (int): Events kept for reconnecting clients.
+    max_pending (int): Events a subscriber can fall behind before it is dropped.
+    """
+
+    def __init__(self, replay_size=512, max_pending=256):
+        self.replay = deque(maxlen=replay_size)  # (event id, encoded event)
+        self.max_pending = max_pending
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.next_id = 1
+        self.events_published = 0
+        self.subscribers_dropped = 0
+
+    def publish(self, data, event=None):
+        # Serialize once and queue the same bytes for every subscriber
+        with self.lock:
+            event_id = self.next_id
+            self.next_id += 1
+            lines = [f"id: {event_id}"]
+            if event is not None:
+                lines.append(f"event: {event}")
+            lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+            encoded = ('\n'.join(lines) + '\n\n').encode()
+            self.replay.append((event_id, encoded))
+            self.events_published += 1
+            for subscriber in list(self.subscribers):
+                # A reconnecting client may start with the whole replay buffer queued
+                if subscriber.qsize() >= self.max_pending + self.replay.maxlen:
+                    self.subscribers.discard(subscriber)
+                    self.subscribers_dropped += 1
+                    subscriber.put_nowait(None)  # Tells the stream to end, the client will reconnect
+                    logging.warning("Stream subscriber fell behind and was disconnected.")
+                else:
+                    subscriber.put_nowait(encoded)
+        return event_id
+
+    def subscribe(self, last_event_id=None):
+        """
+        Registers a subscriber and returns its queue. Events newer than last_event_id
+        that are still in the replay buffer are queued first. A None in the queue
+        means the subscriber has been dropped.
+        """
+        subscriber = queue.Queue()
+        with self.lock:
+            if last_event_id is not None:
+                for event_id, encoded in self.replay:
+                    if event_id > last_event_id:
+                        subscriber.put_nowait(encoded)
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def stream(self, last_event_id=None, keepalive=15):
+        # Generator of encoded events for a streaming HTTP response, with comment lines as keepalives
+        subscriber = self.subscribe(last_event_id)
+        try:
+            while True:
+                try:
+                    encoded = subscriber.get(timeout=keepalive)
+                except queue.Empty:
+                    yield b': keepalive\n\n'
+                    continue
+                if encoded is None:
+                    return
+                yield encoded
+        finally:
+            self.unsubscribe(subscriber)
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'Subscribers': len(self.subscribers),
+                'Events_Published': self.events_published,
+                'Subscribers_Dropped': self.subscribers_dropped,
+            }
@@ -0,0 +1,189 @@
+import math
+
+# Meters per degree of latitude, good enough for simplifying a track a few hundred km long
+meters_per_degree = 111320.0
+
+def simplify(points, tolerance):
+    """
+    Douglas-Peucker simplification of a list of (x, y) points in meters.
+
+    Args:
+    points (list): Points in order.
+    tolerance (float): Largest distance of a dropped point from the simplified line.
+
+    Returns:
+    list: Indices of the points kept, first and last always included.
+    """
+    if len(points) < 3:
+        return list(range(len(points)))
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        farthest, distance = None, tolerance
+        for index in range(start + 1, end):
+            offset = segment_distance(points[index], points[start], points[end])
+            if offset > distance:
+                farthest, distance = index, offset
+        if farthest is not None:
+            keep[farthest] = True
+            stack.append((start, farthest))
+            stack.append((farthest, end))
+    return [index for index, kept in enumerate(keep) if kept]
+
+def segment_distance(point, start, end):
+    # Distance from point to the segment start-end
+    dx, dy = end[0] - start[0], end[1] - start[1]
+    length_squared = dx * dx + dy * dy
+    if length_squared == 0:
+        return math.hypot(point[0] - start[0], point[1] - start[1])
+    t = max(0.0, min(1.0, ((point[0] - start[0]) * dx + (point[1] - start[1]) * dy) / length_squared))
+    return math.hypot(point[0] - start[0] - t * dx, point[1] - start[1] - t * dy)
+
+class TrackSimplifier:
+    """
+    Simplifies a track as the fixes arrive, keeping the vertex count bounded.
+
+    The track is a committed path of simplified vertices plus a tail: the fixes
+    since the last committed vertex. While every tail fix lies within tolerance of
+    the straight line from the last vertex to the newest fix, the tail is drawn as
+    that one line. When a fix breaks the tolerance, the fix before it is committed
+    as a vertex and the tail starts again from there. Once the committed path
+    holds max_vertices, the tolerance is doubled and the committed path is
+    simplified again with Douglas-Peucker.
+
+    Args:
+    tolerance (float): Starting tolerance, Distance in meters.
+    max_vertices (int): Largest number of committed vertices.
+    max_tail (int): Fixes held in the tail before a vertex is committed anyway, bounds the work per fix.
+    """
+
+    def __init__(self, tolerance=10, max_vertices=2000, max_tail=200):
+        self.tolerance = tolerance
+        self.max_vertices = max_vertices
+        self.max_tail = max_tail
+        self.origin = None  # (latitude, longitude) the local meters are measured from
+        self.vertices = []  # Committed (latitude, longitude) vertices
+        self.vertex_points = []  # The same vertices in local meters
+        self.tail = []  # Fixes since the last vertex, (latitude, longitude, x, y)
+        self.fixes = 0
+
+    def _to_meters(self, latitude, longitude):
+        x = (longitude - self.origin[1]) * meters_per_degree * math.cos(math.radians(self.origin[0]))
+        y = (latitude - self.origin[0]) * meters_per_degree
+        return x, y
+
+    def append(self, latitude, longitude):
+        """
+        Adds a fix. Returns True if the committed vertices changed, False if only
+        the tail did.
+        """
+        self.fixes += 1
+        if self.origin is None:
+            self.origin = (latitude, longitude)
+            self._commit((latitude, longitude, 0.0, 0.0))
+            return True
+
+        x, y = self._to_meters(latitude, longitude)
+        self.tail.append((latitude, longitude, x, y))
+
+        # Does the line from the last vertex to this fix still pass close to every fix in between?
+        start = self.vertex_points[-1]
+        breaks = any(segment_distance(fix[2:], start, (x, y)) > self.tolerance for fix in self.tail[:-1])
+        if not breaks and len(self.tail) < self.max_tail:
+            return False
+
+        # Commit the last fix that was still within tolerance, or this one if the tail is just too long
+        if breaks:
+            vertex = self.tail[-2]
+            self.tail = self.tail[-1:]
+        else:
+            vertex = self.tail[-1]
+            self.tail = []
+        self._commit(vertex)
+        if len(self.vertices) > self.max_vertices:
+            self._resimplify()
+        return True
+
+    def _commit(self, fix):
+        self.vertices.append(fix[:2])
+        self.vertex_points.append(fix[2:])
+
+    def _resimplify(self):
+        # Coarsen the committed path until it fits in half the vertex budget, leaving room to grow
+        while len(self.vertices) > self.max_vertices // 2:
+            self.tolerance *= 2
+            keep = simplify(self.vertex_points, self.tolerance)
+            self.vertices = [self.vertices[index] for index in keep]
+            self.vertex_points = [self.vertex_points[index] for index in keep]
+
+    def tail_positions(self):
+        # The line drawn for the tail, from the last vertex to the newest fix
+        if not self.tail:
+            return []
+        return [self.vertices[-1], self.tail[-1][:2]]
+
+class TrackLayer:
+    """
+    Flight track drawn on a TkinterMapView, simplified as it grows.
+
+    The committed vertices and the tail are separate map paths. A new fix only
+    moves the two-point tail path; the committed path is redrawn only when a
+    vertex is committed or the track is simplified again.
+
+    Args:
+    map_view (TkinterMapView): Map the track is drawn on.
+    color (str): Line color.
+    width (int): Line width in pixels.
+    tolerance (float): Starting tolerance of the simplification, Distance in meters.
+    max_vertices (int): Largest number of vertices drawn.
+    """
+
+    def __init__(self, map_view, color="#3E69CB", width=3, tolerance=10, max_vertices=2000):
+        self.map_view = map_view
+        self.color = color
+        self.width = width
+        self.simplifier = TrackSimplifier(tolerance, max_vertices)
+        self.committed_path = None
+        self.tail_path = None
+        self.drawn_vertices = 0
+
+    def _path(self, positions):
+        return self.map_view.set_path(positions, color=self.color, width=self.width)
+
+    def append(self, latitude, longitude):
+        # Add a fix and redraw what changed
+        if self.simplifier.append(latitude, longitude):
+            self._draw_committed()
+        tail = self.simplifier.tail_positions()
+        if len(tail) < 2:
+            if self.tail_path is not None:
+                self.tail_path.set_position_list([self.simplifier.vertices[-1]] * 2)
+        elif self.tail_path is None:
+            self.tail_path = self._path(tail)
+        else:
+            self.tail_path.set_position_list(tail)
+
+    def _draw_committed(self):
+        vertices = self.simplifier.vertices
+        if len(vertices) < 2:
+            return
+        if self.committed_path is None:
+            self.committed_path = self._path(list(vertices))
+        elif len(vertices) == self.drawn_vertices + 1:
+            # One new vertex on the end
+            self.committed_path.add_position(*vertices[-1])
+            self.committed_path.draw()
+        else:
+            # Simplified again, replace the whole path
+            self.committed_path.set_position_list(list(vertices))
+        self.drawn_vertices = len(vertices)
+
+    def get_stats(self):
+        return {
+            'Fixes': self.simplifier.fixes,
+            'Vertices': len(self.simplifier.vertices),
+            'Tail_Fixes': len(self.simplifier.tail),
+            'Tolerance_m': self.simplifier.tolerance,
+        }
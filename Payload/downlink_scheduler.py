@@ -0,0 +1,128 @@
+import os
+import threading
+import time
+from collections import deque
+
+# Priorities, lower numbers are always sent first
+PRIORITY_ACK = 0
+PRIORITY_HEARTBEAT = 1
+PRIORITY_TELEMETRY = 2
+PRIORITY_BULK = 3
+priority_names = ['ACK', 'Heartbeat', 'Telemetry', 'Bulk']
+
+# Messages held per priority, the oldest message is dropped when a queue is full
+queue_limits = {
+    PRIORITY_ACK: 16,
+    PRIORITY_HEARTBEAT: 1,  # Only the newest heartbeat matters
+    PRIORITY_TELEMETRY: 32,
+    PRIORITY_BULK: 256,
+}
+
+class DownlinkScheduler:
+    """
+    Priority queues and a token bucket for the single thread that writes to the radio.
+
+    Other threads hand MAVLink messages and their packed size to put() and the radio
+    thread takes them from next_message() whenever the byte budget allows. Messages
+    are packed for real only when sent, so the MAVLink sequence numbers stay in order.
+
+    The budget refills at rate_bytes per second up to burst_bytes. ACKs and
+    heartbeats only have to fit in the budget, lower priorities must also leave
+    reserve_bytes behind so a heartbeat or ACK queued right after them is never
+    held up waiting for tokens.
+
+    Args:
+    rate_bytes (float): Downlink budget in bytes per second.
+    burst_bytes (int): Bucket size, the largest burst sent back to back.
+    reserve_bytes (int): Budget kept back for ACKs and heartbeats.
+    """
+
+    def __init__(self, rate_bytes, burst_bytes=512, reserve_bytes=64):
+        self.rate_bytes = rate_bytes
+        self.burst_bytes = burst_bytes
+        self.reserve_bytes = reserve_bytes
+        self.tokens = burst_bytes
+        self.last_refill = time.monotonic()
+        self.queues = {priority: deque() for priority in queue_limits}
+        self.lock = threading.Lock()
+        self.sent = {priority: 0 for priority in queue_limits}
+        self.dropped = {priority: 0 for priority in queue_limits}
+        self.bytes_sent = 0
+
+        # select() on wake_fd returns as soon as a message is queued
+        self.wake_fd, self._wake_write_fd = os.pipe()
+        os.set_blocking(self.wake_fd, False)
+        os.set_blocking(self._wake_write_fd, False)
+
+    def put(self, priority, message, size):
+        # Queue one message of size bytes on the wire, safe to call from any thread
+        with self.lock:
+            queue = self.queues[priority]
+            if len(queue) >= queue_limits[priority]:
+                queue.popleft()
+                self.dropped[priority] += 1
+            queue.append((size, message))
+        try:
+            os.write(self._wake_write_fd, b'\0')
+        except BlockingIOError:
+            pass  # The pipe is full so the radio thread is awake anyway
+
+    def clear_wakeup(self):
+        try:
+            while os.read(self.wake_fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def _refill(self, now):
+        self.tokens = min(self.burst_bytes, self.tokens + (now - self.last_refill) * self.rate_bytes)
+        self.last_refill = now
+
+    def _required(self, priority, size):
+        if priority <= PRIORITY_HEARTBEAT:
+            return size
+        return size + self.reserve_bytes
+
+    def set_rate(self, rate_bytes):
+        # Change the budget refill rate, tokens already earned are kept
+        with self.lock:
+            self._refill(time.monotonic())
+            self.rate_bytes = rate_bytes
+
+    def next_message(self):
+        """
+        Returns the highest priority message the budget allows, or None.
+        The message's size is taken from the budget.
+        """
+        with self.lock:
+            self._refill(time.monotonic())
+            for priority, queue in self.queues.items():
+                if not queue:
+                    continue
+                # Strict priority: a waiting message blocks everything below it
+                if self.tokens < self._required(priority, queue[0][0]):
+                    return None
+                size, message = queue.popleft()
+                self.tokens -= size
+                self.sent[priority] += 1
+                self.bytes_sent += size
+                return message
+        return None
+
+    def time_until_ready(self):
+        # Seconds until the head of the queue can be sent, None when nothing is queued
+        with self.lock:
+            self._refill(time.monotonic())
+            for priority, queue in self.queues.items():
+                if queue:
+                    return max(self._required(priority, queue[0][0]) - self.tokens, 0) / self.rate_bytes
+        return None
+
+    def get_stats(self):
+        with self.lock:
+            stats = {'Bytes_Sent': self.bytes_sent, 'Tokens': round(self.tokens)}
+            for priority, name in enumerate(priority_names):
+                stats[f'{name}_Queued'] = len(self.queues[priority])
+                stats[f'{name}_Sent'] = self.sent[priority]
+                stats[f'{name}_Dropped'] = self.dropped[priority]
+            return stats
@@ -0,0 +1,166 @@
+import csv
+import json
+import os
+import struct
+import sys
+import time
+import datetime
+import numpy as np
+
+# File layout:
+#   magic (4 bytes) | format version (u16) | header length (u32) | JSON schema, padded to 8 bytes
+#   fixed-width records: validity bitmask (u64) followed by one 8-byte value per field
+# Bit i of the bitmask is set when field i holds a real value, so missing readings
+# stay distinguishable from zero without making rows variable width.
+FLIGHT_LOG_MAGIC = b'FLOG'
+FLIGHT_LOG_VERSION = 1
+PREAMBLE = struct.Struct('<4sHI')
+MAX_FIELDS = 64
+
+# Field types: 'f8' float64, 'i8' int64, 'utc' int64 milliseconds since the epoch
+# ('utc' fields are written and exported as ISO 8601 strings such as 2024-04-08T18:30:05.250Z)
+_struct_codes = {'f8': 'd', 'i8': 'q', 'utc': 'q'}
+_numpy_types = {'f8': '<f8', 'i8': '<i8', 'utc': '<i8'}
+
+def _utc_to_ms(value):
+    moment = datetime.datetime.strptime(value, '%Y-%m-%dT%H:%M:%S.%fZ').replace(tzinfo=datetime.timezone.utc)
+    return int(moment.timestamp() * 1000)
+
+def _ms_to_utc(value):
+    moment = datetime.datetime.fromtimestamp(value / 1000, tz=datetime.timezone.utc)
+    return moment.strftime('%Y-%m-%dT%H:%M:%S.') + f"{moment.microsecond // 1000:03d}Z"
+
+class FlightLogWriter:
+    """
+    Appends fixed-width binary records to a flight log.
+
+    Args:
+    filename (str): Path of the log file to create.
+    fields (list): Field names, in record order.
+    types (dict): Field name to 'f8', 'i8' or 'utc'. Fields not listed are 'f8'.
+    labels (list): Optional human readable column names used when exporting to CSV.
+    """
+
+    def __init__(self, filename, fields, types=None, labels=None):
+        if len(fields) > MAX_FIELDS:
+            raise ValueError(f"A flight log supports at most {MAX_FIELDS} fields")
+        types = types or {}
+        self.fields = list(fields)
+        self.types = [types.get(field, 'f8') for field in self.fields]
+        self.record = struct.Struct('<Q' + ''.join(_struct_codes[field_type] for field_type in self.types))
+
+        schema = {
+            'fields': [{'name': field, 'type': field_type, 'label': label}
+                       for field, field_type, label in zip(self.fields, self.types, labels or self.fields)],
+            'record_size': self.record.size,
+            'created': time.time(),
+        }
+        header = json.dumps(schema).encode()
+        header += b' ' * (-(PREAMBLE.size + len(header)) % 8)
+
+        self.file = open(filename, 'wb')
+        self.file.write(PREAMBLE.pack(FLIGHT_LOG_MAGIC, FLIGHT_LOG_VERSION, len(header)) + header)
+        self.file.flush()
+
+    def pack(self, data):
+        # Pack one row, anything missing or unconvertible is stored as 0 with its valid bit cleared
+        mask = 0
+        values = []
+        for index, (field, field_type) in enumerate(zip(self.fields, self.types)):
+            value = data.get(field, "")
+            try:
+                if field_type == 'f8':
+                    value = float(value)
+                elif field_type == 'utc':
+                    value = _utc_to_ms(value)
+                else:
+                    value = int(value)
+                mask |= 1 << index
+            except (TypeError, ValueError):
+                value = 0
+            values.append(value)
+        return self.record.pack(mask, *values)
+
+    def write(self, data):
+        self.file.write(self.pack(data))
+        self.file.flush()
+
+    def write_rows(self, rows):
+        # Batch entry point used when the log sits behind a data_writer.BufferedWriter
+        self.file.write(b''.join(self.pack(row) for row in rows))
+
+    def flush(self):
+        self.file.flush()
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+def read_header(filename):
+    # Returns (schema, offset of the first record)
+    with open(filename, 'rb') as log_file:
+        magic, version, header_length = PREAMBLE.unpack(log_file.read(PREAMBLE.size))
+        if magic != FLIGHT_LOG_MAGIC:
+            raise ValueError(f"{filename} is not a flight log")
+        if version != FLIGHT_LOG_VERSION:
+            raise ValueError(f"Unsupported flight log version {version}")
+        schema = json.loads(log_file.read(header_length))
+    return schema, PREAMBLE.size + header_length
+
+def record_dtype(schema):
+    return np.dtype([('valid', '<u8')] + [(field['name'], _numpy_types[field['type']]) for field in schema['fields']])
+
+def read_flight_log(filename):
+    """
+    Memory-maps a flight log and returns (schema, records) without parsing it.
+    records is a NumPy structured array with a 'valid' bitmask column plus one
+    column per field. A partially written last record is ignored.
+    """
+    schema, offset = read_header(filename)
+    dtype = record_dtype(schema)
+    with open(filename, 'rb') as log_file:
+        log_file.seek(0, 2)
+        count = (log_file.tell() - offset) // dtype.itemsize
+    if count <= 0:
+        return schema, np.zeros(0, dtype=dtype)
+    return schema, np.memmap(filename, dtype=dtype, mode='r', offset=offset, shape=(count,))
+
+def field_valid(schema, records, field):
+    # Boolean array, True where the given field holds a real value
+    index = [entry['name'] for entry in schema['fields']].index(field)
+    return (records['valid'] >> np.uint64(index)) & np.uint64(1) == 1
+
+def convert_to_csv(filename, csv_filename):
+    # Export a flight log to CSV with the same columns the text log used, missing values left empty
+    schema, records = read_flight_log(filename)
+    fields = schema['fields']
+    with open(csv_filename, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow([field['label'] for field in fields])
+        for record in records:
+            mask = int(record['valid'])
+            row = []
+            for index, field in enumerate(fields):
+                if not mask & (1 << index):
+                    row.append("")
+                elif field['type'] == 'utc':
+                    row.append(_ms_to_utc(int(record[field['name']])))
+                elif field['type'] == 'i8':
+                    row.append(int(record[field['name']]))
+                else:
+                    row.append(float(record[field['name']]))
+            writer.writerow(row)
+    return len(records)
+
+if __name__ == "__main__":
+    # Convert a flight log to CSV, e.g. python flight_log.py sensor_data_1.bin
+    log_filename = sys.argv[1]
+    output_filename = sys.argv[2] if len(sys.argv) > 2 else log_filename.rsplit('.', 1)[0] + '.csv'
+    rows = convert_to_csv(log_filename, output_filename)
+    print(f"Wrote {rows} rows to {output_filename}")
@@ -1,39 +1,194 @@
 import serial
-from ublox_gps import UbloxGps
+import struct
+import threading
+import logging
+import time
+
+# Serial connection to the receiver
+serial_device = '/dev/ttyACM1'
+initial_baud_rate = 9600  # Baud rate the receiver starts up at
+gps_baud_rate = 115200  # Baud rate the receiver's UART is switched to during configuration
+nav_rate_hz = 5  # Navigation solution rate, NAV-PVT is output once per solution
+fix_timeout = 3  # A fix older than this is treated as lost, Time in seconds
 
 # Initialize serial connection
-serial_port = serial.Serial('/dev/ttyACM1', baudrate=9600, timeout=1)
-gps = UbloxGps(serial_port)
+serial_port = serial.Serial(serial_device, baudrate=initial_baud_rate, timeout=1)
+
+# Extra fix fields published alongside the position, in CSV column order
+gps_status_fields = ['Fix_Type', 'Satellites', 'GPS_Time']
+
+# UBX protocol constants
+UBX_SYNC = b'\xb5\x62'
+UBX_CLASS_NAV = 0x01
+UBX_CLASS_ACK = 0x05
+UBX_CLASS_CFG = 0x06
+UBX_NAV_PVT = 0x07
+UBX_ACK_NAK = 0x00
+UBX_CFG_PRT = 0x00
+UBX_CFG_MSG = 0x01
+UBX_CFG_RATE = 0x08
+UBX_MAX_PAYLOAD = 1024  # Anything longer is treated as a corrupt length field
+
+# NAV-PVT payload layout (92 bytes), see the u-blox interface description
+NAV_PVT_FORMAT = struct.Struct('<IHBBBBBBIiBBBBiiiiIIiiiiiIIHB5xihH')
+
+# Latest decoded fix, shared between the reader thread and callers
+_latest_fix = None
+_fix_lock = threading.Lock()
+_reader_thread = None
+_start_lock = threading.Lock()
+
+def _checksum(data):
+    # 8-bit Fletcher checksum over class, id, length and payload
+    ck_a = 0
+    ck_b = 0
+    for byte in data:
+        ck_a = (ck_a + byte) & 0xFF
+        ck_b = (ck_b + ck_a) & 0xFF
+    return bytes([ck_a, ck_b])
+
+def build_ubx_message(msg_class, msg_id, payload=b''):
+    body = struct.pack('<BBH', msg_class, msg_id, len(payload)) + payload
+    return UBX_SYNC + body + _checksum(body)
+
+class UbxParser:
+    """
+    Incremental UBX frame parser. Bytes can be fed in any chunk size and
+    complete, checksum-verified messages are returned as (class, id, payload).
+    NMEA sentences and line noise between frames are skipped.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.checksum_errors = 0
+
+    def feed(self, data):
+        self.buffer.extend(data)
+        messages = []
+        while True:
+            start = self.buffer.find(UBX_SYNC)
+            if start < 0:
+                # Keep a trailing sync byte in case the pair is split across reads
+                del self.buffer[:-1]
+                return messages
+            del self.buffer[:start]
+            if len(self.buffer) < 6:
+                return messages
+            msg_class, msg_id, length = struct.unpack_from('<BBH', self.buffer, 2)
+            if length > UBX_MAX_PAYLOAD:
+                del self.buffer[:2]
+                continue
+            frame_length = 6 + length + 2
+            if len(self.buffer) < frame_length:
+                return messages
+            if bytes(self.buffer[frame_length - 2:frame_length]) != _checksum(self.buffer[2:frame_length - 2]):
+                self.checksum_errors += 1
+                del self.buffer[:2]
+                continue
+            messages.append((msg_class, msg_id, bytes(self.buffer[6:6 + length])))
+            del self.buffer[:frame_length]
+
+def decode_nav_pvt(payload):
+    # Decode a NAV-PVT payload into the fix dictionary published by get_data()
+    (itow, year, month, day, hour, minute, sec, valid, t_acc, nano, fix_type, flags, flags2, num_sv,
+     lon, lat, height, h_msl, h_acc, v_acc, vel_n, vel_e, vel_d, g_speed, head_mot,
+     s_acc, head_acc, p_dop, flags3, head_veh, mag_dec, mag_acc) = NAV_PVT_FORMAT.unpack(payload)
+
+    gnss_fix_ok = bool(flags & 0x01)
+    gps_time = ""
+    if valid & 0x03 == 0x03:  # validDate and validTime
+        gps_time = f"{year:04d}-{month:02d}-{day:02d}T{hour:02d}:{minute:02d}:{sec:02d}.{max(nano, 0) // 1000000:03d}Z"
+
+    return {
+        'Latitude': lat * 1e-7 if gnss_fix_ok else "",
+        'Longitude': lon * 1e-7 if gnss_fix_ok else "",
+        'Altitude': height / 1000 if gnss_fix_ok else "",
+        'Speed': g_speed / 1000 if gnss_fix_ok else "",
+        'Heading': head_mot * 1e-5 if gnss_fix_ok else "",
+        'Fix_Type': fix_type,
+        'Satellites': num_sv,
+        'GPS_Time': gps_time,
+        'iTOW': itow,
+        'Received': time.monotonic(),
+    }
+
+def configure_receiver():
+    """
+    Switches the receiver to UBX-only output with periodic NAV-PVT at nav_rate_hz
+    and moves its UART to gps_baud_rate. Over USB (/dev/ttyACM*) the baud change
+    only affects the unused UART and the host side keeps working as is.
+    """
+    # UART1: 8N1 at gps_baud_rate, UBX in and out
+    serial_port.write(build_ubx_message(UBX_CLASS_CFG, UBX_CFG_PRT, struct.pack('<BBHIIHHHH', 1, 0, 0, 0x000008D0, gps_baud_rate, 0x0001, 0x0001, 0, 0)))
+    serial_port.flush()
+    time.sleep(0.1)
+    if not serial_device.startswith('/dev/ttyACM'):
+        serial_port.baudrate = gps_baud_rate
+
+    # USB: UBX in and out, NMEA off so the link only carries what we parse
+    serial_port.write(build_ubx_message(UBX_CLASS_CFG, UBX_CFG_PRT, struct.pack('<BBHIIHHHH', 3, 0, 0, 0, 0, 0x0001, 0x0001, 0, 0)))
+
+    # Measurement period in ms, one navigation solution per measurement, aligned to GPS time
+    serial_port.write(build_ubx_message(UBX_CLASS_CFG, UBX_CFG_RATE, struct.pack('<HHH', int(1000 / nav_rate_hz), 1, 1)))
+
+    # Output NAV-PVT once per solution on UART1 and USB
+    serial_port.write(build_ubx_message(UBX_CLASS_CFG, UBX_CFG_MSG, struct.pack('<BB6B', UBX_CLASS_NAV, UBX_NAV_PVT, 0, 1, 0, 1, 0, 0)))
+    serial_port.flush()
+    logging.info(f"GPS configured for NAV-PVT at {nav_rate_hz} Hz")
+
+def _reader_loop():
+    global _latest_fix
+    parser = UbxParser()
+    while True:
+        try:
+            # Block for at least one byte, then take everything already buffered
+            chunk = serial_port.read(serial_port.in_waiting or 1)
+            if not chunk:
+                continue
+            for msg_class, msg_id, payload in parser.feed(chunk):
+                if msg_class == UBX_CLASS_NAV and msg_id == UBX_NAV_PVT and len(payload) == NAV_PVT_FORMAT.size:
+                    fix = decode_nav_pvt(payload)
+                    with _fix_lock:
+                        _latest_fix = fix
+                elif msg_class == UBX_CLASS_ACK and msg_id == UBX_ACK_NAK:
+                    logging.warning(f"GPS rejected configuration message {payload.hex()}")
+        except (ValueError, IOError) as err:
+            logging.error(f"Error reading GPS stream: {err}")
+            time.sleep(1)
+
+def start_reader():
+    # Configure the receiver and start the background reader, safe to call more than once
+    global _reader_thread
+    with _start_lock:
+        if _reader_thread is not None:
+            return
+        try:
+            configure_receiver()
+        except (ValueError, IOError) as err:
+            logging.error(f"Error configuring GPS: {err}")
+        _reader_thread = threading.Thread(target=_reader_loop, name="gps-reader", daemon=True)
+        _reader_thread.start()
 
 def get_data():
-    try:
-        raw_data = gps.geo_coords()
-        latitude = float(raw_data.lat)
-        longitude = float(raw_data.lon)
-        altitude = float(raw_data.height)/1000
-        speed = float(raw_data.gSpeed)/1000
-        heading = raw_data.headMot
-
-        data = {
-            'Latitude': latitude,
-            'Longitude': longitude,
-            'Altitude': altitude,
-            'Speed': speed,
-            'Heading': heading
-        }
-        return data
-    except (ValueError, IOError) as err:
-        print(err)
-        return None, None, None
+    # Return the latest fix without touching the serial port, or None if there is no recent fix
+    start_reader()
+    with _fix_lock:
+        fix = _latest_fix
+    if fix is None or time.monotonic() - fix['Received'] > fix_timeout:
+        return None
+    return {field: fix[field] for field in ['Latitude', 'Longitude', 'Altitude', 'Speed', 'Heading'] + gps_status_fields}
 
 def get_time():
-    try:
-        gps_time = gps.date_time()
-        time = ("UTC Time {}:{}:{}".format(gps_time.hour, gps_time.min, gps_time.sec))
-        return time
-    except (ValueError, IOError) as err:
-        print(err)
+    data = get_data()
+    if data is None or not data['GPS_Time']:
         return None
+    clock = data['GPS_Time'][11:19].split(':')
+    utc_time = ("UTC Time {}:{}:{}".format(int(clock[0]), int(clock[1]), int(clock[2])))
+    return utc_time
+
+def get_sensor_data():
+    # Return the GPS fix keyed by log field name, or None if there is no recent fix
+    return get_data()
 
 def main():
     try:
@@ -41,12 +196,16 @@ def main():
         while True:
             data = get_data()
             #time_data = get_time()
+            if data is None:
+                time.sleep(1)
+                continue
 
             print(f"Latitude: {data.get('Latitude')}, Longitude: {data.get('Longitude')}, Altitude: {data.get('Altitude')}, Speed: {data.get('Speed')}, Heading: {data.get('Heading')}")
             #print(f"Time: {time_data}")
+            time.sleep(1 / nav_rate_hz)
 
     finally:
         serial_port.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,143 @@
+import threading
+import logging
+import time
+import numpy as np
+
+import sense_hat_module as sh
+
+# Axes captured for each IMU sample, in ring buffer column order (after the time column)
+imu_axes = ['Accelerometer_X', 'Accelerometer_Y', 'Accelerometer_Z', 'Gyroscope_X', 'Gyroscope_Y', 'Gyroscope_Z']
+
+# Per-frame aggregate fields added to each logged row
+# The plain axis fields (e.g. Accelerometer_X) carry the window mean
+imu_aggregate_fields = [f"{axis}_{stat}" for axis in imu_axes for stat in ('Min', 'Max', 'RMS')] + ['IMU_Samples']
+
+class ImuCapture:
+    """
+    Samples the accelerometer and gyroscope at a high rate on a dedicated thread.
+
+    Samples go into a preallocated ring buffer of shape (capacity, 7) holding
+    [time, accel x/y/z, gyro x/y/z]. The logging loop calls frame_aggregates()
+    once per row to get min/max/mean/RMS over every sample taken since the
+    previous row, so its cost doesn't depend on the IMU rate. The raw stream
+    is written to its own CSV in blocks from the capture thread.
+    """
+
+    def __init__(self, rate_hz=100, buffer_seconds=10, raw_filename=None, raw_block_size=None):
+        self.rate_hz = rate_hz
+        self.capacity = int(rate_hz * buffer_seconds)
+        self.buffer = np.full((self.capacity, len(imu_axes) + 1), np.nan)
+        self.count = 0  # Total samples captured since start
+        self.frame_start = 0  # Sample count at the start of the current frame
+        self.raw_written = 0  # Sample count already written to the raw log
+        self.raw_block_size = raw_block_size or max(1, int(rate_hz))  # Write the raw log about once a second
+        self.dropped = 0  # Samples overwritten before they reached a frame
+        self.scratch = np.empty(len(imu_axes) + 1)  # Sample being read, copied into the ring once complete
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+        self.raw_file = None
+        if raw_filename is not None:
+            self.raw_file = open(raw_filename, 'a', newline='')
+            self.raw_file.write(','.join(['Time'] + imu_axes) + '\n')
+
+    def start(self):
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._capture_loop, name="imu-capture", daemon=True)
+        self.thread.start()
+        logging.info(f"IMU capture started at {self.rate_hz} Hz")
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.raw_file is not None:
+            self._write_raw(final=True)
+            self.raw_file.close()
+            self.raw_file = None
+
+    def _read_sample(self, row):
+        # Fill one ring buffer row in place, unreadable axes are left as NaN
+        snapshot = sh.read_all(max_age=0, chips=['imu'])
+        acceleration = snapshot['accelerometer']['value']
+        gyro = snapshot['gyroscope']['value']
+        row[0] = snapshot['accelerometer']['timestamp']
+        for column, value in enumerate((acceleration['x'], acceleration['y'], acceleration['z'], gyro['x'], gyro['y'], gyro['z']), start=1):
+            row[column] = value if value != "" else np.nan
+
+    def _capture_loop(self):
+        interval = 1.0 / self.rate_hz
+        next_sample = time.monotonic()
+        while not self.stop_event.is_set():
+            try:
+                # Read outside the lock so frame_aggregates() never waits on the bus
+                self._read_sample(self.scratch)
+                with self.lock:
+                    self.buffer[self.count % self.capacity] = self.scratch
+                    self.count += 1
+                    # Keep the frame window inside the ring so aggregates never read overwritten rows
+                    if self.count - self.frame_start > self.capacity:
+                        self.frame_start += 1
+                        self.dropped += 1
+                if self.raw_file is not None and self.count - self.raw_written >= self.raw_block_size:
+                    self._write_raw()
+            except Exception as e:
+                logging.error(f"Error capturing IMU sample: {e}")
+
+            next_sample += interval
+            delay = next_sample - time.monotonic()
+            if delay < 0:
+                next_sample = time.monotonic()
+                delay = 0
+            self.stop_event.wait(delay)
+
+    def _window(self, start, end):
+        # Copy rows [start, end) of the sample stream out of the ring buffer
+        start = max(start, end - self.capacity)
+        indices = np.arange(start, end) % self.capacity
+        return self.buffer[indices]
+
+    def _write_raw(self, final=False):
+        with self.lock:
+            end = self.count
+            block = self._window(self.raw_written, end)
+            self.raw_written = end
+        if len(block):
+            np.savetxt(self.raw_file, block, delimiter=',', fmt='%.6f')
+            if final:
+                self.raw_file.flush()
+
+    def frame_aggregates(self):
+        """
+        Returns min/max/mean/RMS of every axis over the samples captured since the
+        last call, keyed by log field name. Axes with no samples are returned as "".
+        """
+        with self.lock:
+            window = self._window(self.frame_start, self.count)[:, 1:]
+            self.frame_start = self.count
+
+        aggregates = {'IMU_Samples': len(window)}
+        valid = ~np.isnan(window)
+        counts = valid.sum(axis=0)
+
+        # Vectorized reductions over all six axes at once, ignoring NaN samples
+        filled = np.where(valid, window, 0.0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            minimum = np.where(valid, window, np.inf).min(axis=0, initial=np.inf)
+            maximum = np.where(valid, window, -np.inf).max(axis=0, initial=-np.inf)
+            mean = filled.sum(axis=0) / counts
+            rms = np.sqrt((filled ** 2).sum(axis=0) / counts)
+
+        for column, axis in enumerate(imu_axes):
+            if counts[column] == 0:
+                aggregates[axis] = ""
+                for stat in ('Min', 'Max', 'RMS'):
+                    aggregates[f"{axis}_{stat}"] = ""
+                continue
+            aggregates[axis] = round(float(mean[column]), 3)
+            aggregates[f"{axis}_Min"] = round(float(minimum[column]), 3)
+            aggregates[f"{axis}_Max"] = round(float(maximum[column]), 3)
+            aggregates[f"{axis}_RMS"] = round(float(rms[column]), 3)
+        return aggregates
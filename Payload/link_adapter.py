@@ -0,0 +1,109 @@
+import logging
+import time
+
+# SiK firmware (RFD900x) reports signal levels in raw units, dBm = raw / 1.9 - 127
+SIK_RSSI_SCALE = 1.9
+SIK_RSSI_OFFSET = 127
+
+# Adaptation thresholds
+txbuf_low = 40  # Free TX buffer (%) below which the rate is cut
+txbuf_high = 80  # Free TX buffer (%) above which the rate may grow
+min_margin_db = 10  # Signal over noise (dB) needed to grow the rate, below half of it the rate is cut
+increase_step = 0.05  # Fraction of max_rate added per good report
+decrease_factor = 0.5  # Rate multiplier per congested report
+status_timeout = 10  # Without reports for this long the link is treated as unknown, Time in seconds
+
+def sik_to_dbm(value):
+    return round(value / SIK_RSSI_SCALE - SIK_RSSI_OFFSET, 1)
+
+class LinkAdapter:
+    """
+    Chooses the downlink rate and telemetry batch size from the radio's RADIO_STATUS reports.
+
+    Additive increase, multiplicative decrease: while the radio's TX buffer has plenty
+    of room and the worse end of the link has enough margin over the noise floor, the
+    rate creeps up and batches shrink so samples go out sooner. As soon as the buffer
+    starts filling or the margin drops, the rate is halved and batches grow so fewer,
+    fuller frames are sent. If the reports stop, the rate and batch size step back
+    toward their starting values, one step per status_timeout.
+
+    Args:
+    rate (float): Starting downlink rate, bytes per second.
+    batch_size (int): Starting telemetry batch size.
+    min_rate (float): Lowest downlink rate, bytes per second.
+    max_rate (float): Highest downlink rate, bytes per second.
+    min_batch (int): Smallest telemetry batch, used on a good link.
+    max_batch (int): Largest telemetry batch, used on a congested link.
+    """
+
+    def __init__(self, rate, batch_size, min_rate, max_rate, min_batch=1, max_batch=10):
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.min_batch = min_batch
+        self.max_batch = max_batch
+        self.rate = rate
+        self.batch_size = batch_size
+        self.default_rate = rate
+        self.default_batch = batch_size
+        self.last_status = None
+        self.last_update = None
+        self.last_stale_step = time.monotonic()
+
+    def update(self, rssi, remrssi, noise, remnoise, txbuf):
+        """
+        Feeds one RADIO_STATUS report and returns the new (rate, batch size).
+        Signal levels are in raw SiK units, txbuf is the free TX buffer in percent.
+        """
+        margin_db = min(rssi - noise, remrssi - remnoise) / SIK_RSSI_SCALE
+        self.last_status = {
+            'RSSI': sik_to_dbm(rssi),
+            'Remote_RSSI': sik_to_dbm(remrssi),
+            'Noise': sik_to_dbm(noise),
+            'Remote_Noise': sik_to_dbm(remnoise),
+            'TX_Buffer_Free': txbuf,
+            'Margin_dB': round(margin_db, 1),
+        }
+        self.last_update = time.monotonic()
+
+        if txbuf < txbuf_low or margin_db < min_margin_db / 2:
+            self.rate = max(self.min_rate, self.rate * decrease_factor)
+            self.batch_size = min(self.max_batch, self.batch_size + 1)
+            logging.info(f"Radio link congested (TX buffer {txbuf}% free, margin {margin_db:.1f} dB), "
+                         f"downlink {self.rate:.0f} B/s in batches of {self.batch_size}")
+        elif txbuf > txbuf_high and margin_db >= min_margin_db:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * increase_step)
+            self.batch_size = max(self.min_batch, self.batch_size - 1)
+        return self.rate, self.batch_size
+
+    def is_stale(self):
+        return self.last_update is None or time.monotonic() - self.last_update > status_timeout
+
+    def step_if_stale(self):
+        """
+        Moves the rate and batch size one step back toward their starting values
+        while the reports are stale, at most once per status_timeout.
+        Returns the new (rate, batch size), or None if nothing changed.
+        """
+        now = time.monotonic()
+        if not self.is_stale() or now - self.last_stale_step < status_timeout:
+            return None
+        self.last_stale_step = now
+        if (self.rate, self.batch_size) == (self.default_rate, self.default_batch):
+            return None
+        if self.rate < self.default_rate:
+            self.rate = min(self.default_rate, self.rate + self.max_rate * increase_step)
+        else:
+            self.rate = max(self.default_rate, self.rate * decrease_factor)
+        if self.batch_size < self.default_batch:
+            self.batch_size += 1
+        elif self.batch_size > self.default_batch:
+            self.batch_size -= 1
+        logging.info(f"No radio status for {status_timeout} s, downlink {self.rate:.0f} B/s in batches of {self.batch_size}")
+        return self.rate, self.batch_size
+
+    def get_status(self):
+        status = dict(self.last_status or {})
+        status['Rate'] = round(self.rate)
+        status['Batch_Size'] = self.batch_size
+        status['Stale'] = self.is_stale()
+        return status
@@ -13,10 +13,58 @@ import data_writer as dw
 import thermocouple_module as tc
 import rfd900x_payload as rfd900x
 import gps_module as gps
+import sensor_scheduler
+import imu_capture
+import flight_log
 
 # Initialize logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Sampling rates for each sensor worker, Rate in Hz
+sense_hat_rate = 10
+thermocouple_rate = 2
+gps_rate = 5  # Copies the GPS reader's latest fix, the receiver itself streams at gps.nav_rate_hz
+
+# High-rate IMU capture, Rate in Hz (set to None to sample the IMU with the other Sense HAT channels)
+imu_capture_rate = 100
+
+# Time between logged rows, Time in seconds
+log_interval = 1
+
+# Fields logged for each row, in CSV column order
+sensor_fields = [
+    'Timestamp',
+    'Accelerometer_X',
+    'Accelerometer_Y',
+    'Accelerometer_Z',
+    'Gyroscope_X',
+    'Gyroscope_Y',
+    'Gyroscope_Z',
+    'Humidity',
+    'Pressure',
+    'Temperature_Humidity',
+    'Temperature_Pressure',
+    'Temperature_Thermocouple',
+    'Latitude',
+    'Longitude',
+    'Altitude',
+    'Speed',
+    'Heading',
+]
+
+# When the flight log is fsynced: 'rows', 'interval' or 'shutdown' (see data_writer.BufferedWriter)
+log_sync_policy = 'interval'
+log_sync_interval_ms = 1000
+
+# Storage type of each logged field in the binary flight log, anything not listed is float64
+log_field_types = {
+    'Timestamp': 'i8',
+    'Fix_Type': 'i8',
+    'Satellites': 'i8',
+    'GPS_Time': 'utc',
+    'IMU_Samples': 'i8',
+}
+
 def main():
     # Initialize GPIO
     GPIO.setmode(GPIO.BCM)
@@ -30,10 +78,16 @@ def main():
     cutdown_duration = 60 # Cutdown duration, Time in seconds, 1 minute
     cutdown_time = 0
 
-    # Write Header to CSV
-    sensor_filename = dw.get_next_filename('sensor_data_{}.csv')
-    header = ['Timestamp', 'Accelerometer X (m/s^2)', 'Accelerometer Y (m/s^2)', 'Accelerometer Z (m/s^2)', 'Gyroscope X (rad/s)', 'Gyroscope Y (rad/s)', 'Gyroscope Z (rad/s)', 'Humidity (%)', 'Pressure (mbar)', 'Temperature from Humidity (C)', 'Temperature from Pressure (C)', 'Thermocouple Temperature (C)', 'Latitude', 'Longitude', 'Altitude (m)', 'Speed (m/s)', 'Heading']
-    dw.write_data_to_csv(dict(zip(header, header)), sensor_filename)
+    # Create the binary flight log, convert it with flight_log.py after recovery
+    sensor_filename = dw.get_next_filename('sensor_data_{}.bin')
+    header = ['Timestamp', 'Accelerometer X (m/s^2)', 'Accelerometer Y (m/s^2)', 'Accelerometer Z (m/s^2)', 'Gyroscope X (rad/s)', 'Gyroscope Y (rad/s)', 'Gyroscope Z (rad/s)', 'Humidity (%)', 'Pressure (mbar)', 'Temperature from Humidity (C)', 'Temperature from Pressure (C)', 'Thermocouple Temperature (C)', 'Latitude', 'Longitude', 'Altitude (m)', 'Speed (m/s)', 'Heading', 'GPS Fix Type', 'GPS Satellites', 'GPS Time (UTC)']
+    log_fields = sensor_fields + gps.gps_status_fields
+    if imu_capture_rate:
+        header = header + imu_capture.imu_aggregate_fields
+        log_fields = log_fields + imu_capture.imu_aggregate_fields
+    # Rows are queued and written in batches by a background thread
+    sensor_log = dw.BufferedWriter(flight_log.FlightLogWriter(sensor_filename, log_fields, types=log_field_types, labels=header),
+                                   sync_policy=log_sync_policy, sync_interval_ms=log_sync_interval_ms)
 
     # Initialize cutdown status
     cutdown_status = False
@@ -50,30 +104,25 @@ def main():
     comm_thread = threading.Thread(target=rfd900x.communication_loop)
     comm_thread.start()
 
-    # Initialize sensor_data dictionary
-    sensor_data = {
-        'Timestamp': '',
-        'Accelerometer_X': '',
-        'Accelerometer_Y': '',
-        'Accelerometer_Z': '',
-        'Gyroscope_X': '',
-        'Gyroscope_Y': '',
-        'Gyroscope_Z': '',
-        'Humidity': '',
-        'Pressure': '',
-        'Temperature_Humidity': '',
-        'Temperature_Pressure': '',
-        'Temperature_Thermocouple': '',
-        'Latitude': '',
-        'Longitude': '',
-        'Altitude': '',
-        'Speed': '',
-        'Heading': '',
-    }
+    # Start sampling each sensor on its own worker
+    scheduler = sensor_scheduler.SensorScheduler()
+    imu = None
+    if imu_capture_rate:
+        # The IMU gets its own high-rate thread, the Sense HAT worker only reads humidity and pressure
+        imu = imu_capture.ImuCapture(rate_hz=imu_capture_rate, raw_filename=dw.get_next_filename('imu_raw_{}.csv'))
+        imu.start()
+        scheduler.add_sensor('sense_hat', sh.get_environmental_data, sense_hat_rate)
+    else:
+        scheduler.add_sensor('sense_hat', sh.get_sensor_data, sense_hat_rate)
+    scheduler.add_sensor('thermocouple', tc.get_sensor_data, thermocouple_rate)
+    scheduler.add_sensor('gps', gps.get_sensor_data, gps_rate)
+    scheduler.start()
 
     # Print a message to the console
     logging.info("System Initialized...")
 
+    next_log_time = time.monotonic()
+
     try:
         while True:
             # Check cutdown status
@@ -92,43 +141,32 @@ def main():
                 GPIO.output(6, GPIO.LOW)
                 logging.warning("Cutdown deactivated!")
 
-            # Gather sensor data
-            gps_data = gps.get_data()
-
-            sensor_data = {
-                'Timestamp': int(time.time() * 1000) % (2**32),
-                'Accelerometer_X': sh.get_accelerometer_data().get('x', '') if sh.get_accelerometer_data() != "" else "",
-                'Accelerometer_Y': sh.get_accelerometer_data().get('y', '') if sh.get_accelerometer_data() != "" else "",
-                'Accelerometer_Z': sh.get_accelerometer_data().get('z', '') if sh.get_accelerometer_data() != "" else "",
-                'Gyroscope_X': sh.get_gyroscope_data().get('x', '') if sh.get_gyroscope_data() != "" else "",
-                'Gyroscope_Y': sh.get_gyroscope_data().get('y', '') if sh.get_gyroscope_data() != "" else "",
-                'Gyroscope_Z': sh.get_gyroscope_data().get('z', '') if sh.get_gyroscope_data() != "" else "",
-                'Humidity': sh.get_humidity() if sh.get_humidity() != "" else "",
-                'Pressure': sh.get_pressure() if sh.get_pressure() != "" else "",
-                'Temperature_Humidity': sh.get_temperature_from_humidity() if sh.get_temperature_from_humidity() != "" else "",
-                'Temperature_Pressure': sh.get_temperature_from_pressure() if sh.get_temperature_from_pressure() != "" else "",
-                'Temperature_Thermocouple': tc.get_thermocouple_data() if tc.get_thermocouple_data() != "" else "",
-                'Latitude': gps_data.get('Latitude', '') if gps_data != "" else "",
-                'Longitude': gps_data.get('Longitude', '') if gps_data != "" else "",
-                'Altitude': gps_data.get('Altitude', '') if gps_data != "" else "",
-                'Speed': gps_data.get('Speed', '') if gps_data != "" else "",
-                'Heading': gps_data.get('Heading', '') if gps_data != "" else ""
-            }
-
-            # Write data to CSV
-            dw.write_data_to_csv(sensor_data, sensor_filename)
+            # Snapshot the latest value from every sensor worker
+            latest = scheduler.snapshot()
+            sensor_data = {field: latest.get(field, '') for field in log_fields}
+            sensor_data['Timestamp'] = int(time.time() * 1000) % (2**32)
+            if imu is not None:
+                # Window aggregates since the last row, the axis fields carry the window mean
+                aggregates = imu.frame_aggregates()
+                for field in imu_capture.imu_axes + imu_capture.imu_aggregate_fields:
+                    sensor_data[field] = aggregates[field]
+
+            # Write data to the flight log
+            sensor_log.write(sensor_data)
 
             # Debugging
             logging.debug(f"{sensor_data} \n\n")
+            logging.debug(f"Log writer: {sensor_log.get_stats()}")
 
             # Send data to Ground Station
             try:
-                rfd900x.send_data(sensor_data)
+                rfd900x.send_data({field: sensor_data[field] for field in sensor_fields})
             except Exception as e:
                 logging.error(f"Error sending data: {e}")
 
-            # Sleep for a while if needed to limit the frequency of readings
-            time.sleep(3)
+            # Sleep until the next row is due, the sensors keep sampling in the background
+            next_log_time += log_interval
+            time.sleep(max(0, next_log_time - time.monotonic()))
 
     except KeyboardInterrupt:
         logging.info("Program terminated by user.")
@@ -139,6 +177,10 @@ def main():
     finally:
         # Stop the video recording
         #camera.stop_recording()
+        scheduler.stop()
+        if imu is not None:
+            imu.stop()
+        sensor_log.close()
         video_thread.join()
         GPIO.cleanup()
         logging.info("Program exited.")
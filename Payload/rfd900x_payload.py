@@ -2,17 +2,57 @@ import time
 import random
 import logging
 import threading
+import os
+import select
+from collections import OrderedDict
+# Use MAVLink 2 so the unused tail of each ENCAPSULATED_DATA message isn't sent
+os.environ.setdefault('MAVLINK20', '1')
 from pymavlink import mavutil
+import telemetry_frame
+import downlink_scheduler
+from downlink_scheduler import DownlinkScheduler
+from link_adapter import LinkAdapter
 
 # Configure the serial connection
 serial_port = '/dev/ttyUSB0'  # Replace with the appropriate USB port
 baud_rate = 57600  # Set the baud rate according to your RFD900x configuration
 
-# Create a MAVLink connection
+# Create a MAVLink connection, only the radio thread (communication_loop) reads or writes it
 mav = mavutil.mavlink_connection(serial_port, baud=baud_rate)
 
+# Downlink budget, leaves room for the uplink and for radio framing overhead
+air_rate = 64000  # RFD900x AIR_SPEED setting, bits per second
+downlink_share = 0.5  # Fraction of the air rate the payload may use
+max_downlink_rate = min(air_rate, baud_rate) * downlink_share / 8  # Bytes per second
+downlink = DownlinkScheduler(max_downlink_rate)
+mavlink_overhead = 12  # MAVLink 2 header and CRC around every message, Size in bytes
+
 heartbeat_interval = 1  # Interval in seconds for sending heartbeat messages
+stats_interval = 60  # Interval in seconds for logging the downlink queues and radio status
 cutdown_status = False  # Status of the cutdown mechanism
+frame_sequence = 0  # Sequence number of the next telemetry frame
+boot_id = random.randint(1, 2**32 - 1)  # Sent as the heartbeat custom mode so the ground can tell when the payload rebooted
+
+# Downlink batching, trades latency for throughput
+batch_size = 5  # Samples per frame, 1 sends every sample in its own frame
+batch_max_latency = 5  # Longest a sample waits in a batch before it is sent, Time in seconds
+pending_samples = []  # Samples waiting to be sent in the next batch
+pending_since = None  # When the oldest pending sample was queued
+batch_lock = threading.Lock()
+
+# Telemetry frames kept for retransmission, keyed by sequence number, oldest first
+sent_frames = OrderedDict()
+max_sent_frames = 2048  # About half an hour of batches at the default rates
+sent_frames_lock = threading.Lock()
+
+# Rate and batch size follow the radio's RADIO_STATUS reports once they arrive
+adapt_to_radio_status = True
+link_adapter = LinkAdapter(max_downlink_rate, batch_size, min_rate=max_downlink_rate / 16, max_rate=max_downlink_rate)
+
+# Uplink commands
+max_receive_wait = 0.1  # Longest the receive loop blocks before checking its deadlines, Time in seconds
+completed_commands = OrderedDict()  # Command ID to result of recently executed commands
+max_completed_commands = 64  # Retried commands older than this are executed again
 
 # Function to send a heartbeat
 def send_heartbeat():
@@ -21,7 +61,7 @@ def send_heartbeat():
         mavutil.mavlink.MAV_TYPE_ONBOARD_CONTROLLER,  # MAV_TYPE
         mavutil.mavlink.MAV_AUTOPILOT_GENERIC,  # Autopilot type
         0,  # MAV_MODE
-        0,  # Custom mode
+        boot_id,  # Custom mode
         mavutil.mavlink.MAV_STATE_ACTIVE,  # System status
         2  # MAVLink version (set to 2 for MAVLink 2)
     )
@@ -35,64 +75,250 @@ def send_heartbeat():
     logging.debug(f" System Status: {heartbeat_msg.system_status}")
     logging.debug(f" MAVLink Version: {heartbeat_msg.mavlink_version}")
     
-    # Send the heartbeat message
-    mav.mav.send(heartbeat_msg)
-    logging.info("Heartbeat message sent.")
+    # Queue the heartbeat message ahead of any telemetry
+    queue_message(downlink_scheduler.PRIORITY_HEARTBEAT, heartbeat_msg)
+    logging.info("Heartbeat message queued.")
+
+# Function to queue a message for the radio thread
+def queue_message(priority, msg, payload_size=None):
+    # Size on the wire from the message definition, only the radio thread packs messages (and touches mav)
+    if payload_size is None:
+        payload_size = msg.unpacker.size
+    downlink.put(priority, msg, mavlink_overhead + payload_size)
+
+# Function to queue a frame in an ENCAPSULATED_DATA message
+def queue_frame(priority, sequence, frame):
+    # MAVLink 2 doesn't send the zero padding, only the sequence number (u16) and the frame count
+    msg = mavutil.mavlink.MAVLink_encapsulated_data_message(sequence, telemetry_frame.pad_frame(frame))
+    queue_message(priority, msg, 2 + len(frame))
+
+# Function to send a packed frame
+def send_frame(frame, priority=downlink_scheduler.PRIORITY_TELEMETRY):
+    global frame_sequence
+    with sent_frames_lock:
+        sent_frames[frame_sequence] = frame
+        sent_frames.move_to_end(frame_sequence)
+        while len(sent_frames) > max_sent_frames:
+            sent_frames.popitem(last=False)
+    queue_frame(priority, frame_sequence, frame)
+    frame_sequence = (frame_sequence + 1) % 2**16
+
+# Function to send stored frames again, behind all live traffic
+def resend_frames(sequences):
+    resent = 0
+    for sequence in sequences:
+        with sent_frames_lock:
+            frame = sent_frames.get(sequence)
+        if frame is None:
+            continue
+        # The frame keeps its original sequence number so the ground can slot it back in
+        queue_frame(downlink_scheduler.PRIORITY_BULK, sequence, frame)
+        resent += 1
+    return resent
+
+# Function to send the pending batch, the caller must hold batch_lock
+def _flush_batch():
+    global pending_samples, pending_since
+    if not pending_samples:
+        return
+    if len(pending_samples) == 1:
+        frame = telemetry_frame.encode_sample(pending_samples[0], frame_sequence)
+    else:
+        frame = telemetry_frame.encode_batch(pending_samples, frame_sequence)
+    send_frame(frame)
+    logging.info(f"Data sent ({len(pending_samples)} samples).")
+    pending_samples = []
+    pending_since = None
 
 # Function to send data
 def send_data(data):
-    timestamp = int(time.time() * 1000) % (2**32)
-    data_list = list(data.values())
-    num_vectors = (len(data_list) + 2) // 3  # Calculate the number of vectors needed
-    
-    for i in range(num_vectors):
-        start_index = i * 3
-        end_index = min(start_index + 3, len(data_list))
-        vector_data = data_list[start_index:end_index]
+    # Queue the sample and send the batch once it is full or would no longer fit in one message
+    global pending_samples, pending_since
+    with batch_lock:
+        candidate = pending_samples + [data]
+        if len(candidate) > 1 and not telemetry_frame.batch_fits(candidate):
+            _flush_batch()
+            candidate = [data]
+        pending_samples = candidate
+        if pending_since is None:
+            pending_since = time.monotonic()
+        if len(pending_samples) >= batch_size:
+            _flush_batch()
+
+# Function to send the pending batch if its oldest sample has waited long enough
+def flush_batch_if_due():
+    with batch_lock:
+        if pending_since is not None and time.monotonic() - pending_since >= batch_max_latency:
+            _flush_batch()
+
+# Function to acknowledge an uplink command
+def send_ack(command, command_id, result):
+    frame = telemetry_frame.encode_ack(command, command_id, result)
+    queue_frame(downlink_scheduler.PRIORITY_ACK, command_id, frame)
+
+# Function to activate the cutdown mechanism
+def activate_cutdown():
+    global cutdown_status
+    logging.warning("Activating cutdown mechanism...")
+    cutdown_status = True
+    logging.warning("Cutdown mechanism activated!")
 
-        # Pad the vector with zeros if it has less than 3 elements
-        while len(vector_data) < 3:
-            vector_data.append(0.0)
+# Uplink command handlers, each returns the result sent back in the ACK
+def _command_cutdown(arguments):
+    activate_cutdown()
+    return telemetry_frame.RESULT_ACCEPTED
 
-        mav.mav.debug_vect_send(
-            name=f"Vector_{i}".encode(),
-            time_usec=timestamp,
-            x=vector_data[0],
-            y=vector_data[1],
-            z=vector_data[2]
-        )
+def _command_resend(arguments):
+    sequences = telemetry_frame.decode_ranges(arguments)
+    resent = resend_frames(sequences)
+    logging.info(f"Resending {resent} of {len(sequences)} requested frames")
+    if sequences and not resent:
+        return telemetry_frame.RESULT_REJECTED  # All of them have already left the buffer
+    return telemetry_frame.RESULT_ACCEPTED
 
-    logging.info("Data sent.")
+command_handlers = {
+    telemetry_frame.COMMAND_CUTDOWN: _command_cutdown,
+    telemetry_frame.COMMAND_RESEND: _command_resend,
+}
+
+# Function to execute an uplink command and acknowledge it
+def handle_command(frame):
+    command = frame['command']
+    command_id = frame['sequence']
+    key = (command, command_id)
+
+    # The ground retries until it sees the ACK, a repeat only gets the original result again
+    if key in completed_commands:
+        logging.info(f"Repeated command {command_id}, resending ACK")
+        send_ack(command, command_id, completed_commands[key])
+        return
+
+    handler = command_handlers.get(command)
+    if handler is None:
+        logging.warning(f"Unsupported command {command} ({command_id})")
+        result = telemetry_frame.RESULT_UNSUPPORTED
+    else:
+        try:
+            result = handler(frame['arguments'])
+        except Exception as e:
+            logging.error(f"Command {command} ({command_id}) failed: {e}")
+            result = telemetry_frame.RESULT_FAILED
+
+    completed_commands[key] = result
+    while len(completed_commands) > max_completed_commands:
+        completed_commands.popitem(last=False)
+    send_ack(command, command_id, result)
+    logging.info(f"Command {command} ({command_id}) executed with result {result}")
+
+# Function to adapt the downlink to a RADIO_STATUS report from the local radio
+def handle_radio_status(msg):
+    rate, new_batch_size = link_adapter.update(msg.rssi, msg.remrssi, msg.noise, msg.remnoise, msg.txbuf)
+    logging.debug(f"Radio status: {link_adapter.get_status()}")
+    apply_link_settings(rate, new_batch_size)
+
+# Function to apply the rate and batch size chosen by the link adapter
+def apply_link_settings(rate, new_batch_size):
+    global batch_size
+    if adapt_to_radio_status:
+        downlink.set_rate(rate)
+        with batch_lock:
+            batch_size = new_batch_size
+
+# Function to handle a received message
+def handle_message(msg):
+    if msg.get_type() == "RADIO_STATUS":
+        handle_radio_status(msg)
+    elif msg.get_type() == "ENCAPSULATED_DATA":
+        try:
+            frame = telemetry_frame.decode_frame(bytes(msg.data))
+        except (ValueError, KeyError) as e:
+            logging.warning(f"Discarding malformed uplink frame: {e}")
+            return
+        if frame['type'] == telemetry_frame.FRAME_COMMAND:
+            handle_command(frame)
+    elif msg.get_type() == "DEBUG_VECT":
+        # Unacknowledged cutdown from older ground stations
+        logging.info(f"Received debug vector: {msg.name}")
+        if msg.name == "Cutdown":
+            activate_cutdown()
+    logging.debug(f"Received message: {msg.get_type()}")
+    logging.debug(f"Message contents: {msg.to_dict()}")
+
+# Function to wait until the radio has data, a message is queued or the timeout passes
+def wait_for_data(timeout):
+    if mav.fd is None:
+        time.sleep(min(timeout, 0.01))
+        return
+    select.select([mav.fd, downlink.wake_fd], [], [], timeout)
+    downlink.clear_wakeup()
+
+# Function to send queued messages while the downlink budget allows
+def send_queued():
+    while True:
+        msg = downlink.next_message()
+        if msg is None:
+            return
+        mav.mav.send(msg)
+
+# Function to get the downlink queue depths and drop counts
+def get_downlink_stats():
+    return downlink.get_stats()
+
+# Function to get the latest radio status with the current rate and batch size
+def get_radio_status():
+    return link_adapter.get_status()
 
 # Communication loop
 def communication_loop():
-    global cutdown_status
+    next_heartbeat = time.monotonic()
+    next_stats = next_heartbeat + stats_interval
     while True:
         try:
             # Send a heartbeat message at regular intervals
-            if int(time.time()) % heartbeat_interval == 0:
+            now = time.monotonic()
+            if now >= next_heartbeat:
                 logging.debug("Sending heartbeat...")
                 send_heartbeat()
+                next_heartbeat = max(next_heartbeat + heartbeat_interval, now)
+
+                # Without radio status reports, drift back to the configured rate and batch size
+                settings = link_adapter.step_if_stale()
+                if settings is not None:
+                    apply_link_settings(*settings)
+
+            # Log the queue depths, drop counts and link state at regular intervals
+            if now >= next_stats:
+                logging.info(f"Downlink: {get_downlink_stats()}")
+                logging.info(f"Radio status: {get_radio_status()}")
+                next_stats = max(next_stats + stats_interval, now)
 
-            # Check if a message has been received
-            msg = mav.recv_match(blocking=False)
-            if msg:
-                if msg.get_type() == "DEBUG_VECT":
-                    logging.info(f"Received debug vector: {msg.name}")
-                    if msg.name == "Cutdown":
-                        logging.warning("Activating cutdown mechanism...")
-                        cutdown_status = True
-                        logging.warning("Cutdown mechanism activated!")
-                logging.info(f"Received message: {msg.get_type()}")
-                logging.debug(f"Message contents: {msg.to_dict()}")
-            else:
-                logging.debug("No message received.")
+            # Send a partial batch once its latency deadline has passed
+            flush_batch_if_due()
+
+            # Send what the budget allows, highest priority first
+            send_queued()
+
+            # Sleep until bytes arrive, a message is queued or the next deadline, then handle everything received
+            timeout = next_heartbeat - time.monotonic()
+            with batch_lock:
+                if pending_since is not None:
+                    timeout = min(timeout, pending_since + batch_max_latency - time.monotonic())
+            ready = downlink.time_until_ready()
+            if ready is not None:
+                timeout = min(timeout, ready)
+            wait_for_data(min(max(timeout, 0), max_receive_wait))
+            while True:
+                msg = mav.recv_match(blocking=False)
+                if msg is None:
+                    break
+                handle_message(msg)
+
+            # ACKs for the commands just handled go out straight away
+            send_queued()
 
         except Exception as e:
             logging.error(f"Error: {e}")
-
-        # Wait for a short interval before the next iteration
-        time.sleep(1)
+            time.sleep(1)
 
 # Function to get the status of the cutdown mechanism
 def get_cutdown_status():
@@ -1,4 +1,6 @@
 import logging
+import threading
+import time
 from sense_hat import SenseHat
 
 # Attempt to create a SenseHat instance
@@ -12,80 +14,167 @@ except Exception as e:
 # Set Constants
 g = 9.80665  # m/s^2
 
-def get_accelerometer_data():
+# How long a reading from each physical chip is reused before going back to the bus, Time in seconds
+# The IMU is not cached by default so accelerometer and gyroscope are always fresh
+cache_ttl = {
+    'imu': 0.0,       # LSM9DS1, accelerometer and gyroscope
+    'humidity': 1.0,  # HTS221, humidity and temperature from humidity
+    'pressure': 1.0,  # LPS25H, pressure and temperature from pressure
+}
+
+# Channels produced by each chip
+chip_channels = {
+    'imu': ['accelerometer', 'gyroscope'],
+    'humidity': ['humidity', 'temperature_humidity'],
+    'pressure': ['pressure', 'temperature_pressure'],
+}
+
+# Most recent reading of each chip as (sample time, channel values)
+_cache = {}
+# Serializes access to the I2C bus and the cache between threads
+_bus_lock = threading.Lock()
+
+def _read_imu():
+    # One IMU read returns both the accelerometer and the gyroscope
+    if not sense._read_imu():
+        raise IOError("IMU read failed")
+    data = sense._imu.getIMUData()
+    channels = _empty_channels('imu')
+    if data['accelValid']:
+        # Convert from Gs to m/s^2 and format to two decimal places
+        acceleration = data['accel']
+        channels['accelerometer'] = {"x": round(acceleration[0] * g, 2), "y": round(acceleration[1] * g, 2), "z": round(acceleration[2] * g, 2)}
+    if data['gyroValid']:
+        # Radians per second, formatted to two decimal places
+        gyro = data['gyro']
+        channels['gyroscope'] = {"x": round(gyro[0], 2), "y": round(gyro[1], 2), "z": round(gyro[2], 2)}
+    return channels
+
+def _read_humidity():
+    # One HTS221 read returns (humidity valid, humidity, temperature valid, temperature)
+    sense._init_humidity()
+    data = sense._humidity.humidityRead()
+    return {
+        'humidity': data[1] if data[0] else "",
+        'temperature_humidity': round(data[3], 2) if data[2] else "",
+    }
+
+def _read_pressure():
+    # One LPS25H read returns (pressure valid, pressure, temperature valid, temperature)
+    sense._init_pressure()
+    data = sense._pressure.pressureRead()
+    pressure = data[1] if data[0] else ""
+    temperature = round(data[3], 2) if data[2] else ""
+    # If the sensor returns 0, it's likely an error
+    if pressure == 0:
+        pressure = ""
+    if temperature == 0:
+        temperature = ""
+    return {'pressure': pressure, 'temperature_pressure': temperature}
+
+_chip_readers = {
+    'imu': _read_imu,
+    'humidity': _read_humidity,
+    'pressure': _read_pressure,
+}
+
+def _empty_channels(chip):
+    # Values returned when a chip can't be read
+    if chip == 'imu':
+        return {'accelerometer': {"x": "", "y": "", "z": ""}, 'gyroscope': {"x": "", "y": "", "z": ""}}
+    return {channel: "" for channel in chip_channels[chip]}
+
+def _read_chip(chip, max_age=None):
+    """
+    Returns (sample time, channel values) for one chip, going to the bus only if
+    the cached reading is older than max_age (defaults to the chip's cache_ttl).
+    """
     if not sense_hat_available:
-        return {"x": "", "y": "", "z": ""}
-    try:
-        # Get accelerometer data in Gs
-        acceleration = sense.get_accelerometer_raw()
-        # Convert to m/s^2 and format to two decimal places
-        x = round(acceleration['x'] * g, 2)  
-        y = round(acceleration['y'] * g, 2)
-        z = round(acceleration['z'] * g, 2)
-        return {"x": x, "y": y, "z": z}
-    except Exception as e:
-        logging.error(f"Error reading accelerometer: {e}")
-        return {"x": "", "y": "", "z": ""}
+        return time.time(), _empty_channels(chip)
+    if max_age is None:
+        max_age = cache_ttl[chip]
+
+    with _bus_lock:
+        cached = _cache.get(chip)
+        if cached is not None and time.time() - cached[0] <= max_age:
+            return cached
+        try:
+            channels = _chip_readers[chip]()
+        except Exception as e:
+            logging.error(f"Error reading {chip} chip: {e}")
+            return time.time(), _empty_channels(chip)
+        _cache[chip] = (time.time(), channels)
+        return _cache[chip]
+
+def set_cache_ttl(chip, ttl):
+    # Change how long readings from a chip are reused, Time in seconds
+    if chip not in cache_ttl:
+        raise ValueError(f"Unknown Sense HAT chip: {chip}")
+    cache_ttl[chip] = ttl
+
+def read_all(max_age=None, chips=None):
+    """
+    Reads every Sense HAT channel with one bus transaction per physical chip.
+
+    Args:
+    max_age (float): Reuse cached readings younger than this, in seconds. Defaults to cache_ttl per chip.
+    chips (list): Chips to read ('imu', 'humidity', 'pressure'). Defaults to all of them.
+
+    Returns:
+    dict: Channel name mapped to {'value': ..., 'timestamp': ...}, where timestamp is the
+    time.time() at which the chip was actually sampled.
+    """
+    snapshot = {}
+    for chip in (chips or chip_channels):
+        sample_time, channels = _read_chip(chip, max_age)
+        for channel, value in channels.items():
+            snapshot[channel] = {'value': value, 'timestamp': sample_time}
+    return snapshot
+
+def get_accelerometer_data():
+    return dict(_read_chip('imu')[1]['accelerometer'])
 
 def get_gyroscope_data():
-    if not sense_hat_available:
-        return {"x": "", "y": "", "z": ""}
-    try:
-        # Get gyroscope data in radians per second
-        gyro = sense.get_gyroscope_raw()
-        # Format to two decimal places
-        x = round(gyro['x'], 2)  
-        y = round(gyro['y'], 2)
-        z = round(gyro['z'], 2)
-        return {"x": x, "y": y, "z": z}
-    except Exception as e:
-        logging.error(f"Error reading gyroscope: {e}")
-        return {"x": "", "y": "", "z": ""}
+    return dict(_read_chip('imu')[1]['gyroscope'])
 
 def get_humidity():
-    if not sense_hat_available:
-        return ""
-    try:
-        # Get humidity data in percentage
-        humidity = sense.get_humidity()
-        return humidity
-    except Exception as e:
-        logging.error(f"Error reading humidity: {e}")
-        return ""
+    # Get humidity data in percentage
+    return _read_chip('humidity')[1]['humidity']
 
 def get_pressure():
-    if not sense_hat_available:
-        return ""
-    try:
-        # Get pressure data in millibars
-        pressure = sense.get_pressure()
-        if pressure == 0: # If the sensor returns 0, it's likely an error
-            return ""
-        return pressure
-    except Exception as e:
-        logging.error(f"Error reading pressure: {e}")
-        return ""
+    # Get pressure data in millibars
+    return _read_chip('pressure')[1]['pressure']
 
 def get_temperature_from_humidity():
-    if not sense_hat_available:
-        return ""
-    try:
-        # Get temperature data in degrees Celsius from the humidity sensor
-        temperature = round(sense.get_temperature_from_humidity(), 2)
-        return temperature
-    except Exception as e:
-        logging.error(f"Error reading temperature: {e}")
-        return ""
-    
+    # Get temperature data in degrees Celsius from the humidity sensor
+    return _read_chip('humidity')[1]['temperature_humidity']
+
 def get_temperature_from_pressure():
-    if not sense_hat_available:
-        return ""
-    try:
-        # Get temperature data in degrees Celsius from the pressure sensor
-        temperature = round(sense.get_temperature_from_pressure(), 2)
-        if temperature == 0: # If the sensor returns 0, it's likely an error
-            return ""
-        return temperature
-    except Exception as e:
-        logging.error(f"Error reading temperature: {e}")
-        return ""
\ No newline at end of file
+    # Get temperature data in degrees Celsius from the pressure sensor
+    return _read_chip('pressure')[1]['temperature_pressure']
+
+def get_environmental_data():
+    # Read the humidity and pressure chips once and return them keyed by log field name
+    snapshot = read_all(chips=['humidity', 'pressure'])
+    return {
+        'Humidity': snapshot['humidity']['value'],
+        'Pressure': snapshot['pressure']['value'],
+        'Temperature_Humidity': snapshot['temperature_humidity']['value'],
+        'Temperature_Pressure': snapshot['temperature_pressure']['value']
+    }
+
+def get_sensor_data():
+    # Read every Sense HAT channel once and return them keyed by log field name
+    snapshot = read_all(chips=['imu'])
+    acceleration = snapshot['accelerometer']['value']
+    gyro = snapshot['gyroscope']['value']
+    data = {
+        'Accelerometer_X': acceleration['x'],
+        'Accelerometer_Y': acceleration['y'],
+        'Accelerometer_Z': acceleration['z'],
+        'Gyroscope_X': gyro['x'],
+        'Gyroscope_Y': gyro['y'],
+        'Gyroscope_Z': gyro['z'],
+    }
+    data.update(get_environmental_data())
+    return data
@@ -0,0 +1,98 @@
+import threading
+import logging
+import time
+
+class SensorScheduler:
+    """
+    Runs each sensor on its own worker thread at its own rate and publishes the
+    results into a shared latest-value table.
+
+    Each sensor is registered with a read function that returns a dictionary of
+    fields (e.g. {'Humidity': 41.2, 'Pressure': 1003.5}). The main loop never
+    touches the sensors directly; it calls snapshot() to copy the latest values.
+    When a read fails (returns None or raises), the sensor's fields are blanked
+    so an old value, e.g. a lost GPS fix, is never logged as a current one.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latest = {}
+        self.sample_times = {}
+        self.sensor_fields = {}  # Fields each sensor publishes, blanked when a read fails
+        self.sensors = []
+        self.threads = []
+        self.stop_event = threading.Event()
+
+    def add_sensor(self, name, read_function, rate_hz, fields=None):
+        """
+        Registers a sensor to be sampled once the scheduler is started.
+
+        Args:
+        name (str): Name of the sensor, used for logging and thread names.
+        read_function (callable): Returns a dict of field names to values, or None on failure.
+        rate_hz (float): Sampling rate for this sensor in Hz.
+        fields (list): Fields blanked when a read fails, the fields of the last successful read if None.
+        """
+        self.sensors.append((name, read_function, 1.0 / rate_hz))
+        if fields is not None:
+            self.sensor_fields[name] = list(fields)
+
+    def start(self):
+        # Start one daemon worker per registered sensor
+        self.stop_event.clear()
+        for name, read_function, interval in self.sensors:
+            thread = threading.Thread(target=self._worker, args=(name, read_function, interval), name=f"sensor-{name}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+            logging.info(f"Started {name} sampling at {round(1.0 / interval, 2)} Hz")
+
+    def stop(self):
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def _worker(self, name, read_function, interval):
+        next_sample = time.monotonic()
+        while not self.stop_event.is_set():
+            try:
+                fields = read_function()
+            except Exception as e:
+                logging.error(f"Error sampling {name}: {e}")
+                fields = None
+            if fields:
+                sample_time = time.time()
+                with self.lock:
+                    self.latest.update(fields)
+                    self.sample_times[name] = sample_time
+                    self.sensor_fields.setdefault(name, list(fields))
+            else:
+                self._blank(name)
+
+            # Schedule against a fixed deadline so slow reads don't accumulate drift
+            next_sample += interval
+            delay = next_sample - time.monotonic()
+            if delay < 0:
+                # The read took longer than the interval, skip the missed slots
+                next_sample = time.monotonic()
+                delay = 0
+            self.stop_event.wait(delay)
+
+    def _blank(self, name):
+        # No current reading, the sensor's fields are logged empty until it recovers
+        with self.lock:
+            for field in self.sensor_fields.get(name, []):
+                self.latest[field] = ''
+
+    def snapshot(self):
+        # Return a copy of the latest value table
+        with self.lock:
+            return dict(self.latest)
+
+    def get_sample_age(self, name):
+        # Seconds since the given sensor last published, or None if it never has
+        with self.lock:
+            sample_time = self.sample_times.get(name)
+        if sample_time is None:
+            return None
+        return time.time() - sample_time
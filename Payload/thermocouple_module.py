@@ -1,8 +1,19 @@
 import logging
+import threading
+import time
 import board
 import digitalio
 import adafruit_max31856
 
+# Continuous conversion settings
+averaging = 16  # Hardware averaging, number of samples per reading (1, 2, 4, 8 or 16)
+noise_rejection = 60  # Mains filter frequency in Hz (50 or 60)
+poll_interval = 0.1  # How often the status and result registers are polled, Time in seconds
+drdy_pin = None  # Board pin wired to the DRDY output (e.g. board.D6), polled instead of the timer when set
+reading_timeout = 2  # A reading older than this is treated as missing, Time in seconds
+start_retry_interval = 60  # Wait before trying continuous mode again after it failed to start, one-shot reads are used meanwhile, Time in seconds
+invalidating_faults = ['open_tc', 'voltage']  # Faults that make the temperature meaningless
+
 # Initialize the SPI bus and the chip select pin
 spi = board.SPI()
 cs = digitalio.DigitalInOut(board.D5)  # Adjust the pin if needed
@@ -15,10 +26,89 @@ except Exception as e:
     logging.error(f"MAX31856 initialization failed: {e}")
     thermocouple_available = False
 
+# Latest reading from the continuous reader as (time, temperature, active faults)
+_latest_reading = None
+_reading_lock = threading.Lock()
+_reader_thread = None
+_start_lock = threading.Lock()
+_start_failed_at = None  # When continuous mode last failed to start
+
+def _conversion_ready(drdy):
+    # DRDY is active low and goes high again once the result registers are read
+    if drdy is None:
+        return True
+    return not drdy.value
+
+def _reader_loop(drdy):
+    global _latest_reading
+    last_faults = []
+    while True:
+        try:
+            if _conversion_ready(drdy):
+                faults = [fault for fault, active in max31856.fault.items() if active]
+                temperature = round(max31856.unpack_temperature(), 2)
+                if faults != last_faults:
+                    if faults:
+                        logging.warning(f"Thermocouple faults: {', '.join(faults)}")
+                    else:
+                        logging.info("Thermocouple faults cleared.")
+                    last_faults = faults
+                with _reading_lock:
+                    _latest_reading = (time.monotonic(), temperature, faults)
+        except Exception as e:
+            logging.error(f"Error reading thermocouple: {e}")
+        time.sleep(poll_interval if drdy is None else 0.01)
+
+def start_continuous():
+    """
+    Puts the MAX31856 into auto-convert mode with hardware averaging and starts a
+    background thread that polls DRDY (or the timer) and the fault status register.
+    Safe to call more than once. After a failed start it is only tried again
+    once start_retry_interval has passed.
+    """
+    global _reader_thread, _start_failed_at
+    with _start_lock:
+        if _reader_thread is not None or not thermocouple_available:
+            return
+        if _start_failed_at is not None and time.monotonic() - _start_failed_at < start_retry_interval:
+            return
+        try:
+            max31856.averaging = averaging
+            max31856.noise_rejection = noise_rejection
+            max31856.start_autoconverting()
+        except Exception as e:
+            logging.error(f"Error starting thermocouple conversions, retrying in {start_retry_interval} s: {e}")
+            _start_failed_at = time.monotonic()
+            return
+        _start_failed_at = None
+
+        drdy = None
+        if drdy_pin is not None:
+            drdy = digitalio.DigitalInOut(drdy_pin)
+            drdy.direction = digitalio.Direction.INPUT
+
+        _reader_thread = threading.Thread(target=_reader_loop, args=(drdy,), name="thermocouple-reader", daemon=True)
+        _reader_thread.start()
+        logging.info(f"Thermocouple converting continuously with {averaging}x averaging")
+
+def _get_latest_reading():
+    with _reading_lock:
+        reading = _latest_reading
+    if reading is None or time.monotonic() - reading[0] > reading_timeout:
+        return None
+    return reading
+
 def get_thermocouple_data():
     if not thermocouple_available:
         return ""
-    
+
+    # Use the latest continuous conversion when the reader is running
+    if _reader_thread is not None:
+        reading = _get_latest_reading()
+        if reading is None or any(fault in invalidating_faults for fault in reading[2]):
+            return ""
+        return reading[1]
+
     try:
         # Get the temperature in degrees Celsius
         temperature = max31856.temperature
@@ -26,8 +116,20 @@ def get_thermocouple_data():
     except Exception as e:
         logging.error(f"Error reading thermocouple: {e}")
         return ""
-    
+
+def get_thermocouple_faults():
+    # Names of the faults active at the latest continuous reading, empty when there are none
+    reading = _get_latest_reading()
+    if reading is None:
+        return []
+    return list(reading[2])
+
+def get_sensor_data():
+    # Return the thermocouple reading keyed by log field name
+    start_continuous()
+    return {'Temperature_Thermocouple': get_thermocouple_data()}
+
 if __name__ == "__main__":
     # Test the thermocouple module
     temperature = get_thermocouple_data()
-    print("Thermocouple temperature:", temperature)
\ No newline at end of file
+    print("Thermocouple temperature:", temperature)
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The payload and ground station modules import their neighbours by name, as when run from their own folder
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(root, 'Payload'), os.path.join(root, 'Ground_Station')]
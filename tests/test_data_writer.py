@@ -0,0 +1,104 @@
+import csv
+import threading
+import pytest
+from data_writer import BufferedWriter, CsvSink, get_next_filename, merge_csv_by_time
+
+class RecordingSink:
+    # Sink that keeps the rows and counts the calls, write_rows can be held up with a gate
+    def __init__(self):
+        self.rows = []
+        self.syncs = 0
+        self.closed = False
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def write_rows(self, rows):
+        self.gate.wait()
+        self.rows.extend(rows)
+
+    def flush(self):
+        pass
+
+    def sync(self):
+        self.syncs += 1
+
+    def close(self):
+        self.closed = True
+
+def test_rows_are_written_in_order_on_close():
+    sink = RecordingSink()
+    writer = BufferedWriter(sink, sync_policy='shutdown', batch_size=7)
+    for index in range(100):
+        writer.write({'Index': index})
+    writer.close()
+    writer.close()  # Closing twice is harmless
+    assert [row['Index'] for row in sink.rows] == list(range(100))
+    assert sink.syncs == 1 and sink.closed
+    assert writer.get_stats()['rows_written'] == 100
+
+def test_rows_policy_syncs_every_sync_rows():
+    sink = RecordingSink()
+    sink.gate.clear()  # Hold the writer so all rows are queued, then drained in full batches
+    writer = BufferedWriter(sink, sync_policy='rows', sync_rows=10, batch_size=10)
+    for index in range(50):
+        writer.write({'Index': index})
+    sink.gate.set()
+    writer.close()
+    assert len(sink.rows) == 50
+    assert sink.syncs >= 4
+
+def test_full_queue_drops_and_counts_rows():
+    sink = RecordingSink()
+    sink.gate.clear()
+    writer = BufferedWriter(sink, max_queue=5, batch_size=1)
+    for index in range(20):
+        writer.write({'Index': index})
+    sink.gate.set()
+    writer.close()
+    stats = writer.get_stats()
+    assert stats['rows_dropped'] > 0
+    assert stats['rows_written'] + stats['rows_dropped'] == 20
+
+def test_unknown_sync_policy():
+    with pytest.raises(ValueError):
+        BufferedWriter(RecordingSink(), sync_policy='sometimes')
+
+def test_csv_sink_writes_values_in_order(tmp_path):
+    filename = tmp_path / 'data_1.csv'
+    writer = BufferedWriter(CsvSink(str(filename)))
+    writer.write({'a': 'A', 'b': 'B'})
+    writer.write({'a': 1, 'b': ''})
+    writer.close()
+    with open(filename, newline='') as csvfile:
+        assert list(csv.reader(csvfile)) == [['A', 'B'], ['1', '']]
+
+def test_next_filename(tmp_path):
+    for number in (1, 2, 9):
+        (tmp_path / f'data_{number}.csv').touch()
+    assert get_next_filename(str(tmp_path / 'data_{}.csv')) == str(tmp_path / 'data_10.csv')
+
+def write_csv(filename, rows):
+    with open(filename, 'w', newline='') as csvfile:
+        csv.writer(csvfile).writerows([['Timestamp', 'Source']] + rows)
+
+def test_merge_sorts_across_the_timestamp_wrap(tmp_path):
+    wrap = 2**32
+    write_csv(tmp_path / 'data_1.csv', [[wrap - 3000, 'live'], [wrap - 1000, 'live'], [1000, 'live'], [1000, 'live']])
+    write_csv(tmp_path / 'data_1_backfill.csv', [[wrap - 4000, 'backfill'], [wrap - 2000, 'backfill'], [0, 'backfill'], ['x', 'backfill']])
+    rows = merge_csv_by_time([str(tmp_path / 'data_1.csv'), str(tmp_path / 'data_1_backfill.csv'), str(tmp_path / 'missing.csv')],
+                             str(tmp_path / 'data_1_merged.csv'))
+    assert rows == 7  # The repeated row is written once
+    with open(tmp_path / 'data_1_merged.csv', newline='') as csvfile:
+        merged = list(csv.reader(csvfile))
+    assert merged[0] == ['Timestamp', 'Source']
+    assert [row[0] for row in merged[1:]] == [str(wrap - 4000), str(wrap - 3000), str(wrap - 2000), str(wrap - 1000), '0', '1000', 'x']
+
+def test_merge_plain_sort_and_header_mismatch(tmp_path):
+    write_csv(tmp_path / 'a.csv', [[5, 'a'], [2**32 - 1, 'a']])
+    write_csv(tmp_path / 'b.csv', [[3, 'b']])
+    merge_csv_by_time([str(tmp_path / 'a.csv'), str(tmp_path / 'b.csv')], str(tmp_path / 'out.csv'), time_modulo=None)
+    with open(tmp_path / 'out.csv', newline='') as csvfile:
+        assert [row[0] for row in list(csv.reader(csvfile))[1:]] == ['3', '5', str(2**32 - 1)]
+    (tmp_path / 'c.csv').write_text('Time,Other\n1,2\n')
+    with pytest.raises(ValueError):
+        merge_csv_by_time([str(tmp_path / 'a.csv'), str(tmp_path / 'c.csv')], str(tmp_path / 'out.csv'))
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+from decimation import stride_indices, minmax_indices, lttb_indices
+from telemetry_history import TelemetryHistory
+
+def test_stride_keeps_the_ends():
+    assert stride_indices(5, 10).tolist() == [0, 1, 2, 3, 4]
+    indices = stride_indices(1000, 10)
+    assert len(indices) == 10 and indices[0] == 0 and indices[-1] == 999
+
+def test_minmax_keeps_spikes():
+    values = np.sin(np.linspace(0, 20, 10000))
+    values[4321] = 50
+    values[7777] = -50
+    indices = minmax_indices([values], 200)
+    assert len(indices) <= 200
+    assert np.all(np.diff(indices) > 0)
+    assert {0, 9999, 4321, 7777} <= set(indices.tolist())
+
+def test_minmax_ignores_missing_values():
+    values = np.full(1000, np.nan)
+    values[500] = 1.0
+    indices = minmax_indices([values], 50)
+    assert 500 in indices.tolist()
+    assert minmax_indices([], 10).tolist() == []
+
+def test_lttb_keeps_the_shape():
+    x = np.arange(5000, dtype=np.float64)
+    y = np.zeros(5000)
+    y[2500] = 100  # A single peak must survive
+    indices = lttb_indices(x, y, 100)
+    assert len(indices) == 100
+    assert indices[0] == 0 and indices[-1] == 4999
+    assert np.all(np.diff(indices) > 0)
+    assert 2500 in indices.tolist()
+
+def test_lttb_never_picks_missing_points():
+    x = np.arange(1000, dtype=np.float64)
+    y = np.cos(x / 50)
+    y[100:300] = np.nan
+    indices = lttb_indices(x, y, 50)
+    assert len(indices) == 50
+    # Only a bucket with no values at all may keep a missing point
+    edges = np.linspace(1, 999, 49).astype(np.int64)
+    for start, end, chosen in zip(edges[:-1], edges[1:], indices[1:-1]):
+        assert start <= chosen < end
+        if not np.isnan(y[start:end]).all():
+            assert not np.isnan(y[chosen])
+
+def test_lttb_short_input_is_unchanged():
+    assert lttb_indices([0, 1, 2], [5, 6, 7], 10).tolist() == [0, 1, 2]
+
+def history(count=1000):
+    store = TelemetryHistory(['Altitude', 'Pressure'], capacity=500)
+    for index in range(count):
+        store.append(index, {'Altitude': index * 2.0, 'Pressure': '' if index % 10 == 0 else 1000 - index}, 1000.0 + index)
+    return store
+
+def test_history_ring_and_ranges():
+    result = history().query(since=900, fields=['Altitude'])
+    assert result['Sequence'] == list(range(901, 1000))
+    assert result['Altitude'][0] == 1802.0
+    result = history().query(start=1600, end=1610)
+    assert result['Sequence'] == list(range(600, 611))
+    assert result['Pressure'][0] is None
+    assert history().query()['Count'] == 500  # Only capacity samples are held
+
+@pytest.mark.parametrize('method', ['minmax', 'lttb'])
+def test_history_downsampling(method):
+    result = history().query(fields=['Altitude'], max_points=50, method=method)
+    assert result['Count'] == 500 and result['Downsampled']
+    assert len(result['Sequence']) <= 50
+    assert result['Sequence'][0] == 500 and result['Sequence'][-1] == 999
+
+def test_history_rejects_bad_queries():
+    with pytest.raises(KeyError):
+        history().query(fields=['Nope'])
+    with pytest.raises(ValueError):
+        history().query(max_points=10, method='lttb')
+    with pytest.raises(ValueError):
+        history().query(max_points=10, method='average')
@@ -0,0 +1,49 @@
+import csv
+import pytest
+from data_writer import BufferedWriter
+from flight_log import FlightLogWriter, read_flight_log, field_valid, convert_to_csv
+
+fields = ['Timestamp', 'Pressure', 'GPS_Time']
+types = {'Timestamp': 'i8', 'GPS_Time': 'utc'}
+
+def write_log(filename, rows):
+    log = FlightLogWriter(str(filename), fields, types, labels=['Timestamp', 'Pressure (mbar)', 'GPS Time'])
+    writer = BufferedWriter(log, sync_policy='shutdown')
+    for row in rows:
+        writer.write(row)
+    writer.close()
+
+def test_round_trip_through_the_buffered_writer(tmp_path):
+    filename = tmp_path / 'flight_1.bin'
+    write_log(filename, [
+        {'Timestamp': 1000, 'Pressure': 1003.25, 'GPS_Time': '2024-04-08T18:30:05.250Z'},
+        {'Timestamp': 2000, 'Pressure': '', 'GPS_Time': 'not a time'},
+    ])
+    schema, records = read_flight_log(str(filename))
+    assert [field['name'] for field in schema['fields']] == fields
+    assert records['Timestamp'].tolist() == [1000, 2000]
+    assert records['Pressure'][0] == 1003.25
+    assert field_valid(schema, records, 'Pressure').tolist() == [True, False]
+    assert field_valid(schema, records, 'GPS_Time').tolist() == [True, False]
+
+def test_partial_last_record_is_ignored(tmp_path):
+    filename = tmp_path / 'flight_1.bin'
+    write_log(filename, [{'Timestamp': index, 'Pressure': index / 2} for index in range(3)])
+    with open(filename, 'ab') as log_file:
+        log_file.write(b'\x01\x02\x03')
+    _, records = read_flight_log(str(filename))
+    assert len(records) == 3
+
+def test_csv_export_uses_the_labels(tmp_path):
+    filename = tmp_path / 'flight_1.bin'
+    write_log(filename, [{'Timestamp': 1000, 'Pressure': '', 'GPS_Time': '2024-04-08T18:30:05.250Z'}])
+    assert convert_to_csv(str(filename), str(tmp_path / 'flight_1.csv')) == 1
+    with open(tmp_path / 'flight_1.csv', newline='') as csvfile:
+        rows = list(csv.reader(csvfile))
+    assert rows == [['Timestamp', 'Pressure (mbar)', 'GPS Time'], ['1000', '', '2024-04-08T18:30:05.250Z']]
+
+def test_not_a_flight_log(tmp_path):
+    filename = tmp_path / 'data_1.csv'
+    filename.write_bytes(b'Timestamp,Pressure\n1,2\n')
+    with pytest.raises(ValueError):
+        read_flight_log(str(filename))
@@ -0,0 +1,54 @@
+import itertools
+import time
+import pytest
+
+# Needs the Sense HAT libraries, the IMU reads themselves are replaced below
+imu_capture = pytest.importorskip('imu_capture')
+
+@pytest.fixture
+def counter(monkeypatch):
+    # Every read returns the next integer on all axes, so a window of samples is a run of integers
+    numbers = itertools.count(1)
+    def read_all(max_age=None, chips=None):
+        value = float(next(numbers))
+        vector = {'x': value, 'y': value, 'z': -value}
+        return {'accelerometer': {'value': vector, 'timestamp': time.time()},
+                'gyroscope': {'value': dict(vector, z=""), 'timestamp': time.time()}}
+    monkeypatch.setattr(imu_capture.sh, 'read_all', read_all)
+
+def capture(imu, samples):
+    imu.start()
+    deadline = time.monotonic() + 5
+    while imu.count < samples and time.monotonic() < deadline:
+        time.sleep(0.01)
+    imu.stop()
+
+def test_aggregates_cover_every_sample_since_the_last_row(counter):
+    imu = imu_capture.ImuCapture(rate_hz=1000, buffer_seconds=10)
+    capture(imu, 50)
+    first = imu.frame_aggregates()
+    count = first['IMU_Samples']
+    assert count == imu.count
+    assert first['Accelerometer_X_Min'] == 1 and first['Accelerometer_X_Max'] == count
+    assert first['Accelerometer_X'] == pytest.approx((count + 1) / 2)
+    assert first['Accelerometer_Z_Max'] == -1
+    assert first['Gyroscope_Z'] == ""  # No valid samples on that axis
+    assert imu.frame_aggregates()['IMU_Samples'] == 0
+
+def test_overrun_drops_the_oldest_samples(counter):
+    imu = imu_capture.ImuCapture(rate_hz=1000, buffer_seconds=0.02)  # 20 sample ring
+    capture(imu, 60)
+    aggregates = imu.frame_aggregates()
+    assert aggregates['IMU_Samples'] == imu.capacity
+    assert imu.dropped == imu.count - imu.capacity
+    assert aggregates['Accelerometer_X_Max'] == imu.count
+    assert aggregates['Accelerometer_X_Min'] == imu.count - imu.capacity + 1
+
+def test_raw_log_gets_every_sample(counter, tmp_path):
+    raw_filename = tmp_path / 'imu_raw.csv'
+    imu = imu_capture.ImuCapture(rate_hz=1000, buffer_seconds=10, raw_filename=str(raw_filename), raw_block_size=7)
+    capture(imu, 30)
+    lines = raw_filename.read_text().splitlines()
+    assert lines[0].split(',') == ['Time'] + imu_capture.imu_axes
+    assert len(lines) == imu.count + 1
+    assert [float(line.split(',')[1]) for line in lines[1:]] == list(range(1, imu.count + 1))
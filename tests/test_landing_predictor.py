@@ -0,0 +1,62 @@
+import math
+import pytest
+import landing_predictor
+from landing_predictor import LandingPredictor, meters_per_degree, scale_height, sea_level_descent_rate
+
+def fix(timestamp, altitude, latitude=31.85, longitude=-97.7, speed=10.0, heading=90.0):
+    return {'Timestamp': timestamp, 'Latitude': latitude, 'Longitude': longitude,
+            'Altitude': altitude, 'Speed': speed, 'Heading': heading}
+
+def descending(predictor, start=5000, samples=5, timestamp=0):
+    for index in range(samples):
+        predictor.update(fix((timestamp + index * 1000) % 2**32, start - index * 10))
+
+def test_nothing_before_a_fix():
+    predictor = LandingPredictor(scenarios=100, seed=1)
+    assert predictor.predict() is None
+    predictor.update(fix(0, 300, latitude=0, longitude=0))  # No GPS fix yet
+    predictor.update({'Timestamp': 1000, 'Altitude': ''})
+    assert predictor.predict() is None
+
+def test_descent_drifts_with_the_wind():
+    predictor = LandingPredictor(scenarios=4000, ground_altitude=0, seed=1)
+    descending(predictor)
+    prediction = predictor.predict()
+    assert prediction['Phase'] == 'DESCENT'
+    # Time to fall from the last fix with the descent rate growing as 1/sqrt(density)
+    altitude = 5000 - 40
+    seconds = 2 * scale_height / sea_level_descent_rate * (1 - math.exp(-altitude / (2 * scale_height)))
+    assert prediction['Time_To_Landing_s'] == pytest.approx(seconds, rel=0.03)
+    east = (prediction['Longitude'] + 97.7) * meters_per_degree * math.cos(math.radians(31.85))
+    assert east == pytest.approx(10 * seconds, rel=0.05)
+    assert prediction['Latitude'] == pytest.approx(31.85, abs=0.01)
+    assert len(prediction['Ellipse']) == landing_predictor.ellipse_points
+    assert prediction['Semi_Major_m'] >= prediction['Semi_Minor_m'] > 0
+
+def test_ascent_goes_up_to_burst_first():
+    predictor = LandingPredictor(scenarios=1000, ground_altitude=0, seed=1)
+    for index in range(30):
+        predictor.update(fix(index * 1000, 1000 + index * 5))
+    ascent = predictor.predict()
+    cutdown = predictor.predict(cutdown_now=True)
+    assert ascent['Phase'] == 'ASCENT' and cutdown['Phase'] == 'DESCENT' and cutdown['Cutdown_Now']
+    assert ascent['Time_To_Landing_s'] > 10 * cutdown['Time_To_Landing_s']
+    assert ascent['Longitude'] > cutdown['Longitude']
+
+def test_timestamps_wrap_at_32_bits():
+    predictor = LandingPredictor(scenarios=100, ground_altitude=0, seed=1)
+    descending(predictor, timestamp=2**32 - 2000)  # Wraps after the second sample
+    assert predictor.latest[0] == 2000
+    assert predictor.vertical_rate < 0
+    predictor.update(fix(2**32 - 500, 100))  # Older than the latest fix
+    assert predictor.latest[0] == 2000
+
+def test_unmeasured_bands_take_the_nearest_wind():
+    predictor = LandingPredictor(scenarios=100, seed=1)
+    descending(predictor)
+    mean, sd = predictor.wind_profile()
+    band = int(4980 // landing_predictor.altitude_bin_size)
+    assert mean[0] == pytest.approx([10, 0], abs=1e-9)
+    assert mean[band] == pytest.approx([10, 0], abs=1e-9)
+    assert sd[0, 0] == landing_predictor.unmeasured_wind_sd
+    assert sd[band, 0] == landing_predictor.min_wind_sd
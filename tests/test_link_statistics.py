@@ -0,0 +1,82 @@
+import time
+from link_statistics import LinkStatistics, FRAME_NEW, FRAME_LATE, FRAME_DUPLICATE
+
+def record(stats, sequences):
+    return [stats.record_frame(sequence) for sequence in sequences]
+
+def test_in_order_frames():
+    stats = LinkStatistics()
+    assert record(stats, range(10)) == [FRAME_NEW] * 10
+    result = stats.get_stats()
+    assert (result['Frames_Received'], result['Frames_Lost'], result['Loss_Percent']) == (10, 0, 0.0)
+
+def test_gap_is_lost_until_filled():
+    stats = LinkStatistics()
+    record(stats, [0, 1, 5])
+    assert stats.get_missing() == [2, 3, 4]
+    assert stats.get_stats()['Frames_Lost'] == 3
+    assert stats.record_frame(3) == FRAME_LATE
+    assert stats.get_missing() == [2, 4]
+    result = stats.get_stats()
+    assert (result['Frames_Lost'], result['Out_Of_Order']) == (2, 1)
+
+def test_duplicates_are_reported_and_not_counted():
+    stats = LinkStatistics()
+    record(stats, [0, 1, 2])
+    assert record(stats, [2, 1]) == [FRAME_DUPLICATE] * 2
+    result = stats.get_stats()
+    assert (result['Frames_Received'], result['Duplicates']) == (3, 2)
+
+def test_sequence_wraps_at_16_bits():
+    stats = LinkStatistics()
+    record(stats, [65534, 65535, 0, 2])
+    assert stats.get_missing() == [1]
+    assert stats.get_stats()['Frames_Lost'] == 1
+    assert stats.record_frame(65535) == FRAME_DUPLICATE
+
+def test_missing_frames_are_bounded_and_can_be_discarded():
+    stats = LinkStatistics(max_missing=100)
+    record(stats, [0, 501])
+    missing = stats.get_missing()
+    assert missing == list(range(401, 501))
+    stats.discard_missing(missing[:50])
+    assert stats.get_missing() == list(range(451, 501))
+    assert stats.get_stats()['Frames_Lost'] == 500  # Discarded frames stay lost
+
+def test_missing_min_age():
+    stats = LinkStatistics()
+    stats.record_frame(0)
+    stats.record_frame(2, now=time.time() - 60)
+    stats.record_frame(4)
+    assert stats.get_missing(min_age=30) == [1]
+
+def test_frames_without_sequence_and_partials():
+    stats = LinkStatistics()
+    assert stats.record_frame(None, samples=5) == FRAME_NEW
+    stats.record_partial()
+    result = stats.get_stats()
+    assert (result['Frames_Received'], result['Samples_Received'], result['Partial_Frames']) == (1, 5, 1)
+
+def test_reboot_far_behind_starts_a_new_stream():
+    stats = LinkStatistics(restart_window=2048)
+    record(stats, range(5001))
+    assert record(stats, [0, 1, 2]) == [FRAME_NEW] * 3
+    result = stats.get_stats()
+    assert (result['Stream_Restarts'], result['Duplicates'], result['Frames_Received']) == (1, 0, 5004)
+    assert stats.record_frame(1) == FRAME_DUPLICATE
+
+def test_restart_forgets_the_old_stream():
+    stats = LinkStatistics()
+    record(stats, [0, 1, 5])
+    stats.restart()
+    assert stats.get_missing() == []
+    assert record(stats, [0, 1, 2]) == [FRAME_NEW] * 3
+    result = stats.get_stats()
+    assert (result['Stream_Restarts'], result['Frames_Lost']) == (1, 3)
+
+def test_late_frames_inside_the_window_still_count():
+    stats = LinkStatistics(restart_window=2048)
+    record(stats, [0, 2])
+    record(stats, range(3, 2000))
+    assert stats.record_frame(1) == FRAME_LATE
+    assert stats.get_stats()['Stream_Restarts'] == 0
@@ -0,0 +1,47 @@
+import pytest
+
+# Needs the Sense HAT libraries, the chip reads themselves are replaced below
+sh = pytest.importorskip('sense_hat_module')
+
+@pytest.fixture
+def reads(monkeypatch):
+    # Count the bus reads of every chip
+    counts = {chip: 0 for chip in sh.chip_channels}
+    def reader(chip, channels):
+        def read():
+            counts[chip] += 1
+            return dict(channels)
+        return read
+    monkeypatch.setattr(sh, 'sense_hat_available', True)
+    monkeypatch.setattr(sh, '_cache', {})
+    monkeypatch.setitem(sh._chip_readers, 'humidity', reader('humidity', {'humidity': 41.2, 'temperature_humidity': 21.5}))
+    monkeypatch.setitem(sh._chip_readers, 'pressure', reader('pressure', {'pressure': 1003.5, 'temperature_pressure': 22.0}))
+    monkeypatch.setitem(sh.cache_ttl, 'humidity', 60)
+    monkeypatch.setitem(sh.cache_ttl, 'pressure', 60)
+    return counts
+
+def test_one_read_per_chip(reads):
+    snapshot = sh.read_all(chips=['humidity', 'pressure'])
+    assert snapshot['humidity']['value'] == 41.2
+    assert snapshot['temperature_pressure']['value'] == 22.0
+    assert snapshot['humidity']['timestamp'] == snapshot['temperature_humidity']['timestamp']
+    assert reads == {'imu': 0, 'humidity': 1, 'pressure': 1}
+
+def test_cached_reading_is_reused_within_ttl(reads):
+    sh.read_all(chips=['humidity'])
+    assert sh.get_humidity() == 41.2
+    assert sh.get_temperature_from_humidity() == 21.5
+    assert reads['humidity'] == 1
+    sh.read_all(max_age=0, chips=['humidity'])
+    assert reads['humidity'] == 2
+
+def test_failed_read_is_not_cached(reads, monkeypatch):
+    def broken():
+        raise IOError("bus error")
+    monkeypatch.setitem(sh._chip_readers, 'pressure', broken)
+    assert sh.get_environmental_data()['Pressure'] == ""
+    assert 'pressure' not in sh._cache
+
+def test_unknown_chip_ttl():
+    with pytest.raises(ValueError):
+        sh.set_cache_ttl('magnetometer', 1)
@@ -0,0 +1,48 @@
+import time
+from sensor_scheduler import SensorScheduler
+
+def wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+def test_snapshot_merges_every_sensor():
+    scheduler = SensorScheduler()
+    scheduler.add_sensor('a', lambda: {'Humidity': 41.2}, 100)
+    scheduler.add_sensor('b', lambda: {'Pressure': 1003.5}, 100)
+    scheduler.start()
+    try:
+        wait_for(lambda: len(scheduler.snapshot()) == 2)
+        assert scheduler.snapshot() == {'Humidity': 41.2, 'Pressure': 1003.5}
+        assert scheduler.get_sample_age('a') < 1
+        assert scheduler.get_sample_age('missing') is None
+    finally:
+        scheduler.stop()
+
+def test_failed_read_blanks_the_last_fields():
+    fix = [{'Latitude': 31.8, 'Longitude': -97.7}]
+    scheduler = SensorScheduler()
+    scheduler.add_sensor('gps', lambda: fix[0], 100)
+    scheduler.start()
+    try:
+        wait_for(lambda: scheduler.snapshot().get('Latitude') == 31.8)
+        fix[0] = None  # Fix lost
+        wait_for(lambda: scheduler.snapshot().get('Latitude') == '')
+        assert scheduler.snapshot() == {'Latitude': '', 'Longitude': ''}
+        fix[0] = {'Latitude': 31.9, 'Longitude': -97.6}
+        wait_for(lambda: scheduler.snapshot().get('Latitude') == 31.9)
+    finally:
+        scheduler.stop()
+
+def test_raising_read_blanks_the_registered_fields():
+    def broken():
+        raise IOError("bus error")
+    scheduler = SensorScheduler()
+    scheduler.add_sensor('thermocouple', broken, 100, fields=['Temperature_Thermocouple'])
+    scheduler.start()
+    try:
+        wait_for(lambda: 'Temperature_Thermocouple' in scheduler.snapshot())
+        assert scheduler.snapshot()['Temperature_Thermocouple'] == ''
+    finally:
+        scheduler.stop()
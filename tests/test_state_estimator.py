@@ -0,0 +1,90 @@
+import math
+import numpy as np
+import pytest
+from state_estimator import StateEstimator, estimate_fields, pressure_altitude, sample_measurements
+
+def ascent(count=600, rate=5.0, seed=0):
+    # Synthetic 1 Hz ascent with noisy GPS altitude, pressure and a 3 m/s wind to the east
+    rng = np.random.default_rng(seed)
+    timestamps = np.arange(count) * 1000
+    altitude = 200 + rate * np.arange(count)
+    pressure = 1013.25 * (1 - altitude / 44330.77) ** (1 / 0.190263)
+    return {
+        'timestamps': timestamps, 'true_altitude': altitude,
+        'latitude': np.full(count, 31.85), 'longitude': np.full(count, -97.7),
+        'altitude': altitude + rng.normal(0, 15, count),
+        'pressure': pressure + rng.normal(0, 0.3, count),
+        'speed': 3 + rng.normal(0, 0.5, count), 'heading': np.full(count, 90.0),
+    }
+
+def sample(flight, index):
+    return {'Timestamp': int(flight['timestamps'][index]), 'Latitude': 31.85, 'Longitude': -97.7,
+            'Altitude': flight['altitude'][index], 'Pressure': flight['pressure'][index],
+            'Speed': flight['speed'][index], 'Heading': 90.0}
+
+def batch(flight, smooth):
+    return StateEstimator().run_batch(flight['timestamps'], flight['latitude'], flight['longitude'], flight['altitude'],
+                                      flight['pressure'], flight['speed'], flight['heading'], smooth=smooth)
+
+def rms(values):
+    return math.sqrt(np.mean(np.square(values)))
+
+def test_pressure_altitude():
+    assert float(pressure_altitude(1013.25)) == pytest.approx(0, abs=1e-6)
+    assert float(pressure_altitude(226.32)) == pytest.approx(11000, abs=5)
+    assert float(pressure_altitude(100)) > 11000
+    assert pressure_altitude([1013.25, 500]).shape == (2,)
+
+def test_sample_measurements_drop_invalid_values():
+    gps_altitude, baro_altitude, north, east, _ = sample_measurements(0, 0, 100, 100, 5, 90, 0, 0, 1)
+    assert math.isnan(gps_altitude) and math.isnan(north) and math.isnan(east)
+    assert math.isnan(baro_altitude)  # Below the valid pressure range
+    gps_altitude, baro_altitude, north, east, _ = sample_measurements(31.85, -97.7, 100, 1013.25, 5, 90, 0, 0, 1)
+    assert gps_altitude == 100 and baro_altitude == pytest.approx(0, abs=1e-6)
+    assert north == pytest.approx(0, abs=1e-9) and east == pytest.approx(5)
+
+def test_live_filter_tracks_an_ascent():
+    flight = ascent()
+    estimator = StateEstimator()
+    assert estimator.update({'Timestamp': 0}) == {field: None for field in estimate_fields}
+    for index in range(len(flight['timestamps'])):
+        estimate = estimator.update(sample(flight, index))
+    assert estimate['Filtered_Altitude'] == pytest.approx(flight['true_altitude'][-1], abs=10)
+    assert estimate['Vertical_Rate'] == pytest.approx(5, abs=1)
+    assert estimate['Velocity_East'] == pytest.approx(3, abs=0.5)
+    assert estimate['Velocity_North'] == pytest.approx(0, abs=0.5)
+
+def test_batch_matches_the_live_filter():
+    flight = ascent(count=100)
+    estimator = StateEstimator()
+    for index in range(100):
+        live = estimator.update(sample(flight, index))
+    estimates = batch(flight, smooth=False)
+    for field in ('Filtered_Altitude', 'Vertical_Rate', 'Velocity_North', 'Velocity_East'):
+        assert estimates[field][-1] == pytest.approx(live[field], abs=0.01)
+
+def test_smoother_beats_the_filter():
+    flight = ascent()
+    filtered, smoothed = batch(flight, smooth=False), batch(flight, smooth=True)
+    settled = slice(50, None)  # Past the filter's start up
+    for field, truth in (('Filtered_Altitude', flight['true_altitude'][settled]), ('Vertical_Rate', 5.0)):
+        assert rms(smoothed[field][settled] - truth) < rms(filtered[field][settled] - truth)
+    assert smoothed['Filtered_Altitude'][-1] == filtered['Filtered_Altitude'][-1]
+
+def test_outliers_are_rejected():
+    flight = ascent(count=200)
+    flight['altitude'][150] += 5000
+    estimator = StateEstimator()
+    estimates = estimator.run_batch(flight['timestamps'], flight['latitude'], flight['longitude'], flight['altitude'],
+                                    flight['pressure'], flight['speed'], flight['heading'], smooth=False)
+    assert estimator.stats['Rejected'] >= 1
+    assert estimates['Filtered_Altitude'][150] == pytest.approx(flight['true_altitude'][150], abs=20)
+
+def test_old_samples_are_ignored_across_the_wrap():
+    estimator = StateEstimator()
+    first = estimator.update({'Timestamp': 2**32 - 1000, 'Latitude': 31.85, 'Longitude': -97.7, 'Altitude': 1000})
+    second = estimator.update({'Timestamp': 500, 'Latitude': 31.85, 'Longitude': -97.7, 'Altitude': 1000})
+    assert estimator.last_timestamp == 500 and second['Filtered_Altitude'] == pytest.approx(1000, abs=1)
+    stale = estimator.update({'Timestamp': 2**32 - 500, 'Latitude': 31.85, 'Longitude': -97.7, 'Altitude': 9000})
+    assert estimator.last_timestamp == 500 and stale == second
+    assert first['Filtered_Altitude'] == pytest.approx(1000, abs=1)
@@ -0,0 +1,126 @@
+import math
+import os
+import pytest
+import telemetry_frame as frame
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sample = {
+    'Timestamp': 4294967000, 'Accelerometer_X': -9.81, 'Gyroscope_Z': 0.123, 'Humidity': 41.27,
+    'Pressure': 1003.456, 'Temperature_Thermocouple': -54.3, 'Latitude': 31.8456789, 'Longitude': -97.7123456,
+    'Altitude': 25123.456, 'Speed': 12.34, 'Heading': 359.99,
+}
+
+def test_shared_copies_match():
+    # The payload and ground station each ship their own copy of these modules
+    for payload, ground in (('telemetry_frame.py', 'telemetry_frame_ground.py'), ('data_writer.py', 'data_writer_ground.py')):
+        with open(os.path.join(root, 'Payload', payload), 'rb') as a, open(os.path.join(root, 'Ground_Station', ground), 'rb') as b:
+            assert a.read() == b.read(), f"{payload} and {ground} differ"
+
+def test_sample_round_trip():
+    decoded = frame.decode_frame(frame.encode_sample(sample, 70000))
+    assert decoded['type'] == frame.FRAME_SAMPLE
+    assert decoded['sequence'] == 70000 % 2**16
+    result, = decoded['samples']
+    assert set(result) == set(sample)
+    for field, value in sample.items():
+        assert result[field] == pytest.approx(value, abs=1e-7 if field in ('Latitude', 'Longitude') else 1e-3)
+    assert isinstance(result['Timestamp'], int)
+
+@pytest.mark.parametrize('value', ['', None, 'n/a', math.inf, -math.inf, math.nan])
+def test_unusable_values_are_sent_as_invalid(value):
+    result, = frame.decode_frame(frame.encode_sample({'Timestamp': 1, 'Pressure': value}, 0))['samples']
+    assert result == {'Timestamp': 1}
+
+def test_out_of_range_values_are_clamped():
+    result, = frame.decode_frame(frame.encode_sample({'Accelerometer_X': 1000, 'Speed': -5}, 0))['samples']
+    assert result == {'Accelerometer_X': 327.67, 'Speed': 0}
+
+def test_command_and_ack_round_trip():
+    command = frame.decode_frame(frame.encode_command(frame.COMMAND_RESEND, 65535, b'\x01\x02'))
+    assert (command['type'], command['sequence'], command['command'], command['arguments']) == \
+           (frame.FRAME_COMMAND, 65535, frame.COMMAND_RESEND, b'\x01\x02')
+    ack = frame.decode_frame(frame.encode_ack(frame.COMMAND_CUTDOWN, 7, frame.RESULT_REJECTED))
+    assert (ack['type'], ack['sequence'], ack['command'], ack['result']) == (frame.FRAME_ACK, 7, frame.COMMAND_CUTDOWN, frame.RESULT_REJECTED)
+
+def test_padding_is_ignored():
+    encoded = frame.encode_sample(sample, 1)
+    padded = frame.pad_frame(encoded)
+    assert len(padded) == frame.MAX_FRAME_SIZE
+    assert frame.decode_frame(bytes(padded)) == frame.decode_frame(encoded)
+
+@pytest.mark.parametrize('data', [b'\x01\x01', b'\x09\x01\x00\x00\x00', b'\x01\x01\x00\x00\x10\x00', b'\x01\x7f\x00\x00\x00'])
+def test_malformed_frames_raise_value_error(data):
+    with pytest.raises(ValueError):
+        frame.decode_frame(data)
+
+@pytest.mark.parametrize('value', [0, 1, -1, 63, -64, 2**31 - 1, -2**31, 2**40])
+def test_zigzag_varint_round_trip(value):
+    buffer = bytearray()
+    frame._write_varint(buffer, frame._zigzag(value))
+    decoded, position = frame._read_varint(bytes(buffer), 0)
+    assert frame._unzigzag(decoded) == value
+    assert position == len(buffer)
+    if -64 <= value < 64:
+        assert len(buffer) == 1
+
+def test_truncated_varint():
+    with pytest.raises(ValueError):
+        frame._read_varint(b'\x80\x80', 0)
+
+def batch():
+    # Fields dropping out and coming back, counters wrapping near the top of their range
+    samples = []
+    for index in range(10):
+        data = dict(sample, Timestamp=(sample['Timestamp'] + index * 100) % 2**32, Altitude=25000 + index * 4.5)
+        if index in (3, 4):
+            data['Pressure'] = ''
+        if index == 6:
+            del data['Latitude']
+        samples.append(data)
+    return samples
+
+def test_batch_round_trip():
+    samples = batch()
+    decoded = frame.decode_frame(frame.encode_batch(samples, 12))
+    assert decoded['type'] == frame.FRAME_BATCH and decoded['sequence'] == 12
+    assert len(decoded['samples']) == len(samples)
+    for original, result in zip(samples, decoded['samples']):
+        expected = {field: value for field, value in original.items() if value != ''}
+        assert set(result) == set(expected)
+        for field, value in expected.items():
+            assert result[field] == pytest.approx(value, abs=1e-3)
+
+def test_batch_matches_single_frames():
+    samples = batch()
+    singles = [frame.decode_frame(frame.encode_sample(data, 0))['samples'][0] for data in samples]
+    assert frame.decode_frame(frame.encode_batch(samples, 0))['samples'] == singles
+
+def test_unchanged_fields_cost_almost_nothing():
+    samples = [dict(sample)] * 20
+    size = len(frame.encode_batch(samples, 0))
+    single = len(frame.encode_sample(sample, 0))
+    assert size <= single + 1 + 2 * 19  # Count byte, then a zero mask delta and a zero change mask per sample
+
+def test_batch_limits():
+    with pytest.raises(ValueError):
+        frame.encode_batch([], 0)
+    with pytest.raises(ValueError):
+        frame.encode_batch([sample] * 256, 0)
+    varied = [dict(sample, Timestamp=index * 997, Pressure=900 + index * 3.1, Altitude=index * 1234.5) for index in range(100)]
+    assert not frame.batch_fits(varied)
+    assert frame.batch_fits(varied[:5])
+
+def test_ranges_round_trip_across_the_wrap():
+    sequences = [65533, 65534, 65535, 0, 1, 7, 9, 10]
+    arguments = frame.encode_ranges(sequences)
+    assert len(arguments) == 3 * frame.RESEND_RANGE.size
+    assert frame.decode_ranges(arguments) == sequences
+
+def test_long_runs_are_split():
+    sequences = list(range(600))
+    arguments = frame.encode_ranges(sequences)
+    assert len(arguments) == 3 * frame.RESEND_RANGE.size  # At most 255 per range
+    assert frame.decode_ranges(arguments) == sequences
+    assert frame.decode_ranges(arguments + b'\x01') == sequences  # A trailing partial range is ignored
+    assert frame.encode_ranges([]) == b''
@@ -0,0 +1,89 @@
+import math
+from track_layer import simplify, segment_distance, TrackSimplifier, TrackLayer, meters_per_degree
+
+def test_segment_distance():
+    assert segment_distance((5, 3), (0, 0), (10, 0)) == 3
+    assert segment_distance((13, 4), (0, 0), (10, 0)) == 5  # Past the end, measured to the end point
+    assert segment_distance((3, 4), (0, 0), (0, 0)) == 5
+
+def test_simplify_drops_points_within_tolerance():
+    points = [(x, 0.5 * math.sin(x)) for x in range(100)]
+    assert simplify(points, 1) == [0, 99]
+    corner = [(0, 0), (5, 0.1), (10, 0), (10, 5), (10, 10)]
+    assert simplify(corner, 1) == [0, 2, 4]
+    assert simplify(points[:2], 1) == [0, 1]
+
+def spiral(count):
+    # Drifting circles, roughly what a balloon track looks like, in degrees
+    fixes = []
+    for index in range(count):
+        angle = index / 30
+        east = 200 * math.cos(angle) + index * 3
+        north = 200 * math.sin(angle) + index
+        fixes.append((31.85 + north / meters_per_degree, -97.7 + east / (meters_per_degree * math.cos(math.radians(31.85)))))
+    return fixes
+
+def deviation(simplifier, fixes):
+    # Largest distance of any fix from the drawn track (committed vertices plus the tail line)
+    path = [simplifier._to_meters(*vertex) for vertex in simplifier.vertices + simplifier.tail_positions()[1:]]
+    return max(min(segment_distance(simplifier._to_meters(*fix), start, end) for start, end in zip(path, path[1:]))
+               for fix in fixes)
+
+def test_simplified_track_stays_within_tolerance():
+    fixes = spiral(2000)
+    simplifier = TrackSimplifier(tolerance=10, max_vertices=5000)
+    for fix in fixes:
+        simplifier.append(*fix)
+    assert simplifier.fixes == 2000
+    assert len(simplifier.vertices) < 500
+    assert deviation(simplifier, fixes) <= 10 + 1e-6
+
+def test_vertex_budget_doubles_the_tolerance():
+    fixes = spiral(3000)
+    simplifier = TrackSimplifier(tolerance=1, max_vertices=100)
+    for fix in fixes:
+        simplifier.append(*fix)
+    assert len(simplifier.vertices) <= 100
+    assert simplifier.tolerance > 1
+    assert simplifier.vertices[0] == fixes[0]
+
+def test_tail_is_bounded():
+    simplifier = TrackSimplifier(tolerance=10, max_tail=50)
+    for index in range(500):
+        simplifier.append(31.85 + index * 1e-5, -97.7)  # A straight line never breaks the tolerance
+    assert len(simplifier.tail) < 50
+    assert len(simplifier.vertices) >= 500 // 50
+
+class MapView:
+    # Records the paths a TrackLayer draws
+    def __init__(self):
+        self.paths = []
+
+    def set_path(self, positions, color=None, width=None):
+        path = Path(positions)
+        self.paths.append(path)
+        return path
+
+class Path:
+    def __init__(self, positions):
+        self.positions = list(positions)
+        self.draws = 0
+
+    def set_position_list(self, positions):
+        self.positions = list(positions)
+
+    def add_position(self, latitude, longitude):
+        self.positions.append((latitude, longitude))
+
+    def draw(self):
+        self.draws += 1
+
+def test_layer_redraws_only_what_changed():
+    map_view = MapView()
+    layer = TrackLayer(map_view, tolerance=10)
+    for fix in spiral(600):
+        layer.append(*fix)
+    assert len(map_view.paths) == 2  # The committed path and the tail, created once each
+    assert layer.committed_path.positions == layer.simplifier.vertices
+    assert layer.tail_path.positions[0] == layer.simplifier.vertices[-1]
+    assert layer.get_stats()['Fixes'] == 600